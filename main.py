@@ -2,21 +2,35 @@
 import argparse
 import sys
 
-from src.parser import Parser
-from src.apkParser import APKParser
-from src.analyzer import Analyzer
 from src.constants import ANDROID_MAX_SDK
 import logging
-from src.utils import CustomFormatter
+from src.utils import setupLogger
+from src.batch import analyzeFile, collectInputs, runBatch
 from src.external import downloadAPK
+from src.config import DAL_CACHE_PATH, RESULT_CACHE_PATH
 import tempfile
+import atexit
 import xml.etree.ElementTree
+from src.sarif import SarifWriter
+from src.analyzer import CHECKS
+
+
+def checkList(value):
+    """
+    Parses a comma separated list of check names.
+    """
+    checks = [e.strip() for e in value.split(",") if e.strip()]
+    unknown = [e for e in checks if e not in CHECKS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown check(s): {', '.join(unknown)} (choose from {', '.join(CHECKS)})")
+    return checks
 
 
 if __name__ == "__main__":
     argparser = argparse.ArgumentParser(description='Utility to analyse Android Manifest files.')
     argparser.add_argument('--log-level', '-v', type=int, choices=[0, 1, 2], help='Sets the log level', default=0)
-    argparser.add_argument("path", help="The path to the manifest file.")
+    argparser.add_argument("path", help="The path to the manifest file. With --batch: a directory, a glob pattern "
+                                        "or @FILE listing one path per line.")
     argparser.add_argument("--min-sdk-version", '-min', type=int, choices=range(1, ANDROID_MAX_SDK+1),
                            help='Indicate the minimum version supported by your application',
                            metavar=f"[1,{ANDROID_MAX_SDK}]", required=True)
@@ -25,28 +39,60 @@ if __name__ == "__main__":
                            metavar=f"[1,{ANDROID_MAX_SDK}]", required=True)
     argparser.add_argument('--adb', action="store_true", help='Indicates to use ADB. The path argument is treated as '
                                                               'the app\'s package name')
+    argparser.add_argument('--streaming', action="store_true", help='Only keeps the facts needed by the analysis '
+                                                                    'instead of the whole manifest tree. '
+                                                                    'Reduces memory usage for huge manifests')
+    argparser.add_argument('--expand-uris', action="store_true", help='Lists all the URIs handled by the intent '
+                                                                      'filters instead of showing the big ones in '
+                                                                      'a compressed form')
+    argparser.add_argument('--match-urls', metavar="FILE", help='Lists the exported components handling each URL '
+                                                                 'of the file (one per line, - for STDIN)')
+    argparser.add_argument('--dal-cache', metavar="DIR", default=DAL_CACHE_PATH,
+                           help=f'The directory caching the Digital Asset Links files (default: {DAL_CACHE_PATH})')
+    argparser.add_argument('--no-dal-cache', dest="dal_cache", action="store_const", const=None,
+                           help='Always fetch the Digital Asset Links files')
+    argparser.add_argument('--result-cache', metavar="DIR", nargs="?", const=RESULT_CACHE_PATH,
+                           help=f'Caches the results of the analyses in this directory by the SHA-256 of the '
+                                f'analyzed file (default: {RESULT_CACHE_PATH})')
+    argparser.add_argument('--apksigner', action="store_true", help='Also verifies the signature with apksigner '
+                                                                    '(see src/config.py)')
+    argparser.add_argument('--checks', type=checkList, metavar="CHECK[,CHECK...]",
+                           help=f'Only runs these checks, the inputs they do not need are not loaded '
+                                f'(choose from {", ".join(CHECKS)})')
+    argparser.add_argument('--skip-checks', type=checkList, metavar="CHECK[,CHECK...]",
+                           help='Runs all the checks but these ones')
+    argparser.add_argument('--format', choices=["text", "ndjson", "sarif"], default="text",
+                           help='text: the terminal view (default), ndjson: only the findings, as one JSON object per '
+                                'line written as soon as they are found, sarif: the findings as a SARIF 2.1.0 log')
+    argparser.add_argument('--batch', action="store_true", help='Analyzes many APKs or manifests with a pool of '
+                                                                'worker processes')
+    argparser.add_argument('--jobs', '-j', type=int, help='The number of worker processes used by --batch '
+                                                          '(default: number of CPUs)')
     args = argparser.parse_args()
     assert args.min_sdk_version <= args.max_sdk_version, "min SDK version cannot be higher than max SDK version"
 
-    # silence https://github.com/appknox/pyaxmlparser/blob/d111a4fc6330a0c293ffc2f114af360eb78ad2ef/pyaxmlparser
-    # /stringblock.py#L208
-    logging.getLogger("pyaxmlparser.stringblock").setLevel(logging.CRITICAL)
-    # silence https://github.com/appknox/pyaxmlparser/blob/d111a4fc6330a0c293ffc2f114af360eb78ad2ef/pyaxmlparser
-    # /arscparser.py#L150
-    logging.getLogger("pyaxmlparser.arscparser").setLevel(logging.CRITICAL)
+    # Log to the console
+    logger = setupLogger(args.log_level, logging.StreamHandler())
 
-    logger = logging.getLogger("MainLogger")
-    logger.setLevel(logging.INFO)
-    if args.log_level == 1:
-        logger.setLevel(logging.WARNING)
-    elif args.log_level == 2:
-        logger.setLevel(logging.ERROR)
+    if args.format == "sarif":
+        # the results of all the analyzed files go in one SARIF log, it is completed when exiting
+        sys.stdout = SarifWriter(sys.stdout)
+        atexit.register(sys.stdout.close)
 
-    # Create stdout handler for logging to the console
-    stdout_handler = logging.StreamHandler()
-    stdout_handler.setFormatter(CustomFormatter())
-    # Add handlers to the logger
-    logger.addHandler(stdout_handler)
+    if args.batch:
+        if args.adb:
+            logger.error("--adb can't be used with --batch !")
+            sys.exit(1)
+        paths = collectInputs(args.path)
+        if not paths:
+            logger.error("No file to analyze !")
+            sys.exit(1)
+        results = runBatch(paths, args, args.jobs)
+        failures = [e for e in results if e.error is not None]
+        logger.info(f"\n{len(results) - len(failures)}/{len(results)} file(s) analyzed")
+        for e in failures:
+            logger.error(f"{e.path}: {e.error}")
+        sys.exit(1 if failures else 0)
 
     with tempfile.TemporaryDirectory() as tmpPath:
         packageName = None
@@ -59,14 +105,7 @@ if __name__ == "__main__":
                 sys.exit(1)
 
         try:
-            # try as APK
-            parser = APKParser(args.path)
-            if parser.apk is None:
-                # not an APK file
-                parser = Parser(args.path)
-            analyzer = Analyzer(parser, args)
-            analyzer.packageName = packageName
-            analyzer.runAllTests()
+            analyzeFile(args.path, args, packageName)
 
         except FileNotFoundError:
             logger.error("Invalid file name !")
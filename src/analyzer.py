@@ -3,15 +3,60 @@ from tabulate import tabulate
 from .utils import (
     printTestInfo,
     printSubTestInfo,
-    checkDigitalAssetLinks,
     handleVersion
 )
 import logging
-from .constants import dangerous_perms
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from .constants import dangerous_perms, MAX_DISPLAYED_URIS, ANDROID_MAX_SDK
+from .uriSet import UriSet
 from .apkParser import APKParser
-from .networkSecParser import NetworkSecParser
-from collections import namedtuple
-from .external import runAPKSigner, performBackup
+from .records import Cert
+from .external import runAPKSigner, performBackup, startAPKSigner, startBackup
+from .findings import FindingsCollector, TerminalRenderer
+from .config import EXTERNAL_WORKERS
+
+# The checks run by Analyzer.runAllTests in this order: name -> (method, facts it needs)
+# The facts are the inputs loaded on demand by the parser (or fetched) besides the manifest:
+#   signature: the APK Signing Block and the JAR signature, apksigner: the apksigner tool (with --apksigner),
+#   backup-rules: the backup rules XML files, adb: an ADB backup of the installed app (with --adb),
+#   nsc: the network security config XML file, dal: the Digital Asset Links files of the app links hosts,
+#   arsc-strings: all the strings of resources.arsc
+# Skipped checks load none of their facts.
+# The apksigner, adb and dal facts are started before the checks run (see Analyzer._startExternalOperations).
+CHECKS = {
+    "info": ("showApkInfo", ()),
+    "signature": ("analyzeSignatures", ("signature", "apksigner")),
+    "permissions": ("analyzeRequiredPerms", ()),
+    "custom-permissions": ("analyzeCustomPerms", ()),
+    "backup": ("analyzeBackupFeatures", ("backup-rules", "adb")),
+    "debuggable": ("isDebuggable", ()),
+    "network-security-config": ("getNetworkConfigFile", ("nsc",)),
+    "cleartext-traffic": ("isCleartextTrafficAllowed", ("nsc",)),
+    "exported-components": ("getExportedComponents", ()),
+    "intent-filters": ("getIntentFilterInfo", ()),
+    "deep-links": ("isDeepLinkUsed", ()),
+    "app-links": ("analyzeAppLinks", ("dal",)),
+    "component-permissions": ("analyzeExportedComponent", ()),
+    "unexported-providers": ("analyzeUnexportedProviders", ()),
+    "firebase": ("checkForFirebaseURL", ("arsc-strings",)),
+}
+
+
+def enabledChecks(args):
+    """
+    Lists the checks selected by --checks and --skip-checks, in the order they are run.
+    """
+    selected = getattr(args, "checks", None) or list(CHECKS)
+    skipped = getattr(args, "skip_checks", None) or ()
+    return [e for e in CHECKS if e in selected and e not in skipped]
+
+
+def requiredFacts(checks):
+    """
+    Returns the facts needed by the given checks.
+    """
+    return {fact for check in checks for fact in CHECKS[check][1]}
 
 
 class Analyzer:
@@ -22,6 +67,44 @@ class Analyzer:
         self.isAPK = type(self.parser) is APKParser
         self.logger = logging.getLogger("MainLogger")
         self.packageName = None
+        # the findings of the checks are displayed in the terminal by default
+        self.findings = FindingsCollector([TerminalRenderer(self.logger)])
+        # the SDK range of the branch of handleVersion being run, None for the range given in the arguments
+        self.sdkRange = None
+        # fact -> future of the external operations started by runAllTests
+        self.started = {}
+
+    def report(self, check, severity, message, component=None, display=None, **evidence):
+        """
+        Reports a finding of a check for the SDK range being analyzed.
+        :param check: The ID of the check.
+        :param severity: "info", "warning", "error" or "critical".
+        :param message: A plain text (not colored) description.
+        :param component: The name of the component concerned, if any.
+        :param display: The message colored for the terminal, message by default.
+        :param evidence: The facts the finding is based on.
+        """
+        minSdk, maxSdk = self.sdkRange or (self.args.min_sdk_version, self.args.max_sdk_version)
+        return self.findings.add(check, severity, message, minSdk, maxSdk, component, evidence, display)
+
+    def _handleVersion(self, lowerFunc, higherFunc, trigger):
+        """
+        utils.handleVersion for the SDK range given in the arguments,
+        the findings reported by each function are restricted to the versions it handles.
+        """
+        def inRange(func, minSdk, maxSdk):
+            def wrapper(condition=False):
+                previous = self.sdkRange
+                lo, hi = previous or (self.args.min_sdk_version, self.args.max_sdk_version)
+                self.sdkRange = (max(lo, minSdk), min(hi, maxSdk))
+                try:
+                    return func(condition)
+                finally:
+                    self.sdkRange = previous
+            return wrapper
+
+        return handleVersion(inRange(lowerFunc, 1, trigger - 1), inRange(higherFunc, trigger, ANDROID_MAX_SDK),
+                             trigger, self.args.min_sdk_version, self.args.max_sdk_version)
 
     def showApkInfo(self):
         """
@@ -36,8 +119,7 @@ class Analyzer:
                 - Required vendor-provided native shared librairies
                 - Required hardware or software features
 
-        With an APK as input file:
-            Shows all the above information as well as the signature verification
+        The signature of APKs is analyzed by analyzeSignatures.
         """
         printTestInfo("APK information")
         info = self.parser.getApkInfo()
@@ -68,8 +150,9 @@ class Analyzer:
         self.logger.info(f'Minimal SDK version: {min_sdk_version_args} {warning_msg_1}')
         self.logger.info(f'Maximal SDK version: {max_sdk_version_args} {warning_msg_2}')
         if uses_sdk_max_sdk_version != 0:
-            self.logger.warning("Declaring the android:maxSdkVersion attribute is not recommended. "
-                                "Please check the official documentation")
+            self.report("max-sdk-version-declared", "warning",
+                        "Declaring the android:maxSdkVersion attribute is not recommended. "
+                        "Please check the official documentation", maxSdkVersion=uses_sdk_max_sdk_version)
 
         activities_number = self.parser.componentStats("activity")
         exported_activities_number = self.parser.exportedComponentStats("activity")
@@ -106,33 +189,101 @@ class Analyzer:
                 f'Hardware or software feature "{f.name}" can be used by the application '
                 f'(mandatory for runtime : {f.required})')
 
-        if self.isAPK:
-            # if we have an APK and APKSigner is installed
-            runAPKSigner(self.args.min_sdk_version, self.args.path)
-
         return res
 
+    def analyzeSignatures(self):
+        """
+        With an APK as input file:
+            Shows the signature schemes and their signers, cross-checked with apksigner if --apksigner is used.
+        """
+        if not self.isAPK:
+            return
+        self.analyzeSignature()
+        if getattr(self.args, "apksigner", False):
+            # cross-check with APKSigner if it is installed
+            runAPKSigner(self.args.min_sdk_version, self.args.path, self.started.get("apksigner"))
+
+    @staticmethod
+    def _colorKeySize(algorithm, size):
+        """
+        Colors a key size like apksigner's output is colored: weak keys in red, acceptable ones in yellow.
+        """
+        color = "green"
+        if algorithm in ("RSA", "DSA") and size is not None:
+            if size < 2048:
+                color = "red"
+            elif size < 3072:
+                color = "yellow"
+        return colored(str(size), color)
+
+    def analyzeSignature(self):
+        """
+        Displays the signature schemes of the APK and their signers.
+        https://source.android.com/docs/security/features/apksigning
+        The signatures are read in-process, only the content digests of the v2+ schemes are verified
+        (use --apksigner to verify the signatures themselves).
+        """
+        printSubTestInfo("APK signature")
+        schemes = {e.version: e for e in self.parser.getSignatures()}
+        names = {"v1": "JAR signing", "v2": "APK Signature Scheme v2", "v3": "APK Signature Scheme v3",
+                 "v3.1": "APK Signature Scheme v3.1"}
+        for version, name in names.items():
+            if version == "v3.1" and version not in schemes:
+                continue
+            signed = colored("true", "green") if version in schemes else colored("false", "red")
+            self.logger.info(f"Signed using {version} scheme ({name}): {signed}")
+
+        for scheme in schemes.values():
+            if scheme.digestsVerified is not None:
+                verified = colored("true", "green") if scheme.digestsVerified else colored("false", "red")
+                self.logger.info(f"{scheme.version} content digests verified: {verified}")
+            if scheme.digestsVerified is False and not scheme.signers:
+                self.report("apk-signature-malformed", "critical",
+                            f"The {scheme.version} signature could not be parsed", scheme=scheme.version)
+            elif scheme.digestsVerified is False:
+                self.report("apk-digest-mismatch", "critical",
+                            f"The {scheme.version} content digests do not match the APK: it was modified after "
+                            f"being signed", scheme=scheme.version)
+            for i, signer in enumerate(scheme.signers, 1):
+                prefix = f"{scheme.version} signer #{i}"
+                if signer.certificates:
+                    self.logger.info(f"{prefix} certificate DN: {signer.certificates[0].subject}")
+                    self.logger.info(f"{prefix} certificate SHA-256 digest: {signer.certificates[0].sha256}")
+                self.logger.info(f"{prefix} key algorithm: {signer.keyAlgorithm}")
+                self.logger.info(f"{prefix} key size (bits): {self._colorKeySize(signer.keyAlgorithm, signer.keySize)}")
+
+        if not schemes:
+            self.report("apk-not-signed", "critical", "Your APK is not signed")
+        elif list(schemes) == ["v1"]:
+            self.report("apk-signed-with-v1-only", "critical",
+                        "Your APK is only signed with scheme v1. Unauthorized modification to META-INF jar "
+                        "entry will not be detected", schemes=list(schemes))
+        return list(schemes)
+
     def analyzeRequiredPerms(self):
         """
         Lists all permissions required by the target APK
         Provides an analysis of builtin ones based on protectionLevel
         """
         printTestInfo("Analyzing required permissions")
-        dangerous_perms_number = 0
+        required_dangerous_perms = []
         for perm in self.parser.requiredPermissions():
             if perm in dangerous_perms:
                 if self.logger.level <= logging.WARNING:
                     print(colored(perm, "yellow"))
-                dangerous_perms_number += 1
+                required_dangerous_perms.append(perm)
             else:
                 self.logger.info(perm)
+        dangerous_perms_number = len(required_dangerous_perms)
         if dangerous_perms_number > 0:
             if dangerous_perms_number == 1:
                 msg = "permission"
             else:
                 msg = "permissions"
-            self.logger.warning(
-                f'APK requires {dangerous_perms_number} dangerous builtin {msg} to work properly. Check it out!')
+            self.report("dangerous-permissions", "warning",
+                        f'APK requires {dangerous_perms_number} dangerous builtin {msg} to work properly. '
+                        f'Check it out!',
+                        permissions=required_dangerous_perms)
 
     def analyzeCustomPerms(self):
         """
@@ -144,30 +295,31 @@ class Analyzer:
         table = []
         header = ["name", "protectionLevel"]
         custom_permissions = self.parser.customPermissions()
-        dangerous_protection_level = 0
+        weak_permissions = {}
 
         for custom_permission in custom_permissions:
             name = custom_permission.name
             protectionLevel = custom_permission.protectionLevel
 
             if protectionLevel == "normal" or protectionLevel == "dangerous":
+                weak_permissions[name] = protectionLevel
                 name = colored(name, "red")
                 protectionLevel = colored(protectionLevel, "red")
                 table.append([name, protectionLevel])
-                dangerous_protection_level += 1
             elif self.logger.level <= logging.INFO:
                 table.append([name, protectionLevel])
 
         if len(table) > 0:
             print(tabulate(table, header, tablefmt="fancy_grid"))
+        dangerous_protection_level = len(weak_permissions)
         if dangerous_protection_level > 0:
             if dangerous_protection_level == 1:
                 msg = "permission"
             else:
                 msg = "permissions"
-            self.logger.critical(
-                f'APK declared {dangerous_protection_level} custom {msg} with a protectionLevel <= dangerous. Check '
-                f'it out!')
+            self.report("custom-permissions-protection-level", "critical",
+                        f'APK declared {dangerous_protection_level} custom {msg} with a protectionLevel <= dangerous. '
+                        f'Check it out!', permissions=weak_permissions)
 
     def isADBBackupAllowed(self):
         """
@@ -185,9 +337,10 @@ class Analyzer:
         def allowed(condition=False):
             if condition:
                 print(colored("On Android 11 (API 30) and lower", attrs=["bold"]))
-            self.logger.warning("ADB backup can be performed to export sandbox data")
+            self.report("adb-backup", "warning", "ADB backup can be performed to export sandbox data",
+                        allowBackup=backup_attr, debuggable=debuggable)
             if self.packageName is not None:
-                performBackup(self.packageName)
+                performBackup(self.packageName, self.started.get("adb"))
             return True
 
         def notAllowed(condition=False):
@@ -198,13 +351,21 @@ class Analyzer:
             return False
 
         # android:allowBackup default value is true for any android version
+        # (keep _isADBBackupPerformed in line)
         if backup_attr and not debuggable:
-            return handleVersion(allowed, notAllowed, 31, self.args.min_sdk_version, self.args.max_sdk_version)
+            return self._handleVersion(allowed, notAllowed, 31)
         if backup_attr and debuggable:
             return allowed()
         self.logger.info("APK cannot be backed up with adb")
         return False
 
+    def _isADBBackupPerformed(self):
+        """
+        Tells if isADBBackupAllowed will backup the app with ADB: backups are allowed on a version it supports.
+        """
+        return (self.packageName is not None and bool(self.parser.allowBackup())
+                and (bool(self.parser.debuggable()) or self.args.min_sdk_version < 31))
+
     def isAutoBackupAllowed(self):
         """
         Checks if Auto Backup are allowed (taking into account Android versions and their corresponding default
@@ -230,15 +391,16 @@ class Analyzer:
         def unencrypted(condition=False):
             if condition:
                 print(colored("On Android 8.1 (API 27) and lower", attrs=["bold"]))
-            self.logger.warning("E2E encryption not available")
+            self.report("auto-backup-unencrypted", "warning", "E2E encryption not available")
             return False
 
         def used(condition=False):
             if condition:
                 print(colored("On Android 6 (API 23) and higher", attrs=["bold"]))
-            self.logger.warning("Google drive Auto-Backup functionality is activated")
+            self.report("auto-backup", "warning", "Google drive Auto-Backup functionality is activated",
+                        fullBackupOnly=fullBackupOnly, backupAgent=agent)
             printSubTestInfo("Checking Auto-Backup E2E encryption")
-            return True, handleVersion(unencrypted, encrypted, 28, self.args.min_sdk_version, self.args.max_sdk_version)
+            return True, self._handleVersion(unencrypted, encrypted, 28)
 
         def notUsed(condition=False):
             if condition:
@@ -253,7 +415,7 @@ class Analyzer:
         # fullBackupOnly = false -> auto backup only if BackupAgent is None
 
         if backup_attr and (fullBackupOnly or agent is None):
-            return handleVersion(notUsed, used, 23, self.args.min_sdk_version, self.args.max_sdk_version)
+            return self._handleVersion(notUsed, used, 23)
         return notUsed()
 
     def isBackupAgentImplemented(self):
@@ -268,8 +430,9 @@ class Analyzer:
         printSubTestInfo("Checking for own developer backup agent")
         agent = self.parser.backupAgent()
         if agent:
-            self.logger.warning(
-                f'APK implements is own backup agent in {agent.split(".")[-1]}. Please make deeper checks')
+            self.report("backup-agent", "warning",
+                        f'APK implements is own backup agent in {agent.split(".")[-1]}. Please make deeper checks',
+                        component=agent)
             return True
         self.logger.info("No backup agent implementation has been found")
         return False
@@ -305,9 +468,10 @@ class Analyzer:
                 if len(table) > 0:
                     self.logger.info(tabulate(table, headers, tablefmt="fancy_grid"))
                 return 1
-            self.logger.warning(f'Minimal supported SDK version ({self.args.min_sdk_version})'
-                                f' allows Android versions <= 11 (API 30) and no exclusion custom rules file '
-                                f'has been specified in the fullBackupContent attribute.')
+            self.report("backup-rules-missing", "warning",
+                        f'Minimal supported SDK version ({self.args.min_sdk_version})'
+                        f' allows Android versions <= 11 (API 30) and no exclusion custom rules file '
+                        f'has been specified in the fullBackupContent attribute.', attribute="fullBackupContent")
             return 0
 
         def der(condition=False):
@@ -328,7 +492,8 @@ class Analyzer:
                             self.logger.info("Cloud backup are performed only if they can be encrypted, such as when "
                                              "the user has a lock screen.")
                         else:
-                            self.logger.warning("Cloud backup are performed even if they cannot be encrypted.")
+                            self.report("cloud-backup-unencrypted", "warning",
+                                        "Cloud backup are performed even if they cannot be encrypted.")
                         self.logger.info("Cloud backup rules have been defined :")
                         self.logger.info(tabulate(table, headers, tablefmt="fancy_grid"))
                     # show device transfer rules
@@ -337,12 +502,13 @@ class Analyzer:
                         self.logger.info("Cloud backup rules have been defined :")
                         self.logger.info(tabulate(table, headers, tablefmt="fancy_grid"))
                 return 2
-            self.logger.warning(f'Maximal supported SDK version ({self.args.max_sdk_version})'
-                                f' allows Android versions >= 12 (API 31) and no exclusion custom rules file '
-                                f'has been specified in the dataExtractionRules attribute.')
+            self.report("backup-rules-missing", "warning",
+                        f'Maximal supported SDK version ({self.args.max_sdk_version})'
+                        f' allows Android versions >= 12 (API 31) and no exclusion custom rules file '
+                        f'has been specified in the dataExtractionRules attribute.', attribute="dataExtractionRules")
             return 0
 
-        return handleVersion(fbc, der, 31, self.args.min_sdk_version, self.args.max_sdk_version)
+        return self._handleVersion(fbc, der, 31)
 
     def getNetworkConfigFile(self):
         """
@@ -361,7 +527,7 @@ class Analyzer:
             self.analyzeNSCTrustAnchors()
             self.analyzeNSCPinning()
             return True
-        self.logger.warning("networkSecurityConfig property not found")
+        self.report("network-security-config-missing", "warning", "networkSecurityConfig property not found")
         return False
 
     def analyzeBackupFeatures(self):
@@ -384,11 +550,14 @@ class Analyzer:
         printTestInfo("Checking compilation mode")
         debuggable = self.parser.debuggable()
         if debuggable:
-            self.logger.warning("Debuggable flag found. APK can be debugged on a device running in user mode")
+            self.report("debuggable", "warning",
+                        "Debuggable flag found. APK can be debugged on a device running in user mode")
             # flutter kernel_blob.bin
             path = 'assets/flutter_assets/kernel_blob.bin'
             if self.parser.hasFile(path):
-                self.logger.critical(f"Flutter app is debuggable and source code can be found in the strings of {path}")
+                self.report("debuggable-flutter", "critical",
+                            f"Flutter app is debuggable and source code can be found in the strings of {path}",
+                            file=path)
             return True
         self.logger.info("APK is not compiled in debug mode")
         return False
@@ -396,7 +565,7 @@ class Analyzer:
     def analyzeExportedComponent(self):
         """
         Analyzes exported components permissions
-         - If the exported component does not specify any permission, highlight it with self.logger.warning
+         - If the exported component does not specify any permission, report it
            to indicate deeper checks are required.
          - Do not add deeplinks or applinks, as they cannot have specific permissions (by default they are used
            to call our app when a specific URI is handled by another app)
@@ -408,7 +577,7 @@ class Analyzer:
         universal_links = self.parser.getUniversalLinks()
         # Getting a set of deeplink components' name
         unique_names = {universal_link.name for universal_link in universal_links}
-        count = 0
+        unprotected = []
         res = 0
 
         for component in ["activity", "receiver", "provider", "service"]:
@@ -431,7 +600,7 @@ class Analyzer:
                         cType = colored(t, "yellow")
                         if self.logger.level <= logging.WARNING:
                             table.append([cName, cType, p, rp, wp])
-                            count += 1
+                        unprotected.append({"name": e.componentName, "type": t})
                         res += 1
                     else:
                         if self.logger.level == logging.INFO:
@@ -455,9 +624,10 @@ class Analyzer:
 
             self.logger.info("Deeplinks are not shown in table below because they never have permissions")
             print(tabulate(table, headers, tablefmt="fancy_grid"))
-        if count > 0:
-            self.logger.warning(
-                f'There are {count} exported components which can be called without any permission. Check it out!')
+        if len(unprotected) > 0:
+            self.report("exported-components-without-permission", "warning",
+                        f'There are {len(unprotected)} exported components which can be called without any '
+                        f'permission. Check it out!', components=unprotected)
         return res
 
     def analyzeUnexportedProviders(self):
@@ -474,8 +644,9 @@ class Analyzer:
         if len(res) > 1:
             msg = "providers"
         if len(res) > 0:
-            self.logger.warning(
-                f'Found {len(res)} unexported {msg} with grantUriPermissions set to True. Please make deeper checks!')
+            self.report("unexported-providers-grant-uri-permissions", "warning",
+                        f'Found {len(res)} unexported {msg} with grantUriPermissions set to True. '
+                        f'Please make deeper checks!', providers=list(res))
         if self.logger.level <= logging.WARNING:
             for e in res:
                 print(f'\t{e}')
@@ -501,8 +672,9 @@ class Analyzer:
         def allowed(condition=False):
             if condition:
                 print(colored("On Android 8.1 (API 27) and lower", attrs=["bold"]))
-            self.logger.warning("This app may intend to use cleartext network traffic "
-                                "such as HTTP to communicate with remote hosts")
+            self.report("cleartext-traffic", "warning", "This app may intend to use cleartext network traffic "
+                                                        "such as HTTP to communicate with remote hosts",
+                        usesCleartextTraffic=self.parser.usesCleartextTraffic())
             return True
 
         def forbidden(condition=False):
@@ -522,7 +694,7 @@ class Analyzer:
                 if condition:
                     # was already in the case <= 23
                     return allowed()
-                return handleVersion(allowed, forbidden, 28, self.args.min_sdk_version, self.args.max_sdk_version)
+                return self._handleVersion(allowed, forbidden, 28)
             return forbidden()
 
         def ignored(condition=False):
@@ -534,10 +706,18 @@ class Analyzer:
                 self.logger.info("APK network security configuration is defined. Please refer to this test instead.")
 
         if network_security_config_xml_file is not None:
-            return handleVersion(notIgnored, ignored, 24, self.args.min_sdk_version, self.args.max_sdk_version)
+            return self._handleVersion(notIgnored, ignored, 24)
 
         return notIgnored()
 
+    def _formatUris(self, uris):
+        """
+        Lists the URIs to display, big UriSets are shown in their compressed form unless --expand-uris is used.
+        """
+        if isinstance(uris, UriSet) and not getattr(self.args, "expand_uris", False):
+            return uris.lines(MAX_DISPLAYED_URIS)
+        return list(uris)
+
     def getIntentFilterInfo(self):
         """
         Displays information about exported components Intent Filter (scheme, host, port, path)
@@ -553,6 +733,7 @@ class Analyzer:
                 if len(mt) > 40:
                     mt = "/\n".join(mt.split("/"))
                     intent_data[-1] = mt
+                intent_data[2] = "\n".join(self._formatUris(intent_data[2]))
                 row += intent_data
                 table.append(row)
         if len(table) > 0:
@@ -565,22 +746,33 @@ class Analyzer:
         """
         printSubTestInfo("Checking for AppLinks")
         res = self.parser.getUniversalLinks()
-        verified_hosts = {h for e in res if e.autoVerify for h in e.hosts}
+        verified_hosts = self._verifiedHosts()
+        if "dal" in self.started:
+            assetLinks = self.started["dal"].result()
+        else:
+            assetLinks = self._checkAssetLinks(verified_hosts)
 
         for host in verified_hosts:
-            # check if the assetlink.json is publicly accessible
             active_msg = colored("Digital Asset Link JSON file not found", "red")
-            if checkDigitalAssetLinks(host):
+            allowed = False
+            if assetLinks[host].available:
                 active_msg = colored(
                     f"Digital Asset Link JSON file found at https://{host}/.well-known/assetlinks.json", "green")
-            self.logger.warning(f'Found an applink with host "{host}":')
-            if self.logger.level <= logging.WARNING:
-                print(active_msg)
-
+                package = self.parser.getApkInfo().package
+                allowed = package in assetLinks[host].packages
+                if not allowed:
+                    active_msg += colored(f"\nbut it does not allow {package} to handle its links", "yellow")
             # only applink infos for this particular host
             applinks = [e for e in res if host in e.hosts]
             # might be used in multiple activities
             unique_names = {a.name for a in applinks}
+            self.report("app-link", "warning", f'Found an applink with host "{host}":', host=host,
+                        assetLinksAvailable=assetLinks[host].available,
+                        packageAllowed=allowed,
+                        components=sorted(unique_names))
+            if self.logger.level <= logging.WARNING:
+                print(active_msg)
+
             # separate by activities
             for name in unique_names:
                 # only applink infos for this particular host and for this activity
@@ -590,10 +782,30 @@ class Analyzer:
                                   f' with the following URI :', "yellow"))
                     # show the URI
                     for applink in applinks_with_this_name:
-                        for uri in applink.uris:
+                        for uri in self._formatUris(applink.uris):
                             print(f"\t\t{uri}")
         return len(verified_hosts)
 
+    def _verifiedHosts(self):
+        """
+        The hosts of the AppLinks, they are verified with Digital Asset Links.
+        """
+        return {h for e in self.parser.getUniversalLinks() if e.autoVerify for h in e.hosts}
+
+    def _checkAssetLinks(self, hosts):
+        """
+        Checks concurrently if the assetlink.json files of the hosts are publicly accessible.
+        :return: host -> AssetLinks
+        """
+        # requests is only loaded by the scans checking app links
+        from .assetLinks import AssetLinksChecker, AssetLinksCache
+        cachePath = getattr(self.args, "dal_cache", None)
+        checker = AssetLinksChecker(cache=AssetLinksCache(cachePath) if cachePath else None)
+        try:
+            return checker.checkAll(hosts)
+        finally:
+            checker.close()
+
     def isDeepLinkUsed(self):
         """
         Checks if APK defines DeepLink(s)
@@ -605,22 +817,42 @@ class Analyzer:
         # get component name and uris
         for name in unique_names:
             deeplinks = [e for e in res if e.name == name]
-            self.logger.warning(f'Found a deeplink in {deeplinks[0].tag} {deeplinks[0].name.split(".")[-1]}'
-                                f' with the following URI:')
-            for deeplink in deeplinks:
-                for uri in deeplink.uris:
-                    if self.logger.level <= logging.WARNING:
-                        print(f"\t{uri}")
+            uris = [uri for deeplink in deeplinks for uri in self._formatUris(deeplink.uris)]
+            self.report("deep-link", "warning", f'Found a deeplink in {deeplinks[0].tag} '
+                                                f'{deeplinks[0].name.split(".")[-1]} with the following URI:',
+                        component=name, tag=deeplinks[0].tag, uris=uris)
+            if self.logger.level <= logging.WARNING:
+                for uri in uris:
+                    print(f"\t{uri}")
         return len(unique_names) > 0
 
-    def analyzeIntentFilters(self):
+    def analyzeAppLinks(self):
         """
-        Regroups all functions related to Intent Filters analysis
+        Checks the AppLinks if the APK defines DeepLinks.
         """
-        self.getIntentFilterInfo()
-        if self.isDeepLinkUsed():
+        if len(self.parser.getUniversalLinks()) > 0:
             self.isAppLinkUsed()
 
+    def matchURLs(self, path):
+        """
+        Replays the URLs of a file (one per line, - for STDIN) against the deep links of the app
+        and displays the exported components that would handle each of them.
+        Returns the number of URLs handled by the app.
+        """
+        printTestInfo(f"Matching the URLs of {path} against the deep links")
+        matcher = self.parser.getDeepLinkMatcher()
+        count = 0
+        with (sys.stdin if path == "-" else open(path, errors="replace")) as f:
+            urls = (line.strip() for line in f)
+            for url, components in matcher.matchAll(url for url in urls if url):
+                if components:
+                    count += 1
+                    handlers = ", ".join(f'{name.split(".")[-1]} ({tag})' for name, tag in sorted(components))
+                    self.report("url-handled", "warning", f"{url} is handled by {handlers}", url=url,
+                                components=[{"name": name, "type": tag} for name, tag in sorted(components)])
+        self.logger.info(f"{count} URL(s) handled by the app")
+        return count
+
     def getExportedComponents(self):
         """
         Lists all exported components
@@ -651,12 +883,10 @@ class Analyzer:
         """
         # for unit tests allow to give a custom parser
         if nsParser is None:
-            nsf = self.parser.getNetworkSecurityConfigFile()
-            if nsf is None:
+            nsParser = self.parser.getNetworkSecParser()
+            if nsParser is None:
                 return
             printSubTestInfo("Analysing Network security trust anchors configuration")
-            nsParser = NetworkSecParser(nsf, self.parser.debuggable())
-        cert = namedtuple("Cert", "src overridePins")
 
         def show_config(inherited_ta):
             self.logger.info(f"Default trust-anchors are: {', '.join([e.src for e in inherited_ta])}")
@@ -675,19 +905,19 @@ class Analyzer:
             if condition:
                 print(colored("On Android 6 (API 23) and lower", attrs=["bold"]))
             # system and user as default
-            inherited_ta = [cert("system", False), cert("user", False)]
+            inherited_ta = [Cert("system", False), Cert("user", False)]
             return show_config(inherited_ta)
 
         def for24andabove(condition=False):
             if condition:
                 print(colored("On Android 7 (API 24) and higher", attrs=["bold"]))
             # only system as default
-            inherited_ta = [cert("system", False)]
+            inherited_ta = [Cert("system", False)]
             return show_config(inherited_ta)
 
         baseConfig = nsParser.getBaseConfig()
         if baseConfig is None or len(baseConfig.trustanchors) == 0:
-            return handleVersion(for23andlower, for24andabove, 24, self.args.min_sdk_version, self.args.max_sdk_version)
+            return self._handleVersion(for23andlower, for24andabove, 24)
         else:
             return show_config(baseConfig.trustanchors)
 
@@ -700,17 +930,17 @@ class Analyzer:
         """
         # for unit tests allow to give a custom parser
         if nsParser is None:
-            nsf = self.parser.getNetworkSecurityConfigFile()
-            if nsf is None:
+            nsParser = self.parser.getNetworkSecParser()
+            if nsParser is None:
                 return
             printSubTestInfo("Analysing Network security cleartext traffic configuration")
-            nsParser = NetworkSecParser(nsf)
 
         def ctallowed(condition=False):
             if condition:
                 print(colored("On Android 8.1 (API 27) and lower", attrs=["bold"]))
-            self.logger.warning("Clear text traffic is allowed for all domains.")
             doms = nsParser.getAllDomains(inheritedCT=True, withCT=False)
+            self.report("nsc-cleartext-traffic", "warning", "Clear text traffic is allowed for all domains.",
+                        exceptDomains=list(doms))
             doms = [f'\t{e}' for e in doms]
             if len(doms) > 0:
                 self.logger.info("Except for:")
@@ -730,7 +960,7 @@ class Analyzer:
 
         baseConfig = nsParser.getBaseConfig()
         if baseConfig is None or baseConfig.cleartextTrafficPermitted is None:
-            return handleVersion(ctallowed, ctNotAllowed, 28, self.args.min_sdk_version, self.args.max_sdk_version)
+            return self._handleVersion(ctallowed, ctNotAllowed, 28)
         if baseConfig.cleartextTrafficPermitted:
             return ctallowed()
         return ctNotAllowed()
@@ -745,11 +975,10 @@ class Analyzer:
         """
         # for unit tests allow to give a custom parser
         if nsParser is None:
-            nsf = self.parser.getNetworkSecurityConfigFile()
-            if nsf is None:
+            nsParser = self.parser.getNetworkSecParser()
+            if nsParser is None:
                 return
             printSubTestInfo("Analysing Network security certificate pinning configuration")
-            nsParser = NetworkSecParser(nsf, self.parser.debuggable())
 
         from datetime import datetime
         baseConfig = nsParser.getBaseConfig()
@@ -760,33 +989,58 @@ class Analyzer:
         # in the trust anchors, but if it is defined, the user might have added some
         for e in nsParser.getPinningInfo(inheritedTA=inherited_TA):
             msg = f"Pinning is configured for domain {e.domain}"
-            # color the expiration date if lower than today
             exp = f" (expires {e.pinset})"
-            color = "green"
-            if datetime.strptime(e.pinset, "%Y-%m-%d") < datetime.today():
-                color = "red"
-            msg += colored(exp, color)
-
+            expired = datetime.strptime(e.pinset, "%Y-%m-%d") < datetime.today()
+            # color the expiration date if lower than today
+            display = msg + colored(exp, "red" if expired else "green")
+            msg2 = ""
             # add warning if pinning can be bypassed
             if len(e.overridePins) > 0:
                 msg2 = " but can be bypassed by certificates signed by one of the CAs from this source"
                 if len(e.overridePins) > 1:
                     msg2 += "s"
                 msg2 += f": {', '.join(e.overridePins)}"
-                msg += colored(msg2, "yellow")
-            self.logger.info(msg)
+                display += colored(msg2, "yellow")
+
+            if expired or msg2:
+                # the pinning can be bypassed or will fail once the pins have expired
+                self.report("nsc-pinning-gap", "warning", msg + exp + msg2, display=display, domain=e.domain,
+                            expiration=e.pinset, expired=expired, overridePins=list(e.overridePins))
+            else:
+                self.logger.info(display)
+
+    def _startExternalOperations(self, facts, executor):
+        """
+        Starts the external operations (processes and network requests) the checks will need.
+        The checks wait for the results where they display them.
+        :param facts: The facts needed by the checks, see CHECKS.
+        :return: fact -> future(s)
+        """
+        started = {}
+        if "apksigner" in facts and self.isAPK and getattr(self.args, "apksigner", False):
+            started["apksigner"] = startAPKSigner(self.args.min_sdk_version, self.args.path, executor)
+        if "adb" in facts and self._isADBBackupPerformed():
+            started["adb"] = startBackup(self.packageName, executor)
+        if "dal" in facts:
+            hosts = self._verifiedHosts()
+            if hosts:
+                started["dal"] = executor.submit(self._checkAssetLinks, hosts)
+        return started
 
     def runAllTests(self):
+        """
+        Runs the checks enabled by the arguments (all by default, see CHECKS) and returns their findings.
+        """
         print(colored(f"Analysis of {self.args.path}", "magenta", attrs=["bold"]))
-        self.showApkInfo()
-        self.analyzeRequiredPerms()
-        self.analyzeCustomPerms()
-        self.analyzeBackupFeatures()
-        self.isDebuggable()
-        self.getNetworkConfigFile()
-        self.isCleartextTrafficAllowed()
-        self.getExportedComponents()
-        self.analyzeIntentFilters()
-        self.analyzeExportedComponent()
-        self.analyzeUnexportedProviders()
-        self.checkForFirebaseURL()
+        checks = enabledChecks(self.args)
+        # the slow external operations run while the manifest is analyzed, their results are displayed in order
+        with ThreadPoolExecutor(max_workers=EXTERNAL_WORKERS) as executor:
+            self.started = self._startExternalOperations(requiredFacts(checks), executor)
+            try:
+                for check in checks:
+                    getattr(self, CHECKS[check][0])()
+            finally:
+                self.started = {}
+        if getattr(self.args, "match_urls", None):
+            self.matchURLs(self.args.match_urls)
+        return self.findings.findings
@@ -0,0 +1,146 @@
+import mmap
+import struct
+import zlib
+from collections import namedtuple
+from zipfile import BadZipFile
+
+# https://pkware.cachefly.net/webdocs/casestudies/APPNOTE.TXT
+EOCD_SIGNATURE = b"PK\x05\x06"
+EOCD_SIZE = 22
+ZIP64_EOCD_LOCATOR_SIGNATURE = b"PK\x06\x07"
+ZIP64_EOCD_SIGNATURE = b"PK\x06\x06"
+CENTRAL_DIRECTORY_SIGNATURE = b"PK\x01\x02"
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+LOCAL_HEADER_SIZE = 30
+# the EOCD record ends with a comment of at most 65535 bytes
+MAX_COMMENT_SIZE = 0xFFFF
+
+STORED = 0
+DEFLATED = 8
+
+# where an entry is located in the archive and how it is compressed
+Entry = namedtuple("Entry", "name compression compressedSize size headerOffset")
+
+
+class APKArchive:
+    """
+    Read-only access to the files of an APK.
+
+    The APK is memory-mapped and its central directory is read once into a dictionary.
+    Stored entries (resources.arsc, ...) are handed out as memoryviews over the mapping without any copy,
+    deflated entries are inflated the first time they are read and kept.
+    Raises BadZipFile if the file is not a ZIP archive.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                raise BadZipFile("File is empty")
+        self.data = memoryview(self._mmap)
+        self.entries = {}
+        self._inflated = {}
+        try:
+            self._readCentralDirectory()
+        except (struct.error, IndexError) as e:
+            self.close()
+            raise BadZipFile(f"Truncated central directory: {e}")
+        except BadZipFile:
+            self.close()
+            raise
+
+    def _readCentralDirectory(self):
+        """
+        Indexes all the entries of the central directory.
+        """
+        end = self._mmap.rfind(EOCD_SIGNATURE, max(0, len(self._mmap) - EOCD_SIZE - MAX_COMMENT_SIZE))
+        if end == -1:
+            raise BadZipFile("File is not a zip file")
+        _, _, _, _, count, size, offset, _ = struct.unpack_from("<4sHHHHIIH", self.data, end)
+        # needed to find the APK Signing Block that precedes the central directory
+        self.endOfCentralDirectoryOffset = end
+        locator = end - 20
+        if locator >= 0 and self.data[locator:locator + 4] == ZIP64_EOCD_LOCATOR_SIGNATURE:
+            # the real values are in the ZIP64 end of central directory record
+            zip64End, = struct.unpack_from("<Q", self.data, locator + 8)
+            if self.data[zip64End:zip64End + 4] != ZIP64_EOCD_SIGNATURE:
+                raise BadZipFile("Corrupted ZIP64 end of central directory")
+            count, size, offset = struct.unpack_from("<QQQ", self.data, zip64End + 32)
+
+        self.centralDirectoryOffset = offset
+        position = offset
+        for _ in range(count):
+            if self.data[position:position + 4] != CENTRAL_DIRECTORY_SIGNATURE:
+                raise BadZipFile("Bad magic number for central directory")
+            compression, _, _, _, compressedSize, size, nameLength, extraLength, commentLength, _, _, _, \
+                headerOffset = struct.unpack_from("<HHHIIIHHHHHII", self.data, position + 10)
+            name = bytes(self.data[position + 46:position + 46 + nameLength]).decode("utf-8", "replace")
+            if 0xFFFFFFFF in (compressedSize, size, headerOffset):
+                size, compressedSize, headerOffset = self._zip64Sizes(
+                    position + 46 + nameLength, extraLength, size, compressedSize, headerOffset)
+            # like ZipFile, the last entry wins when a name is duplicated
+            self.entries[name] = Entry(name, compression, compressedSize, size, headerOffset)
+            position += 46 + nameLength + extraLength + commentLength
+
+    def _zip64Sizes(self, extra, extraLength, size, compressedSize, headerOffset):
+        """
+        Reads the 64 bits values of the ZIP64 extended information extra field.
+        Only the values set to 0xFFFFFFFF in the central directory are present, in this order.
+        """
+        end = extra + extraLength
+        while extra + 4 <= end:
+            tag, length = struct.unpack_from("<HH", self.data, extra)
+            if tag == 0x0001:
+                values = iter(struct.unpack_from(f"<{length // 8}Q", self.data, extra + 4))
+                if size == 0xFFFFFFFF:
+                    size = next(values)
+                if compressedSize == 0xFFFFFFFF:
+                    compressedSize = next(values)
+                if headerOffset == 0xFFFFFFFF:
+                    headerOffset = next(values)
+                break
+            extra += 4 + length
+        return size, compressedSize, headerOffset
+
+    def namelist(self):
+        return list(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def read(self, name):
+        """
+        Returns the content of a file of the archive.
+        Raises KeyError if there is no such file.
+        :rtype: memoryview for stored files, bytes for compressed ones
+        """
+        entry = self.entries[name]
+        if name in self._inflated:
+            return self._inflated[name]
+        header = entry.headerOffset
+        if self.data[header:header + 4] != LOCAL_HEADER_SIGNATURE:
+            raise BadZipFile(f"Bad magic number for file header of {name}")
+        # the name and extra field lengths of the local header can differ from the central directory ones
+        nameLength, extraLength = struct.unpack_from("<HH", self.data, header + 26)
+        start = header + LOCAL_HEADER_SIZE + nameLength + extraLength
+        content = self.data[start:start + entry.compressedSize]
+        if entry.compression == DEFLATED:
+            content = zlib.decompressobj(-zlib.MAX_WBITS).decompress(content)
+            self._inflated[name] = content
+        elif entry.compression != STORED:
+            raise NotImplementedError(f"Compression method {entry.compression} is not supported for {name}")
+        return content
+
+    def close(self):
+        """
+        Releases the mapping, the memoryviews handed out must not be used anymore.
+        While some of them are still referenced the mapping cannot be closed, it is then unmapped by the
+        garbage collector once they are dropped.
+        """
+        self.data.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
@@ -1,94 +1,149 @@
 from .parser import Parser
-from zipfile import ZipFile, BadZipfile
+from .networkSecParser import NetworkSecParser
+from .manifestIndex import ManifestIndex
+from .axmlDecoder import decodeAXML, iterAXML
+from .resourceTable import ResourceTable
+from .apkArchive import APKArchive
+from zipfile import BadZipFile
 from pyaxmlparser.axmlprinter import AXMLPrinter
-from pyaxmlparser.arscparser import ARSCParser
-import xml.etree.ElementTree as ET
 import re
 from .constants import protection_levels
 # for virtual file handling in case of APK
 from io import StringIO
-from .utils import unformatFilename, str2Bool
-from collections import namedtuple
+from .utils import unformatFilename, str2Bool, parseXML, memoized
+from .records import CustomPerm, Rule, ExtractionRules
+import xml.etree.ElementTree as ET
+
+# resource IDs as written by AXMLPrinter
+RESOURCE_ID = re.compile(r"@([\dA-F]{8})")
 
 
 class APKParser(Parser):
 
-    def __init__(self, path):
+    def __init__(self, path, streaming=False):
+        """
+        :param path: The path of the APK.
+        :param streaming: Only keep the facts of the manifest needed by the analysis, see Parser.
+        """
+        self.streaming = streaming
         try:
-            # Unzip the APK
-            self.apk = ZipFile(path)
+            # Map the APK and index its files
+            self.apk = APKArchive(path)
+            # resolved resource IDs, shared by all the XML files of the APK
+            self._resources = {}
             # Does not always have a resource file so this might be None
             self.rsc = self._getApkFileContent("resources.arsc")
             if self.rsc is not None:
-                self.rsc = ARSCParser(self.rsc)
+                self.rsc = ResourceTable(self.rsc)
             # this can change self.apk to None if there is no manifest in the ZIP file
             self._loadManifest()
-        except BadZipfile:
+        except BadZipFile:
             self.apk = None
 
+    def close(self):
+        """
+        Releases the APK file, the parser must not be used anymore.
+        """
+        if self.apk is None:
+            return
+        # the resource table and the cached results can hold memoryviews over the mapping of the APK
+        self.rsc = None
+        self._resources = {}
+        self.invalidate()
+        self.apk.close()
+        self.apk = None
+
     def _getApkFileContent(self, path):
         """
         Reads a file from the APK.
         """
         # the pythonic way of checking if a file exists
         try:
-            return self.apk.open(path, "r").read()
+            return self.apk.read(path)
         except KeyError:
             pass
 
     def _getResource(self, rid, package_name=None):
         """
-        Transforms an ID of the form @7F0A01BF into @xml/network_security_config.
-        :param rid: the ID
+        Transforms an ID of the form 0x7F0A01BF into @xml/network_security_config.
+        :param rid: the ID (int)
         :param package_name: The package name
         :return: The resource path
         """
+        key = (rid, package_name)
+        if key not in self._resources:
+            self._resources[key] = self._resolveResource(rid, package_name)
+        return self._resources[key]
+
+    def _resolveResource(self, rid, package_name=None):
+        """
+        Looks up a resource ID in resources.arsc, see _getResource.
+        """
         if self.rsc is None:
             # if there is no resources.arsc we can't do anything
             # this should never happen tho
-            return rid
+            return f"@{rid:08X}"
         if package_name is None:
             # I don't know how to handle the case when there are multiple package names yet
-            package_name = self.rsc.get_packages_names()[0]
-        rid = int(rid.strip("@"), 16)
-        res_type, name, _ = self.rsc.get_id(package_name, rid)
+            package_name = self.rsc.getPackagesNames()[0]
+        res_type, name, _ = self.rsc.getId(package_name, rid)
         if res_type == "string":
-            # index 0 is name, index 1 is the resolved string
-            return self.rsc.get_string(package_name, name)[1]
+            return self.rsc.getString(package_name, name)
         return f"@{res_type}/{name}"
 
     def _getCleanXML(self, path):
         """
-        Transforms an AXML converted XML file into something closer to the original XML.
+        Transforms an AXML file into a tree as close as possible to the original XML.
         All resource IDs are replaced with their original values.
+        :return: The tree and the namespaces of the document
         """
         file_content = self._getApkFileContent(path)
         if file_content is None:
             return
-        bad_xml = AXMLPrinter(self.apk.open(path, "r").read()).get_xml().decode()
-        # find all @XXXXXXXX resource IDs
-        rsc_ids = set(re.findall(r"(@[\dA-F]{8})", bad_xml))
-        for rid in rsc_ids:
-            # replace the IDs with the correct resource name
-            bad_xml = bad_xml.replace(rid, self._getResource(rid))
-        return StringIO(bad_xml)
+        xml = decodeAXML(file_content, self._getResource)
+        if xml is not None:
+            return xml
+        # the chunk stream could not be walked, let AXMLPrinter do its best
+        bad_xml = AXMLPrinter(bytes(file_content)).get_xml().decode()
+        # replace all @XXXXXXXX resource IDs with the correct resource name in a single pass,
+        # the unresolved ones are kept
+        bad_xml = RESOURCE_ID.sub(lambda m: self._getResource(int(m.group(1), 16)) or m.group(0), bad_xml)
+        return parseXML(StringIO(bad_xml))
 
     def _loadManifest(self):
         """
         Initializes the manifest's tree and root objects and loads the namespaces.
         """
-        path = self._getCleanXML("AndroidManifest.xml")
-        if path is None:
+        if self.streaming and self._streamManifest():
+            return
+        xml = self._getCleanXML("AndroidManifest.xml")
+        if xml is None:
             # this means we don't have a valid APK but a simple ZIP file
             # error will propagate
-            self.apk = None
+            self.close()
             return
-        # here we have a clean manifest in a virtual file
-        self.namespaces = dict([node for _, node in ET.iterparse(path, events=['start-ns'])])
-        # because it's the same file object, we have to rewind to the beginning before parsing again
-        path.seek(0)
-        self.tree = ET.parse(path)
+        self.tree, self.namespaces = xml
         self.root = self.tree.getroot()
+        self.index = ManifestIndex(self.root, self._getattr)
+        if self.streaming:
+            self.tree, self.root = None, None
+
+    def _streamManifest(self):
+        """
+        Indexes the manifest while it is decoded without keeping its tree.
+        Returns False if it could not be decoded this way.
+        """
+        file_content = self._getApkFileContent("AndroidManifest.xml")
+        if file_content is None:
+            return False
+        self.namespaces = {}
+        self.index = ManifestIndex(None, self._getattr)
+        try:
+            self.index.consume(iterAXML(file_content, self._getResource), self.namespaces)
+        except ET.ParseError:
+            return False
+        self.tree, self.root = None, None
+        return True
 
     def customPermissions(self):
         """
@@ -97,9 +152,8 @@ class APKParser(Parser):
 
         In the case of APK, custom permission protection level is an Int.
         """
-        CustomPerm = namedtuple("CustomPerm", "name protectionLevel")
         res = []
-        for perm in self.root.findall('permission'):
+        for perm in self.index.findall('permission'):
             name = self._getattr(perm, "android:name")
             # Get the protection level name from its enum value
             protectionLevel = int(self._getattr(perm, "android:protectionLevel"), 16)
@@ -115,19 +169,14 @@ class APKParser(Parser):
         """
         if package_name is None:
             # I don't know how to handle the case when there are multiple package names yet
-            package_name = self.rsc.get_packages_names()[0]
+            package_name = self.rsc.getPackagesNames()[0]
         # recover the rid from the resource type and filename
-        rid = self.rsc.resource_keys[package_name][resType][name]
-        # get_res_configs returns a list of tuples
-        # we only care about the first element of this list
-        # and the second element of the tuple is a ARSCResTableEntry
-        # https://github.com/appknox/pyaxmlparser/blob/d111a4fc6330a0c293ffc2f114af360eb78ad2ef/pyaxmlparser/arscutil.py#L509
-        # the key attribute holds a ARSCResStringPoolRef
-        # https://github.com/appknox/pyaxmlparser/blob/d111a4fc6330a0c293ffc2f114af360eb78ad2ef/pyaxmlparser/arscutil.py#L580
-        # the get_data_value function gives us what we are looking for
-        real_path = self.rsc.get_res_configs(rid)[0][1].key.get_data_value()
+        rid = self.rsc.getResourceId(package_name, resType, name)
+        # the value of a file resource is its path, we only care about the first configuration
+        real_path = self.rsc.getValue(rid)
         return real_path
 
+    @memoized
     def getNetworkSecurityConfigFile(self):
         """
         Extracts the network_security_config file content.
@@ -139,13 +188,23 @@ class APKParser(Parser):
         path = self._realPathFromTypeAndName("xml", unformatFilename(filename).split(".")[0])
         return self._getCleanXML(path)
 
+    @memoized
+    def getNetworkSecParser(self):
+        """
+        Returns the parser of the network_security_config file or None.
+        The file is decoded and parsed once and the parser is shared by all the checks.
+        """
+        nsf = self.getNetworkSecurityConfigFile()
+        if nsf is None:
+            return
+        return NetworkSecParser(nsf, self.debuggable())
+
     def getAllRules(self, root):
         """
         Convenient function to gather all rules in a backup configuration file element.
         https://developer.android.com/guide/topics/data/autobackup#xml-include-exclude
         """
         # requireFlags is only for type "include"
-        Rule = namedtuple("Rule", "type domain path requireFlags")
         res = []
         for e in root:
             t = e.tag
@@ -155,6 +214,7 @@ class APKParser(Parser):
             res.append(Rule(t, d, p, rf))
         return res
 
+    @memoized
     def getFullBackupContentRules(self):
         """
         Parses the fullBackupContent file and returns all the rules defined in there.
@@ -166,10 +226,11 @@ class APKParser(Parser):
         if filename is not None:
             path = self._realPathFromTypeAndName("xml", unformatFilename(filename).split(".")[0])
             xml = self._getCleanXML(path)
-            root = ET.parse(xml).getroot()
+            root = xml[0].getroot()
             res = self.getAllRules(root)
         return res
 
+    @memoized
     def getDataExtractionRulesContent(self):
         """
         Parses the dataExtractionRules file.
@@ -177,13 +238,11 @@ class APKParser(Parser):
         https://developer.android.com/guide/topics/data/autobackup#xml-syntax-android-12
         """
         # disableIfNoEncryptionCapabilities is only for <cloud-Backup>
-        ExtractionRules = namedtuple("ExtractionRules", "cloudBackupRules disableIfNoEncryptionCapabilities "
-                                                        "deviceTransferRules")
         filename = self.dataExtractionRules()
         if filename is not None:
             path = self._realPathFromTypeAndName("xml", unformatFilename(filename).split(".")[0])
             xml = self._getCleanXML(path)
-            root = ET.parse(xml).getroot()
+            root = xml[0].getroot()
             cloudBackupRules = []
             disableIfNoEncryptionCapabilities = None
             deviceTransferRules = []
@@ -198,11 +257,20 @@ class APKParser(Parser):
                 deviceTransferRules = self.getAllRules(dt)
             return ExtractionRules(cloudBackupRules, disableIfNoEncryptionCapabilities, deviceTransferRules)
 
+    @memoized
+    def getSignatures(self):
+        """
+        Reads the signature schemes of the APK (see apkSignature.readSignatures).
+        """
+        # asn1crypto is only loaded by the scans checking the signature
+        from .apkSignature import readSignatures
+        return readSignatures(self.apk)
+
     def hasFile(self, path):
         """
         Simply checks if a file is present in the ZIP archive.
         """
-        return path in self.apk.namelist()
+        return path in self.apk
 
     def searchInStrings(self, pattern):
         """
@@ -211,9 +279,9 @@ class APKParser(Parser):
         res = []
         if self.rsc:
             # I don't know how to handle the case when there are multiple package names yet
-            package_name = self.rsc.get_packages_names()[0]
-            # get_resolved_strings does not recompute all the strings every time, so it's fine
-            for s in self.rsc.get_resolved_strings()[package_name]["DEFAULT"].values():
+            package_name = self.rsc.getPackagesNames()[0]
+            # the strings are only decoded once, so it's fine
+            for s in self.rsc.getStrings(package_name):
                 if re.search(pattern, s, re.IGNORECASE):
                     res.append(s)
         return res
@@ -0,0 +1,236 @@
+import re
+import struct
+import hashlib
+from asn1crypto import cms, keys, x509
+from .records import Certificate, Signer, SignatureScheme
+
+# https://source.android.com/docs/security/features/apksigning/v2#apk-signing-block
+APK_SIGNING_BLOCK_MAGIC = b"APK Sig Block 42"
+# ID of the block of each scheme in the APK Signing Block
+SCHEME_BLOCK_IDS = {
+    "v2": 0x7109871a,
+    "v3": 0xf05368c0,
+    "v3.1": 0x1b93ad61,
+}
+# signature algorithm ID -> (name, content digest algorithm or None if the digest is not chunked)
+# https://source.android.com/docs/security/features/apksigning/v2#signature-algorithm-ids
+SIGNATURE_ALGORITHMS = {
+    0x0101: ("RSASSA-PSS with SHA2-256", "sha256"),
+    0x0102: ("RSASSA-PSS with SHA2-512", "sha512"),
+    0x0103: ("RSASSA-PKCS1-v1_5 with SHA2-256", "sha256"),
+    0x0104: ("RSASSA-PKCS1-v1_5 with SHA2-512", "sha512"),
+    0x0201: ("ECDSA with SHA2-256", "sha256"),
+    0x0202: ("ECDSA with SHA2-512", "sha512"),
+    0x0301: ("DSA with SHA2-256", "sha256"),
+    0x0421: ("RSASSA-PKCS1-v1_5 with SHA2-256 (verity)", None),
+    0x0423: ("ECDSA with SHA2-256 (verity)", None),
+    0x0425: ("DSA with SHA2-256 (verity)", None),
+}
+CHUNK_SIZE = 1024 * 1024
+# JAR signature files and signature blocks
+# https://docs.oracle.com/javase/8/docs/technotes/guides/jar/jar.html#Signed_JAR_File
+SIGNATURE_FILE = re.compile(r"META-INF/([^/]+)\.SF")
+SIGNATURE_BLOCK_EXTENSIONS = ("RSA", "DSA", "EC")
+
+
+def _lengthPrefixed(data, offset):
+    """
+    Reads a value prefixed by its length on 4 bytes, returns it and the offset of what follows.
+    """
+    length, = struct.unpack_from("<I", data, offset)
+    offset += 4
+    if offset + length > len(data):
+        raise ValueError("length-prefixed value out of bounds")
+    return data[offset:offset + length], offset + length
+
+
+def _sequence(data):
+    """
+    Iterates over a length-prefixed sequence of length-prefixed values.
+    """
+    offset = 0
+    while offset < len(data):
+        value, offset = _lengthPrefixed(data, offset)
+        yield value
+
+
+def findSigningBlock(archive):
+    """
+    Finds the APK Signing Block located right before the central directory.
+    :return: The offset of the block and the ID -> value pairs it contains, or None if there is no block.
+    """
+    data = archive.data
+    end = archive.centralDirectoryOffset
+    if end < 32 or bytes(data[end - 16:end]) != APK_SIGNING_BLOCK_MAGIC:
+        return None
+    size, = struct.unpack_from("<Q", data, end - 24)
+    start = end - size - 8
+    if start < 0 or struct.unpack_from("<Q", data, start)[0] != size:
+        return None
+    pairs = {}
+    offset = start + 8
+    while offset + 12 <= end - 24:
+        length, pairId = struct.unpack_from("<QI", data, offset)
+        if length < 4 or offset + 8 + length > end - 24:
+            break
+        pairs[pairId] = data[offset + 12:offset + 8 + length]
+        offset += 8 + length
+    return start, pairs
+
+
+def _certificate(cert):
+    """
+    Summarizes an asn1crypto X.509 certificate.
+    """
+    return Certificate(cert.subject.human_friendly,
+                       cert.issuer.human_friendly,
+                       cert.serial_number,
+                       cert.not_valid_before,
+                       cert.not_valid_after,
+                       hashlib.sha256(cert.dump()).hexdigest())
+
+
+def _publicKey(publicKeyInfo):
+    """
+    Returns the algorithm (RSA, EC, DSA) and the size in bits of a public key.
+    """
+    return publicKeyInfo.algorithm.upper(), publicKeyInfo.bit_size
+
+
+def _parseSigner(data, scheme):
+    """
+    Parses a v2 or v3 signer.
+    https://source.android.com/docs/security/features/apksigning/v2#v2-verification
+    https://source.android.com/docs/security/features/apksigning/v3#format
+    :return: The Signer and its content digests (signature algorithm ID -> digest).
+    """
+    signedData, offset = _lengthPrefixed(data, 0)
+    minSdk, maxSdk = None, None
+    if scheme != "v2":
+        minSdk, maxSdk = struct.unpack_from("<II", data, offset)
+        offset += 8
+    _, offset = _lengthPrefixed(data, offset)
+    publicKey, _ = _lengthPrefixed(data, offset)
+
+    digestsData, offset = _lengthPrefixed(signedData, 0)
+    certificatesData, _ = _lengthPrefixed(signedData, offset)
+    digests = {}
+    for digest in _sequence(digestsData):
+        algorithm, = struct.unpack_from("<I", digest, 0)
+        value, _ = _lengthPrefixed(digest, 4)
+        digests[algorithm] = bytes(value)
+    certificates = [_certificate(x509.Certificate.load(bytes(c))) for c in _sequence(certificatesData)]
+    keyAlgorithm, keySize = _publicKey(keys.PublicKeyInfo.load(bytes(publicKey)))
+    names = {SIGNATURE_ALGORITHMS.get(algorithm, (f"0x{algorithm:04x}",))[0]: digest.hex()
+             for algorithm, digest in digests.items()}
+    return Signer(certificates, keyAlgorithm, keySize, names, minSdk, maxSdk), digests
+
+
+def _contentDigest(archive, signingBlockOffset, algorithm):
+    """
+    Computes the chunked digest of the contents of the APK protected by the v2+ schemes:
+    the ZIP entries, the central directory and the end of central directory (pointing to the signing block).
+    https://source.android.com/docs/security/features/apksigning/v2#integrity-protected-contents
+    """
+    data = archive.data
+    eocd = bytearray(data[archive.endOfCentralDirectoryOffset:])
+    # the offset of the central directory is replaced by the offset of the signing block
+    struct.pack_into("<I", eocd, 16, signingBlockOffset)
+    sections = [data[:signingBlockOffset],
+                data[archive.centralDirectoryOffset:archive.endOfCentralDirectoryOffset],
+                eocd]
+    chunks = []
+    for section in sections:
+        for start in range(0, len(section), CHUNK_SIZE):
+            chunk = section[start:start + CHUNK_SIZE]
+            h = hashlib.new(algorithm, b"\xa5" + struct.pack("<I", len(chunk)))
+            h.update(chunk)
+            chunks.append(h.digest())
+    return hashlib.new(algorithm, b"\x5a" + struct.pack("<I", len(chunks)) + b"".join(chunks)).digest()
+
+
+def _verifyDigests(archive, signingBlockOffset, signersDigests, computed):
+    """
+    Checks the content digests declared by the signers against the APK.
+    :param computed: The content digests already computed (hash name -> digest), shared by all the schemes
+                     so the APK is only hashed once per hash algorithm.
+    :return: True or False, or None if no digest could be checked.
+    """
+    res = None
+    for digests in signersDigests:
+        for algorithm, digest in digests.items():
+            hashName = SIGNATURE_ALGORITHMS.get(algorithm, (None, None))[1]
+            if hashName is None:
+                continue
+            if hashName not in computed:
+                computed[hashName] = _contentDigest(archive, signingBlockOffset, hashName)
+            if computed[hashName] != digest:
+                return False
+            res = True
+    return res
+
+
+def _readJarSignature(archive):
+    """
+    Reads the signers of the JAR signature (v1 scheme): the PKCS #7 signature blocks of the META-INF directory.
+    Raises ValueError, KeyError or TypeError if a signature block cannot be parsed.
+    :return: The signers or None if there is no signature file.
+    """
+    signers = None
+    for name in archive.namelist():
+        match = SIGNATURE_FILE.fullmatch(name)
+        if match is None:
+            continue
+        if signers is None:
+            signers = []
+        for extension in SIGNATURE_BLOCK_EXTENSIONS:
+            block = f"META-INF/{match.group(1)}.{extension}"
+            if block in archive:
+                content = cms.ContentInfo.load(bytes(archive.read(block)))["content"]
+                certificates = [c.chosen for c in content["certificates"] or []]
+                if not certificates:
+                    continue
+                keyAlgorithm, keySize = _publicKey(certificates[0].public_key)
+                signers.append(Signer([_certificate(c) for c in certificates], keyAlgorithm, keySize, {},
+                                      None, None))
+                break
+    return signers
+
+
+def readSignatures(archive):
+    """
+    Reads the signature schemes of an APK without verifying the signatures themselves.
+    The content digests of the v2+ schemes are recomputed and checked.
+    https://source.android.com/docs/security/features/apksigning
+
+    :param archive: An APKArchive.
+    :return: A SignatureScheme for each scheme the APK is signed with (v1, v2, v3 and v3.1).
+             A scheme that could not be parsed is reported without signers.
+    """
+    res = []
+    try:
+        signers = _readJarSignature(archive)
+        if signers is not None:
+            # a signature file without a valid signature block is malformed
+            res.append(SignatureScheme("v1", signers, None if signers else False))
+    except (ValueError, KeyError, TypeError):
+        res.append(SignatureScheme("v1", [], False))
+
+    block = findSigningBlock(archive)
+    if block is None:
+        return res
+    signingBlockOffset, pairs = block
+    computed = {}
+    for scheme, blockId in SCHEME_BLOCK_IDS.items():
+        if blockId not in pairs:
+            continue
+        try:
+            signersData, _ = _lengthPrefixed(pairs[blockId], 0)
+            parsed = [_parseSigner(s, scheme) for s in _sequence(signersData)]
+            signers = [signer for signer, _ in parsed]
+            digestsVerified = _verifyDigests(archive, signingBlockOffset, [digests for _, digests in parsed],
+                                             computed)
+        except (ValueError, KeyError, TypeError, struct.error):
+            signers, digestsVerified = [], False
+        res.append(SignatureScheme(scheme, signers, digestsVerified))
+    return res
@@ -0,0 +1,226 @@
+import os
+import json
+import socket
+import time
+import logging
+import tempfile
+import requests
+from urllib.parse import quote
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+try:
+    from urllib3.exceptions import NameResolutionError
+except ImportError:
+    # urllib3 < 2 raises a NewConnectionError while handling the socket.gaierror
+    NameResolutionError = None
+from concurrent.futures import ThreadPoolExecutor, wait
+from .config import (
+    DAL_WORKERS,
+    DAL_TIMEOUT,
+    DAL_DEADLINE,
+    DAL_RETRIES,
+    DAL_BACKOFF,
+    DAL_CACHE_TTL,
+    DAL_NEGATIVE_CACHE_TTL
+)
+from .records import AssetLinks
+
+logger = logging.getLogger("MainLogger")
+
+# https://developer.android.com/training/app-links/verify-android-applinks#web-assoc
+ASSET_LINKS_URL = "https://{host}/.well-known/assetlinks.json"
+# statuses worth retrying, the others are final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+HANDLE_ALL_URLS = "delegate_permission/common.handle_all_urls"
+
+
+def _isUnknownHost(error):
+    """
+    A host that cannot be resolved is not worth retrying.
+    """
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    if NameResolutionError is not None:
+        return isinstance(reason, NameResolutionError)
+    return isinstance(reason, NewConnectionError) and isinstance(reason.__context__, socket.gaierror)
+
+
+def parseAssetLinks(host, content):
+    """
+    Extracts the Android apps allowed to handle the links of a host from its assetlinks.json content.
+    https://developers.google.com/digital-asset-links/v1/statements
+    Malformed files give no package.
+    """
+    packages = {}
+    try:
+        statements = json.loads(content)
+    except ValueError:
+        return AssetLinks(host, True, packages)
+    for statement in statements if isinstance(statements, list) else []:
+        if not isinstance(statement, dict) or HANDLE_ALL_URLS not in statement.get("relation", []):
+            continue
+        target = statement.get("target")
+        if isinstance(target, dict) and target.get("namespace") == "android_app" and "package_name" in target:
+            packages.setdefault(target["package_name"], []).extend(target.get("sha256_cert_fingerprints", []))
+    return AssetLinks(host, True, packages)
+
+
+class AssetLinksCache:
+    """
+    An on-disk cache of the parsed assetlinks.json files, shared by the analyses (and the processes of a batch).
+    Each host has its own JSON file written atomically. Missing files are cached too (negative caching)
+    but for a shorter time.
+    """
+
+    def __init__(self, path, ttl=DAL_CACHE_TTL, negativeTTL=DAL_NEGATIVE_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negativeTTL = negativeTTL
+        # entries already read by this process
+        self._entries = {}
+
+    def _file(self, host):
+        return os.path.join(self.path, f"{quote(host, safe='')}.json")
+
+    def get(self, host):
+        """
+        Returns the AssetLinks of a host or None if it is not cached or has expired.
+        """
+        entry = self._entries.get(host)
+        if entry is None:
+            try:
+                with open(self._file(host)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._entries[host] = entry
+        ttl = self.ttl if entry["available"] else self.negativeTTL
+        if time.time() - entry["time"] > ttl:
+            return None
+        return AssetLinks(host, entry["available"], entry["packages"])
+
+    def put(self, assetLinks):
+        entry = {"time": time.time(), "available": assetLinks.available, "packages": assetLinks.packages}
+        self._entries[assetLinks.host] = entry
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp, self._file(assetLinks.host))
+        except OSError as e:
+            logger.debug(f"Could not cache the Digital Asset Links of {assetLinks.host}: {e}")
+
+
+class AssetLinksChecker:
+    """
+    Checks if the Digital Asset Links JSON files of many hosts are publicly available.
+
+    The files are fetched concurrently by a bounded pool of threads sharing one session, so the connections are
+    pooled. Each request has a timeout and is retried with an exponential backoff on connection errors, timeouts
+    and transient statuses, and the whole check has a deadline: a slow host cannot stall the analysis.
+    With a cache, the hosts already checked are not fetched again.
+    """
+
+    def __init__(self, workers=DAL_WORKERS, timeout=DAL_TIMEOUT, deadline=DAL_DEADLINE, retries=DAL_RETRIES,
+                 backoff=DAL_BACKOFF, url=ASSET_LINKS_URL, verify=True, cache=None):
+        """
+        :param cache: An AssetLinksCache or None.
+        :param timeout: The timeout of each request in seconds.
+        :param deadline: The time allowed to check all the hosts in seconds.
+        :param retries: The number of retries after the first attempt.
+        :param backoff: The delay before the first retry in seconds, it is doubled after each retry.
+        :param url: The URL of the file with a {host} placeholder (useful to test against a local server).
+        :param verify: Verify the certificates (True) or the path of the CA bundle to use.
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.url = url
+        self.cache = cache
+        self.session = requests.Session()
+        self.session.verify = verify
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch(self, host, end=None):
+        """
+        Fetches the file of a host.
+        :param end: The time.monotonic() value after which no request is sent.
+        :return: The response or None if the file could not be fetched.
+        :rtype: requests.Response
+        """
+        if end is None:
+            end = time.monotonic() + self.deadline
+        url = self.url.format(host=host)
+        delay = self.backoff
+        response = None
+        for attempt in range(self.retries + 1):
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                response = self.session.get(url, timeout=min(self.timeout, remaining))
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                response = None
+                if _isUnknownHost(e):
+                    break
+            except requests.exceptions.RequestException as e:
+                logger.debug(f"{url}: {e}")
+                return None
+            if attempt < self.retries:
+                time.sleep(max(0, min(delay, end - time.monotonic())))
+                delay *= 2
+        return response
+
+    def check(self, host, end=None):
+        """
+        Checks if the file of a host is publicly available (HTTP 200) and parses it.
+        :rtype: AssetLinks
+        """
+        if self.cache is not None:
+            cached = self.cache.get(host)
+            if cached is not None:
+                return cached
+        if end is None:
+            end = time.monotonic() + self.deadline
+        response = self.fetch(host, end)
+        if response is not None and response.status_code == 200:
+            res = parseAssetLinks(host, response.content)
+        else:
+            res = AssetLinks(host, False, {})
+        # a host that could not be checked before the deadline may be available
+        if self.cache is not None and (response is not None or time.monotonic() < end):
+            self.cache.put(res)
+        return res
+
+    def checkAll(self, hosts):
+        """
+        Checks the hosts concurrently.
+        The hosts that could not be checked before the deadline are considered as not available.
+        :return: host -> AssetLinks, in the order of hosts
+        """
+        hosts = list(hosts)
+        res = {host: self.cache.get(host) if self.cache is not None else None for host in hosts}
+        missing = [host for host in hosts if res[host] is None]
+        if not missing:
+            return res
+        end = time.monotonic() + self.deadline
+        executor = ThreadPoolExecutor(max_workers=min(self.workers, len(missing)))
+        futures = {host: executor.submit(self.check, host, end) for host in missing}
+        wait(futures.values(), timeout=self.deadline)
+        # do not wait for the requests still running, they end with their timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+        for host, f in futures.items():
+            if f.done() and not f.cancelled() and f.exception() is None:
+                res[host] = f.result()
+            else:
+                res[host] = AssetLinks(host, False, {})
+        return res
+
+    def close(self):
+        self.session.close()
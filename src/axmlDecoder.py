@@ -0,0 +1,230 @@
+import re
+import struct
+import xml.etree.ElementTree as ET
+from pyaxmlparser.utils import format_value
+from pyaxmlparser.resources import public
+
+# Chunk types of the binary XML format
+# https://android.googlesource.com/platform/frameworks/base/+/master/libs/androidfw/include/androidfw/ResourceTypes.h
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_TYPE = 0x0003
+RES_XML_START_NAMESPACE_TYPE = 0x0100
+RES_XML_END_NAMESPACE_TYPE = 0x0101
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_END_ELEMENT_TYPE = 0x0103
+RES_XML_CDATA_TYPE = 0x0104
+RES_XML_LAST_CHUNK_TYPE = 0x017f
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+
+# Res_value types that hold a resource ID
+TYPE_REFERENCE = 0x01
+TYPE_DYNAMIC_REFERENCE = 0x07
+
+UTF8_FLAG = 1 << 8
+NO_INDEX = 0xFFFFFFFF
+
+INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9._-]")
+INVALID_VALUE_CHARS = re.compile("[^\u0020-\uD7FF\u0009\u000A\u000D\uE000-\uFFFD\U00010000-\U0010FFFF]")
+
+
+class StringPool:
+    """
+    A ResStringPool chunk. Strings are only decoded when they are accessed.
+    https://android.googlesource.com/platform/frameworks/base/+/master/libs/androidfw/include/androidfw/ResourceTypes.h#443
+    """
+
+    def __init__(self, data, offset):
+        _, headerSize, self.size, count, _, flags, stringsStart, _ = struct.unpack_from("<HHIIIIII", data, offset)
+        self.data = data
+        self.isUTF8 = (flags & UTF8_FLAG) != 0
+        self.offsets = struct.unpack_from(f"<{count}I", data, offset + headerSize)
+        self.stringsStart = offset + stringsStart
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, idx):
+        if idx in self._cache:
+            return self._cache[idx]
+        if idx >= len(self.offsets):
+            # 0xFFFFFFFF is used when there is no string
+            return ""
+        offset = self.stringsStart + self.offsets[idx]
+        if self.isUTF8:
+            # the length in characters then the length in bytes, both on 1 or 2 bytes
+            offset += 2 if self.data[offset] & 0x80 else 1
+            length = self.data[offset]
+            if length & 0x80:
+                length = ((length & 0x7F) << 8) | self.data[offset + 1]
+                offset += 1
+            offset += 1
+            res = bytes(self.data[offset:offset + length]).decode("utf-8", "replace")
+        else:
+            # the length in characters on 2 or 4 bytes
+            length, = struct.unpack_from("<H", self.data, offset)
+            offset += 2
+            if length & 0x8000:
+                length = ((length & 0x7FFF) << 16) | struct.unpack_from("<H", self.data, offset)[0]
+                offset += 2
+            res = bytes(self.data[offset:offset + length * 2]).decode("utf-16-le", "replace")
+        self._cache[idx] = res
+        return res
+
+
+def _fixName(name):
+    """
+    Applies the same fixes as pyaxmlparser's AXMLPrinter to element and attribute names
+    so the decoded tree is identical to the one of the printed XML.
+    """
+    if not name[0].isalpha() and name[0] != "_":
+        name = f"_{name}"
+    if name.startswith("android:"):
+        name = name[len("android:"):]
+    return INVALID_NAME_CHARS.sub("_", name)
+
+
+def _fixValue(value):
+    """
+    Reads a value until the first null byte (like aapt does) and replaces the characters that are not allowed in XML.
+    """
+    if "\x00" in value:
+        value = value[:value.find("\x00")]
+    return INVALID_VALUE_CHARS.sub("_", value)
+
+
+def decodeAXML(data, resolve=None):
+    """
+    Decodes a binary XML (AXML) file directly into an element tree by walking its chunk stream.
+    https://android.googlesource.com/platform/frameworks/base/+/master/libs/androidfw/include/androidfw/ResourceTypes.h#563
+
+    Attribute values are formatted like pyaxmlparser does (true/false, 0x0000000A, ...).
+    Resource references of the application (@7F0A01BF) are resolved with the resolve function
+    as the attributes are read, so there is no need to serialize and parse the document again.
+
+    :param data: The content of the AXML file (bytes or memoryview).
+    :param resolve: A function transforming a resource ID (int) into its value, or None to keep the ID.
+    :return: The tree and the namespaces declared in the document (prefix -> URI),
+             or None if the data is not a well-formed AXML chunk stream.
+    :rtype: (xml.etree.ElementTree.ElementTree, dict)
+    """
+    namespaces = {}
+    root = None
+    try:
+        for event, elm in iterAXML(data, resolve):
+            if event == "start-ns":
+                prefix, uri = elm
+                namespaces[prefix] = uri
+            elif event == "start" and root is None:
+                root = elm
+    except ET.ParseError:
+        return None
+    return ET.ElementTree(root), namespaces
+
+
+def iterAXML(data, resolve=None):
+    """
+    Decodes a binary XML (AXML) file incrementally, like xml.etree.ElementTree.iterparse does for text files.
+    Yields ("start-ns", (prefix, uri)), ("start", element) and ("end", element) events,
+    the elements are attached to their parent as they are started.
+    Raises xml.etree.ElementTree.ParseError if the data is not a well-formed AXML chunk stream.
+    See decodeAXML for the parameters.
+    """
+    try:
+        yield from _iterAXML(data, resolve)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ET.ParseError(f"malformed AXML: {e}")
+
+
+def _iterAXML(data, resolve):
+    if len(data) < 8:
+        raise ET.ParseError("not an AXML file")
+    _, headerSize, size = struct.unpack_from("<HHI", data, 0)
+    # some packers change the type of the first chunk so it is not checked
+    if headerSize != 8 or size > len(data):
+        raise ET.ParseError("not an AXML file")
+    chunkType, headerSize, _ = struct.unpack_from("<HHI", data, 8)
+    if chunkType != RES_STRING_POOL_TYPE or headerSize != 0x1C:
+        raise ET.ParseError("no string pool")
+    strings = StringPool(data, 8)
+    resourceIDs = ()
+    attributeNames = public.SYSTEM_RESOURCES["attributes"]["inverse"]
+
+    root = None
+    stack = []
+    offset = 8 + strings.size
+    while offset + 8 <= size:
+        chunkType, headerSize, chunkSize = struct.unpack_from("<HHI", data, offset)
+        if chunkSize < 8:
+            raise ET.ParseError(f"invalid chunk size at {offset}")
+        body = offset + headerSize
+
+        if chunkType == RES_XML_RESOURCE_MAP_TYPE:
+            count = (chunkSize - headerSize) // 4
+            resourceIDs = struct.unpack_from(f"<{count}I", data, body)
+
+        elif RES_XML_START_NAMESPACE_TYPE <= chunkType <= RES_XML_LAST_CHUNK_TYPE and headerSize == 0x10:
+            if chunkType == RES_XML_START_NAMESPACE_TYPE:
+                prefix, uri = struct.unpack_from("<II", data, body)
+                prefix, uri = strings[prefix], strings[uri].strip()
+                if prefix != "" and uri != "":
+                    yield "start-ns", (prefix, uri)
+
+            elif chunkType == RES_XML_START_ELEMENT_TYPE:
+                ns, name, attributeStart, attributeSize, attributeCount = struct.unpack_from("<IIHHH", data, body)
+                tag = _fixName(strings[name])
+                if ns != NO_INDEX:
+                    tag = f"{{{strings[ns]}}}{tag}"
+                elm = ET.Element(tag)
+                attributeSize = attributeSize or 20
+                for i in range(attributeCount):
+                    attrNs, attrName, rawValue, _, _, valueType, valueData = struct.unpack_from(
+                        "<IIIHBBI", data, body + attributeStart + i * attributeSize)
+                    attrName = strings[attrName] or _systemAttributeName(attrName, resourceIDs, attributeNames)
+                    attrName = _fixName(attrName)
+                    if attrNs != NO_INDEX and strings[attrNs] != "":
+                        attrName = f"{{{strings[attrNs]}}}{attrName}"
+                    value = None
+                    if resolve is not None and valueType in (TYPE_REFERENCE, TYPE_DYNAMIC_REFERENCE) \
+                            and valueData >> 24 != 1:
+                        # resource of the application, system resources (0x01XXXXXX) are kept as they are
+                        value = resolve(valueData)
+                    if value is None:
+                        # not resolved (a string without default value for instance), the ID is kept
+                        value = format_value(valueType, valueData, lambda _: strings[rawValue])
+                    elm.set(attrName, _fixValue(value))
+                if root is None:
+                    root = elm
+                elif stack:
+                    stack[-1].append(elm)
+                else:
+                    raise ET.ParseError("junk after document element")
+                stack.append(elm)
+                yield "start", elm
+
+            elif chunkType == RES_XML_END_ELEMENT_TYPE:
+                if stack:
+                    yield "end", stack.pop()
+
+            elif chunkType == RES_XML_CDATA_TYPE and stack:
+                text, = struct.unpack_from("<I", data, body)
+                stack[-1].text = strings[text]
+
+        offset += chunkSize
+
+    if root is None:
+        raise ET.ParseError("no element found")
+    # close the elements that were not ended
+    while stack:
+        yield "end", stack.pop()
+
+
+def _systemAttributeName(idx, resourceIDs, attributeNames):
+    """
+    Obfuscated files may remove the names of the system attributes,
+    in which case the name is recovered from the resource map.
+    """
+    rid = resourceIDs[idx]
+    if rid in attributeNames:
+        return f"android:{attributeNames[rid]}"
+    return f"android:UNKNOWN_SYSTEM_ATTRIBUTE_{rid:08x}"
@@ -0,0 +1,187 @@
+import os
+import io
+import sys
+import glob
+import logging
+import argparse
+import contextlib
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from .parser import Parser
+from .apkParser import APKParser
+from .analyzer import Analyzer, enabledChecks
+from .utils import setupLogger
+from .resultCache import ResultCache
+from .config import DAL_CACHE_TTL, DAL_NEGATIVE_CACHE_TTL
+from .findings import NDJSONRenderer
+from .sarif import SarifRenderer
+
+# the result of the analysis of a file of a batch, error is None if the analysis succeeded
+BatchResult = namedtuple("BatchResult", "path output error")
+
+# files analyzed when a directory is given
+BATCH_EXTENSIONS = (".apk", ".xml")
+
+
+def analyzeFile(path, args, packageName=None):
+    """
+    Analyzes an APK or a manifest file with the given command line arguments.
+    Raises FileNotFoundError or xml.etree.ElementTree.ParseError if the file can't be analyzed.
+    With --result-cache, a file already analyzed with the same parameters is not analyzed again.
+    """
+    checks = enabledChecks(args)
+    # the analyses of installed apps (ADB) and the URL matching depend on more than the file,
+    # the Digital Asset Links are fetched again when they are not cached
+    if getattr(args, "result_cache", None) is None or packageName is not None or getattr(args, "match_urls", None) \
+            or ("app-links" in checks and getattr(args, "dal_cache", None) is None):
+        _analyze(path, args, packageName)
+        return
+    # the results of the Digital Asset Links are not kept longer than the files they come from
+    ttl = min(DAL_CACHE_TTL, DAL_NEGATIVE_CACHE_TTL) if "app-links" in checks else None
+    cache = ResultCache(args.result_cache)
+    key = cache.key(path, args, checks)
+    renderer = _structuredRenderer(path, args)
+    if renderer is not None:
+        # only the findings are written, they are rendered again with the path of this file
+        findings = cache.get(key, "findings")
+        if findings is not None:
+            cache.replayFindings(findings, renderer)
+        else:
+            cache.putFindings(key, _analyze(path, args, packageName), ttl)
+        return
+    events = cache.get(key)
+    if events is not None:
+        cache.replay(events, path)
+    else:
+        cache.record(key, path, lambda: _analyze(path, args, packageName), ttl)
+
+
+def _structuredRenderer(path, args):
+    """
+    Returns the renderer of the findings of the file for the NDJSON and SARIF formats, None for the text output.
+    """
+    outputFormat = getattr(args, "format", "text")
+    if outputFormat == "ndjson":
+        return NDJSONRenderer(sys.stdout, path)
+    if outputFormat == "sarif":
+        return SarifRenderer(sys.stdout, path)
+    return None
+
+
+def _analyze(path, args, packageName):
+    """
+    Analyzes a file and returns its findings.
+    """
+    # try as APK
+    parser = APKParser(path, args.streaming)
+    if parser.apk is None:
+        # not an APK file
+        parser = Parser(path, args.streaming)
+    try:
+        analyzer = Analyzer(parser, args)
+        analyzer.packageName = packageName
+        renderer = _structuredRenderer(path, args)
+        if renderer is not None:
+            # only the findings are written, the terminal view is not rendered
+            analyzer.findings.renderers = [renderer]
+            with _silenced():
+                return analyzer.runAllTests()
+        return analyzer.runAllTests()
+    finally:
+        # the workers of a batch analyze many files, the mapping of each APK is released at once
+        if isinstance(parser, APKParser):
+            parser.close()
+
+
+@contextlib.contextmanager
+def _silenced():
+    """
+    Discards what is printed and logged, the checks skip the tables and lists the logger level hides.
+    """
+    logger = logging.getLogger("MainLogger")
+    level = logger.level
+    logger.setLevel(logging.CRITICAL + 1)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        logger.setLevel(level)
+
+
+def collectInputs(source):
+    """
+    Lists the files of a batch, the largest first so the longest analyses start first and the workers
+    stay busy until the end.
+    :param source: A directory (its APKs and XML files are analyzed recursively), a glob pattern,
+                   or a text file listing one path per line prefixed with @.
+    """
+    if source.startswith("@"):
+        with open(source[1:]) as f:
+            paths = [line.strip() for line in f if line.strip()]
+    elif os.path.isdir(source):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(source) for name in names
+                 if name.lower().endswith(BATCH_EXTENSIONS)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    paths = [p for p in dict.fromkeys(paths) if os.path.isfile(p)]
+    return sorted(paths, key=os.path.getsize, reverse=True)
+
+
+def _initWorker(logLevel, color):
+    """
+    Prepares a worker process once, the modules are already imported and stay loaded for all its analyses.
+    """
+    if color:
+        # the output is captured, keep the colors of the terminal of the main process
+        os.environ["FORCE_COLOR"] = "1"
+    # forked workers inherit the console handler of the main process
+    setupLogger(logLevel, None).handlers.clear()
+
+
+def _analyzeInWorker(path, args):
+    """
+    Analyzes a file of the batch and captures what is displayed so the outputs of the workers do not mix.
+    """
+    output = io.StringIO()
+    handler = logging.StreamHandler(output)
+    logger = setupLogger(args.log_level, handler)
+    error = None
+    fileArgs = argparse.Namespace(**vars(args))
+    fileArgs.path = path
+    with contextlib.redirect_stdout(output):
+        try:
+            analyzeFile(path, fileArgs)
+        except FileNotFoundError:
+            error = "Invalid file name !"
+        except ET.ParseError:
+            error = "Invalid file !"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    logger.removeHandler(handler)
+    return BatchResult(path, output.getvalue(), error)
+
+
+def runBatch(paths, args, jobs=None):
+    """
+    Analyzes many files with a pool of worker processes.
+    The output of each analysis is displayed as soon as it is finished.
+    :param jobs: The number of workers, the number of CPUs by default.
+    :return: The BatchResult of every file in the order of paths.
+    """
+    results = {}
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(jobs, max(len(paths), 1)), initializer=_initWorker,
+                             initargs=(args.log_level, sys.stdout.isatty())) as executor:
+        futures = {executor.submit(_analyzeInWorker, path, args): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                result = BatchResult(path, "", f"Worker crashed: {e}")
+            results[path] = result
+            sys.stdout.write(result.output)
+            sys.stdout.flush()
+    return [results[path] for path in paths]
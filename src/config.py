@@ -1,3 +1,5 @@
+import os
+
 # Config file for external binaries. Useful for Docker integration
 # <name> : <list of arguments to launch the executable> (customizable)
 # by default it is assumed the binaries are in your $PATH
@@ -6,5 +8,35 @@ EXTERNAL_BINARIES = {
     "adb": ["adb"],
 }
 
+# number of external operations (apksigner, ADB backup, Digital Asset Links) run at the same time
+# during an analysis
+EXTERNAL_WORKERS = 4
+# time allowed to each external command (seconds), the command and its children are killed after it
+# (the ADB backup waits for the user to validate it on the device)
+EXTERNAL_TIMEOUTS = {
+    "apksigner": 120,
+    "adb": 60,
+    "adb-backup": 600,
+}
+
 # default backup file location for ADB backups
 ADB_BACKUP_PATH = "/tmp/backup.tar"
+
+# Digital Asset Links verification
+# number of hosts checked concurrently
+DAL_WORKERS = 8
+# timeout of each request and time allowed to check all the hosts (seconds)
+DAL_TIMEOUT = 5
+DAL_DEADLINE = 30
+# retries after a connection error, a timeout or a transient HTTP status, the delay doubles after each one
+DAL_RETRIES = 2
+DAL_BACKOFF = 0.5
+# the assetlinks.json files are cached on disk and shared by all the analyses (None to disable)
+# available files are kept for DAL_CACHE_TTL seconds and missing ones for DAL_NEGATIVE_CACHE_TTL seconds
+DAL_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "amande", "assetlinks")
+DAL_CACHE_TTL = 24 * 3600
+DAL_NEGATIVE_CACHE_TTL = 3600
+
+# with --result-cache, the results of the analyses are cached on disk by the content of the analyzed file
+# (default location)
+RESULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "amande", "results")
@@ -1,5 +1,8 @@
 ANDROID_MAX_SDK = 33
 
+# intent filters with more URIs (combinations of their <data> elements) are displayed in a compressed form
+MAX_DISPLAYED_URIS = 20
+
 # https://developer.android.com/reference/android/Manifest.permission
 dangerous_perms = ['android.permission.ACCEPT_HANDOVER',
                    'android.permission.ACCESS_BACKGROUND_LOCATION',
@@ -0,0 +1,202 @@
+import re
+from urllib.parse import urlsplit, unquote
+
+VIEW = "android.intent.action.VIEW"
+BROWSABLE = "android.intent.category.BROWSABLE"
+
+
+def compilePathPattern(pattern):
+    """
+    Compiles an android:pathPattern into a regular expression matching the same paths.
+    https://developer.android.com/guide/topics/manifest/data-element#path
+
+    The pattern is a simple glob (PatternMatcher.PATTERN_SIMPLE_GLOB): "." matches any character, "x*" a sequence
+    of "x", ".*" any sequence and "\\" escapes the next character.
+    The platform matches it without backtracking, which is reproduced here:
+      - ".*" stops at the first occurrence of the character that follows it,
+      - "x*" consumes every "x" (possessive quantifier),
+      - once the path is consumed only a trailing ".*" can still match.
+    https://android.googlesource.com/platform/frameworks/base/+/master/core/java/android/os/PatternMatcher.java
+    """
+    res = ""
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        escaped = c == "\\" and i + 1 < n
+        if escaped:
+            i += 1
+            c = pattern[i]
+        i += 1
+        if i < n and pattern[i] == "*":
+            i += 1
+            if not escaped and c == ".":
+                if i >= n:
+                    res += ".*"
+                    break
+                # consume everything until the next character of the pattern
+                if pattern[i] == "\\" and i + 1 < n:
+                    i += 1
+                stop = re.escape(pattern[i])
+                res += f"[^{stop}]*{stop}"
+                i += 1
+            else:
+                # the platform does not enter the loop once the path is consumed
+                res += rf"(?!\Z){re.escape(c)}*+"
+        elif c == "." and not escaped:
+            res += "."
+        else:
+            res += re.escape(c)
+    return re.compile(res, re.DOTALL)
+
+
+class _Paths:
+    """
+    The paths of the intent filters handling an authority, each one maps to the components declaring it.
+    """
+    __slots__ = ("any", "exact", "prefixes", "patterns")
+
+    def __init__(self):
+        # components of the filters without paths
+        self.any = set()
+        self.exact = {}
+        self.prefixes = {}
+        self.patterns = {}
+
+    def add(self, paths, component):
+        if not paths:
+            self.any.add(component)
+        for kind, value in paths:
+            if kind == "path":
+                self.exact.setdefault(value, set()).add(component)
+            elif kind == "pathPrefix":
+                self.prefixes.setdefault(value, set()).add(component)
+            else:
+                if value not in self.patterns:
+                    self.patterns[value] = (compilePathPattern(value), set())
+                self.patterns[value][1].add(component)
+
+    def match(self, path, res):
+        res |= self.any
+        res |= self.exact.get(path, set())
+        if self.prefixes:
+            # every prefix of the path is looked up, instead of testing every pathPrefix
+            for i in range(len(path) + 1):
+                res |= self.prefixes.get(path[:i], set())
+        for pattern, components in self.patterns.values():
+            if not components <= res and pattern.fullmatch(path):
+                res |= components
+
+
+class _Hosts:
+    """
+    The authorities (host and port) of the intent filters handling a scheme.
+    """
+    __slots__ = ("schemeOnly", "exact", "wildcards", "any")
+
+    def __init__(self):
+        # components of the filters without hosts, they handle any URI with this scheme
+        self.schemeOnly = set()
+        # host -> port (None for any port) -> _Paths
+        self.exact = {}
+        # suffix of "*.example.com" (".example.com") -> port -> _Paths
+        self.wildcards = {}
+        # host "*" -> port -> _Paths
+        self.any = {}
+
+    def add(self, host, port, paths, component):
+        host = host.lower()
+        if host == "*":
+            ports = self.any
+        elif host.startswith("*"):
+            ports = self.wildcards.setdefault(host[1:], {})
+        else:
+            ports = self.exact.setdefault(host, {})
+        ports.setdefault(port, _Paths()).add(paths, component)
+
+    @staticmethod
+    def _matchPort(ports, port, path, res):
+        for p in {None, port}:
+            if p in ports:
+                ports[p].match(path, res)
+
+    def match(self, host, port, path, res):
+        res |= self.schemeOnly
+        if not host:
+            return
+        if host in self.exact:
+            self._matchPort(self.exact[host], port, path, res)
+        if self.wildcards:
+            # the wildcard matches the end of the host (*.example.com -> .example.com)
+            for i in range(len(host)):
+                if host[i:] in self.wildcards:
+                    self._matchPort(self.wildcards[host[i:]], port, path, res)
+        self._matchPort(self.any, port, path, res)
+
+
+class DeepLinkMatcher:
+    """
+    Finds the exported components that would handle URLs opened with an implicit VIEW intent.
+
+    The <data> elements of the intent filters are compiled once into a scheme -> host -> port -> path automaton,
+    so matching a URL only looks up its parts instead of testing every intent filter.
+    The platform rules are followed (IntentFilter.matchData):
+      - the attributes of all the <data> elements of a filter are merged, except host and port that go together,
+      - a filter without host handles any URI of its schemes, a filter without path any path of its hosts,
+      - "*" as the first character of a host matches any prefix, hosts are case insensitive,
+      - a filter declaring a port only matches URIs with this explicit port,
+      - filters declaring a MIME type are ignored, URLs opened this way have no type.
+    https://developer.android.com/guide/components/intents-filters#DataTest
+    """
+
+    def __init__(self, components, browsableOnly=True):
+        """
+        :param components: The components of ManifestIndex that are exported.
+        :param browsableOnly: Only keep the filters with the VIEW action and the BROWSABLE category,
+                              i.e. the deep links that can be opened from a web browser.
+        """
+        # scheme -> _Hosts
+        self.schemes = {}
+        for component in components:
+            key = (component.name, component.tag)
+            for intentFilter in component.intentFilters:
+                if browsableOnly and (VIEW not in intentFilter.actions or BROWSABLE not in intentFilter.categories):
+                    continue
+                self._addIntentFilter(intentFilter, key)
+
+    def _addIntentFilter(self, intentFilter, component):
+        datas = intentFilter.datas
+        if any(d.mimeType is not None for d in datas):
+            return
+        authorities = {(d.host, int(d.port) if d.port and d.port.isdigit() else None)
+                       for d in datas if d.host}
+        paths = {(kind, getattr(d, kind)) for d in datas for kind in ("path", "pathPrefix", "pathPattern")
+                 if getattr(d, kind) is not None}
+        for scheme in {d.scheme for d in datas} - {None}:
+            hosts = self.schemes.setdefault(scheme, _Hosts())
+            if not authorities:
+                hosts.schemeOnly.add(component)
+            for host, port in authorities:
+                hosts.add(host, port, paths, component)
+
+    def match(self, url):
+        """
+        Returns the (componentName, componentType) of the components handling a URL.
+        :rtype: set
+        """
+        res = set()
+        try:
+            uri = urlsplit(url)
+            port = uri.port
+        except ValueError:
+            return res
+        hosts = self.schemes.get(uri.scheme)
+        if hosts is not None:
+            hosts.match(uri.hostname, port, unquote(uri.path), res)
+        return res
+
+    def matchAll(self, urls):
+        """
+        Matches a stream of URLs, yields (url, components) as they are matched.
+        """
+        for url in urls:
+            yield url, self.match(url)
@@ -0,0 +1,60 @@
+class _Node:
+    """
+    A label of the trie, its children are the labels on its left in the hostname.
+    """
+    __slots__ = ("children", "exact", "subdomains")
+
+    def __init__(self):
+        self.children = {}
+        # the value of the domain itself and the one of its subdomains (includeSubdomains="true")
+        self.exact = None
+        self.subdomains = None
+
+
+def _labels(host):
+    """
+    Splits a hostname into its labels from the top level domain, hostnames are case insensitive.
+    """
+    return reversed(host.rstrip(".").lower().split("."))
+
+
+class DomainTrie:
+    """
+    Maps hostnames to the value of the most specific domain matching them, like the <domain> elements
+    of the network security config.
+    https://developer.android.com/training/articles/security-config?hl=en#domain
+
+    The domains are stored in a trie of their labels in reverse order (com -> example -> api)
+    so a lookup only walks the labels of the hostname, whatever the number of domains.
+    """
+
+    def __init__(self):
+        self.root = _Node()
+
+    def add(self, name, includeSubdomains, value):
+        """
+        Adds a domain, a domain can only be defined once so the first value added is kept.
+        :param includeSubdomains: The value also applies to the subdomains of name.
+        """
+        node = self.root
+        for label in _labels(name):
+            node = node.children.setdefault(label, _Node())
+        if node.exact is None:
+            node.exact = value
+        if includeSubdomains and node.subdomains is None:
+            node.subdomains = value
+
+    def get(self, host):
+        """
+        Returns the value of the domain matching exactly the hostname,
+        otherwise the one of the closest parent domain including its subdomains, or None.
+        """
+        node = self.root
+        best = None
+        for label in _labels(host):
+            node = node.children.get(label)
+            if node is None:
+                return best
+            if node.subdomains is not None:
+                best = node.subdomains
+        return node.exact if node.exact is not None else best
@@ -1,24 +1,41 @@
-from .config import EXTERNAL_BINARIES, ADB_BACKUP_PATH
+from .config import EXTERNAL_BINARIES, EXTERNAL_TIMEOUTS, ADB_BACKUP_PATH
 from .utils import (
     runProc,
     printSubTestInfo
 )
 from termcolor import colored
 import re
+import os
+import sys
 import logging
+from concurrent.futures import Future
 
 logger = logging.getLogger("MainLogger")
 
 
-def runAPKSigner(min_sdk, path):
+def _apkSignerCommand(min_sdk, path):
+    return EXTERNAL_BINARIES["apksigner"] + ["verify", "--print-certs", "--verbose", "--min-sdk-version",
+                                             str(min_sdk), path]
+
+
+def startAPKSigner(min_sdk, path, executor):
+    """
+    Starts APKSigner in the background, runAPKSigner displays its output.
+    :return: The future of the output.
+    """
+    return executor.submit(runProc, _apkSignerCommand(min_sdk, path), timeout=EXTERNAL_TIMEOUTS["apksigner"])
+
+
+def runAPKSigner(min_sdk, path, started=None):
     """
     Executes APKSigner if available.
     The output is interpreted and colored.
     Warnings are removed for readability.
+    :param started: The future returned by startAPKSigner, APKSigner is executed now otherwise.
     """
-    cmd = EXTERNAL_BINARIES["apksigner"] + ["verify", "--print-certs", "--verbose", "--min-sdk-version",
-                                            str(min_sdk), path]
-    cmdres, err = runProc(cmd)
+    cmd = _apkSignerCommand(min_sdk, path)
+    result = started.result() if started is not None else runProc(cmd, timeout=EXTERNAL_TIMEOUTS["apksigner"])
+    cmdres = result.stdout
     pattern_1 = ".*Unauthorized.*not be detected.*$"
 
     if cmdres is not None:
@@ -54,6 +71,9 @@ def runAPKSigner(min_sdk, path):
 
             logger.info(line)
 
+        if result.timedOut:
+            logger.error(result.stderr.decode().strip())
+            return
         if signature_versions[0] and not any(signature_versions[1:]):
             logger.critical("Your APK is only signed with scheme v1. Unauthorized modification to META-INF jar "
                             "entry will not be detected")
@@ -65,46 +85,131 @@ def downloadAPK(name, new_path):
     The resulting APK is always named base.apk.
     """
     cmd = EXTERNAL_BINARIES["adb"] + ["shell", "pm", "path", name]
-    cmdres, err = runProc(cmd)
-    if cmdres is None or cmdres == b'':
-        logger.error(err.decode().strip())
+    result = runProc(cmd, timeout=EXTERNAL_TIMEOUTS["adb"])
+    if not result.stdout:
+        logger.error(result.stderr.decode().strip())
         return
     logger.info(colored(f"executed command : {' '.join(cmd)}", "yellow"))
-    path = cmdres.strip().split(b':')[1].decode()
+    path = result.stdout.strip().split(b':')[1].decode()
 
     cmd = EXTERNAL_BINARIES["adb"] + ["pull", path, new_path]
     logger.info(f"Downloading APK {name} into {new_path}...")
     logger.info(colored(f"executing command : {' '.join(cmd)}", "yellow"))
-    cmdres, err = runProc(cmd)
-    if cmdres is None or cmdres == b'':
-        logger.error(err.decode().strip())
+    result = runProc(cmd, timeout=EXTERNAL_TIMEOUTS["adb"])
+    if not result.stdout or result.timedOut:
+        logger.error(result.stderr.decode().strip())
         return
     return new_path + f"/base.apk"
 
 
-def performBackup(name):
+def _backupCommands(name):
+    # open the app then backup
+    return (EXTERNAL_BINARIES["adb"] + ["shell", "monkey", "-p", name, "1"],
+            EXTERNAL_BINARIES["adb"] + ["shell", "bu", "backup", name])
+
+
+class _BackupConverter:
+    """
+    Converts an ADB backup (.ab) to a TAR archive as it is received: its 24 bytes header is replaced by a gzip header.
+    """
+    HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00'
+    AB_HEADER_SIZE = 24
+
+    def __init__(self, f):
+        self.f = f
+        # number of bytes received
+        self.size = 0
+
+    def __call__(self, chunk):
+        if self.size == 0:
+            self.f.write(self.HEADER)
+        self.f.write(chunk[max(0, self.AB_HEADER_SIZE - self.size):])
+        self.size += len(chunk)
+
+
+def _backup(backupCmd):
+    """
+    Runs the backup command, the backup is converted and written to ADB_BACKUP_PATH while it is received
+    so it is never held in memory.
+    The file is only replaced by a complete backup.
+    :return: The result of the command and the size of the backup.
+    """
+    part = ADB_BACKUP_PATH + ".part"
+    with open(part, "wb") as f:
+        converter = _BackupConverter(f)
+        result = runProc(backupCmd, stdout=converter, timeout=EXTERNAL_TIMEOUTS["adb-backup"])
+    if converter.size and not result.timedOut:
+        os.replace(part, ADB_BACKUP_PATH)
+    else:
+        os.remove(part)
+    return result, converter.size
+
+
+def _waitForValidation(name):
+    logger.info(f"Backing APK {name}. Waiting for user validation...")
+
+
+def _promptValidation(name):
+    # written on its own line outside of the logger, the sections displayed in the meantime are not changed
+    sys.stderr.write(f"Backing APK {name}. Validate the backup on the device...\n")
+    sys.stderr.flush()
+
+
+def startBackup(name, executor):
+    """
+    Starts an ADB backup in the background, performBackup displays its result.
+    The backup is started once the app is opened, the user is asked to validate it at that moment.
+    :return: The futures of the results of the two steps (opening the app and backing it up).
+    """
+    openCmd, backupCmd = _backupCommands(name)
+    opened = executor.submit(runProc, openCmd, timeout=EXTERNAL_TIMEOUTS["adb"])
+    backup = Future()
+
+    def done(future):
+        if future.exception() is not None:
+            backup.set_exception(future.exception())
+        else:
+            backup.set_result(future.result())
+
+    def start(future):
+        if future.exception() is not None or not future.result().stdout:
+            backup.set_result(None)
+            return
+        _promptValidation(name)
+        try:
+            executor.submit(_backup, backupCmd).add_done_callback(done)
+        except RuntimeError as e:
+            # the analysis is over
+            backup.set_exception(e)
+
+    opened.add_done_callback(start)
+    return opened, backup
+
+
+def performBackup(name, started=None):
     """
     Performs an ADB backup and converts the resulting file to a TAR archive.
     The default backup file location can be changed in config.py.
+    :param started: The futures returned by startBackup, the commands are executed now otherwise.
     """
+    openCmd, backupCmd = _backupCommands(name)
+    # the commands started by startBackup are already executed, their results are displayed
+    action = "executing" if started is None else "executed"
     # first open the app
-    cmd = EXTERNAL_BINARIES["adb"] + ["shell", "monkey", "-p", name, "1"]
-    logger.info(colored(f"executing command : {' '.join(cmd)}", "yellow"))
-    cmdres, err = runProc(cmd)
-    if cmdres is None or cmdres == b'':
-        logger.error(err.decode().strip())
+    logger.info(colored(f"{action} command : {' '.join(openCmd)}", "yellow"))
+    result = started[0].result() if started is not None else runProc(openCmd, timeout=EXTERNAL_TIMEOUTS["adb"])
+    if not result.stdout:
+        logger.error(result.stderr.decode().strip())
         return
     # now backup
-    cmd = EXTERNAL_BINARIES["adb"] + ["shell", "bu", "backup", name]
-    logger.info(f"Backing APK {name}. Waiting for user validation...")
-    logger.info(colored(f"executing command : {' '.join(cmd)}", "yellow"))
-    cmdres, err = runProc(cmd)
-    if cmdres is None or cmdres == b'':
-        logger.error(err.decode().strip())
+    if started is None:
+        _waitForValidation(name)
+        logger.info(colored(f"{action} command : {' '.join(backupCmd)}", "yellow"))
+        result, size = _backup(backupCmd)
+    else:
+        result, size = started[1].result()
+        logger.info(colored(f"{action} command : {' '.join(backupCmd)}", "yellow"))
+    if not size or result.timedOut:
+        logger.error(result.stderr.decode().strip())
         return
-    # convert .ab to .tar
-    header = b'\x1f\x8b\x08\x00\x00\x00\x00\x00'
-    cmdres = header + cmdres[24:]
-    with open(ADB_BACKUP_PATH, "wb") as f:
-        f.write(cmdres)
     logger.info(f"Backup written to {ADB_BACKUP_PATH}")
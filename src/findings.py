@@ -0,0 +1,71 @@
+import json
+import logging
+from .records import Finding
+
+# severity of a finding -> level of the message displayed in the terminal
+SEVERITIES = {
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL,
+}
+
+
+class FindingsCollector:
+    """
+    Collects the findings reported by the checks of an analysis.
+    Each finding is passed to the renderers as soon as it is reported, so they can display or write it
+    while the analysis continues.
+    """
+
+    def __init__(self, renderers=()):
+        self.findings = []
+        self.renderers = list(renderers)
+
+    def add(self, check, severity, message, minSdk=None, maxSdk=None, component=None, evidence=None, display=None):
+        """
+        Reports a finding.
+        :param check: The ID of the check (see Analyzer).
+        :param severity: A key of SEVERITIES.
+        :param message: A plain text (not colored) description.
+        :param evidence: A JSON serializable dict with the facts the finding is based on.
+        :param display: The message colored for the terminal, it is not part of the finding.
+        :rtype: Finding
+        """
+        finding = Finding(check, severity, message, minSdk, maxSdk, component, evidence or {})
+        self.findings.append(finding)
+        for renderer in self.renderers:
+            renderer.render(finding, display)
+        return finding
+
+
+class TerminalRenderer:
+    """
+    Displays the findings with the logger, colored by its formatter like the rest of the analysis.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger("MainLogger")
+
+    def render(self, finding, display=None):
+        self.logger.log(SEVERITIES[finding.severity], display or finding.message)
+
+
+class NDJSONRenderer:
+    """
+    Writes each finding as a JSON object on its own line (http://ndjson.org) as soon as it is reported.
+    """
+
+    def __init__(self, stream, path=None):
+        """
+        :param stream: The text stream to write to.
+        :param path: The analyzed file, added to each finding to tell apart the files of a batch.
+        """
+        self.stream = stream
+        self.path = path
+
+    def render(self, finding, display=None):
+        record = {"file": self.path} if self.path is not None else {}
+        record.update(finding._asdict())
+        self.stream.write(json.dumps(record, default=str) + "\n")
+        self.stream.flush()
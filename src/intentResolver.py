@@ -0,0 +1,160 @@
+from urllib.parse import urlsplit, unquote
+from .deepLinkMatcher import compilePathPattern
+
+DEFAULT = "android.intent.category.DEFAULT"
+ACTIVITY_TAGS = ("activity", "activity-alias")
+
+
+def _matchMimeType(types, mimeType):
+    """
+    Checks a MIME type against the types of a filter, wildcards (*/* or image/*) are allowed on both sides.
+    https://developer.android.com/guide/components/intents-filters#DataTest
+    """
+    if mimeType in types:
+        return True
+    base, _, sub = mimeType.partition("/")
+    if "*/*" in types or "*" in types:
+        return True
+    if f"{base}/*" in types:
+        return True
+    # a wildcard in the intent matches any subtype of the filter
+    if sub == "*":
+        return base == "*" or any(t.partition("/")[0] == base for t in types)
+    return False
+
+
+class _Filter:
+    """
+    The data test of an intent filter, compiled once.
+    """
+    __slots__ = ("component", "schemes", "authorities", "paths", "types")
+
+    def __init__(self, component, intentFilter):
+        self.component = component
+        datas = intentFilter.datas
+        self.schemes = {d.scheme for d in datas} - {None}
+        # host and port go together, "*" as first character of the host matches any prefix
+        self.authorities = [(d.host.lower(), int(d.port) if d.port and d.port.isdigit() else None)
+                            for d in datas if d.host]
+        self.paths = []
+        for d in datas:
+            if d.path is not None:
+                self.paths.append(lambda p, v=d.path: p == v)
+            if d.pathPrefix is not None:
+                self.paths.append(lambda p, v=d.pathPrefix: p.startswith(v))
+            if d.pathPattern is not None:
+                self.paths.append(compilePathPattern(d.pathPattern).fullmatch)
+        self.types = {d.mimeType.lower() for d in datas if d.mimeType is not None}
+
+    def _matchAuthority(self, host, port):
+        if host is None:
+            return False
+        for h, p in self.authorities:
+            if p is not None and p != port:
+                continue
+            if h == host or h == "*" or (h.startswith("*") and host.endswith(h[1:])):
+                return True
+        return False
+
+    def matchData(self, uri, mimeType):
+        """
+        IntentFilter.matchData
+        https://android.googlesource.com/platform/frameworks/base/+/master/core/java/android/content/IntentFilter.java
+        """
+        if not self.types and not self.schemes:
+            return uri is None and mimeType is None
+        scheme = uri.scheme if uri is not None else ""
+        if self.schemes:
+            if scheme not in self.schemes:
+                return False
+            if self.authorities:
+                try:
+                    port = uri.port
+                except ValueError:
+                    return False
+                if not self._matchAuthority(uri.hostname, port):
+                    return False
+                if self.paths and not any(match(unquote(uri.path)) for match in self.paths):
+                    return False
+        elif scheme not in ("", "content", "file"):
+            # filters with only MIME types handle content: and file: URIs
+            return False
+        if self.types:
+            return mimeType is not None and _matchMimeType(self.types, mimeType.lower())
+        return mimeType is None
+
+
+class IntentResolver:
+    """
+    Finds the exported components that would receive implicit intents, following the intent resolution rules.
+    https://developer.android.com/guide/components/intents-filters#Resolution
+
+    The action and category tests are answered by inverted indexes (action -> filters, category -> filters)
+    so only the filters declaring the action and all the categories of an intent go through the data test.
+    """
+
+    def __init__(self, components):
+        """
+        :param components: The components of ManifestIndex that are exported.
+        """
+        self.filters = []
+        # filters with at least one action, they are the only ones matching an intent without action
+        self.withAction = set()
+        self.byAction = {}
+        self.byCategory = {}
+        for component in components:
+            key = (component.name, component.tag)
+            for intentFilter in component.intentFilters:
+                idx = len(self.filters)
+                self.filters.append(_Filter(key, intentFilter))
+                if intentFilter.actions:
+                    self.withAction.add(idx)
+                for action in intentFilter.actions:
+                    self.byAction.setdefault(action, set()).add(idx)
+                for category in intentFilter.categories:
+                    self.byCategory.setdefault(category, set()).add(idx)
+
+    def resolve(self, intent, target=None):
+        """
+        Returns the (componentName, componentType) of the components receiving an intent, in document order.
+        :param intent: A records.Intent.
+        :param target: "activity", "service" or "receiver" to only keep the components started this way.
+                       Activities are started with the DEFAULT category (Context.startActivity) so their filters
+                       must declare it.
+        """
+        if intent.action is None:
+            candidates = self.withAction
+        else:
+            candidates = self.byAction.get(intent.action, set())
+        categories = set(intent.categories or ())
+        if target == "activity":
+            categories.add(DEFAULT)
+        # every category of the intent must be declared by the filter
+        for category in sorted(categories, key=lambda c: len(self.byCategory.get(c, ()))):
+            if not candidates:
+                break
+            candidates = candidates & self.byCategory.get(category, set())
+
+        uri = None
+        if intent.data is not None:
+            try:
+                uri = urlsplit(intent.data)
+            except ValueError:
+                return []
+        res = []
+        for idx in sorted(candidates):
+            f = self.filters[idx]
+            if f.component in res:
+                continue
+            if target is not None and f.component[1] not in (ACTIVITY_TAGS if target == "activity" else (target,)):
+                continue
+            if f.matchData(uri, intent.type):
+                res.append(f.component)
+        return res
+
+    def resolveAll(self, intents, target=None):
+        """
+        Resolves a batch of intents, yields (intent, components) as they are resolved.
+        """
+        for intent in intents:
+            yield intent, self.resolve(intent, target)
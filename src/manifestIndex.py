@@ -0,0 +1,154 @@
+import xml.etree.ElementTree as ET
+from .utils import str2Bool
+from .records import Component, IntentFilter, Data
+
+COMPONENT_TAGS = {"activity", "activity-alias", "service", "receiver", "provider"}
+
+
+def _detach(elm):
+    """
+    Copies an element without its children so that the original one can be cleared.
+    """
+    return ET.Element(elm.tag, elm.attrib)
+
+
+class ManifestIndex:
+    """
+    Index of the facts of a manifest needed by the analysis.
+
+    The index is built in a single traversal of the tree so that every accessor of the parser can answer
+    from it instead of running new XPath queries over the whole document.
+    Components are kept in document order, by type (activity, provider, ...) and by name.
+    The <manifest> and <application> elements and the other children of both are kept without their children,
+    so the index can also be built from a stream of events and the tree released (see consume).
+    """
+
+    def __init__(self, root, getAttribute):
+        """
+        :param root: The <manifest> element or None to build the index with consume.
+        :param getAttribute: The function used to read (and format) an attribute, usually Parser._getattr.
+        """
+        self._getattr = getAttribute
+        self.components = []
+        self.byType = {}
+        self.byName = {}
+        self.manifest = None
+        self.application = None
+        # path from <manifest> (uses-permission, application/uses-library, ...) -> detached elements
+        self.elements = {}
+        if root is not None:
+            self.manifest = _detach(root)
+            for child in root:
+                if child.tag == "application":
+                    self._addApplication(child)
+                    for elm in child:
+                        self.add(elm)
+                else:
+                    self.elements.setdefault(child.tag, []).append(_detach(child))
+
+    def consume(self, events, namespaces):
+        """
+        Builds the index from iterparse-like events ("start-ns", "start" and "end").
+        Each child of <manifest> and <application> is cleared and removed from the tree as soon as it is indexed,
+        so the memory used depends on the indexed facts and not on the size of the document.
+        :param events: xml.etree.ElementTree.iterparse(source, ("start-ns", "start", "end")) or axmlDecoder.iterAXML
+        :param namespaces: The dict filled with the namespaces of the document,
+                           it must be the one used by getAttribute.
+        """
+        stack = []
+        for event, elm in events:
+            if event == "start-ns":
+                prefix, uri = elm
+                namespaces[prefix] = uri
+            elif event == "start":
+                if not stack:
+                    self.manifest = _detach(elm)
+                elif len(stack) == 1 and elm.tag == "application":
+                    self._addApplication(elm)
+                stack.append(elm)
+            elif event == "end":
+                stack.pop()
+                if len(stack) == 1:
+                    # child of <manifest>
+                    if elm.tag != "application":
+                        self.elements.setdefault(elm.tag, []).append(_detach(elm))
+                elif len(stack) == 2 and stack[1].tag == "application":
+                    self.add(elm)
+                else:
+                    continue
+                stack[-1].remove(elm)
+                elm.clear()
+
+    def _addApplication(self, elm):
+        # only the first <application> is used by the platform
+        if self.application is None:
+            self.application = _detach(elm)
+
+    def add(self, elm):
+        """
+        Indexes a child element of <application>.
+        """
+        if elm.tag not in COMPONENT_TAGS:
+            self.elements.setdefault(f"application/{elm.tag}", []).append(_detach(elm))
+        intentFilters = [self._parseIntentFilter(e) for e in elm if e.tag == "intent-filter"]
+        component = Component(self._getattr(elm, "android:name"),
+                              elm.tag,
+                              str2Bool(self._getattr(elm, "android:exported")),
+                              self._getattr(elm, "android:permission"),
+                              self._getattr(elm, "android:readPermission"),
+                              self._getattr(elm, "android:writePermission"),
+                              str2Bool(self._getattr(elm, "android:grantUriPermissions")),
+                              intentFilters)
+        self.components.append(component)
+        self.byType.setdefault(component.tag, []).append(component)
+        self.byName.setdefault(component.name, []).append(component)
+
+    def _parseIntentFilter(self, elm):
+        """
+        Extracts the actions, categories and <data> elements of an <intent-filter> element.
+        https://developer.android.com/guide/topics/manifest/intent-filter-element
+        """
+        actions = []
+        categories = []
+        datas = []
+        for e in elm:
+            if e.tag == "action":
+                actions.append(self._getattr(e, "android:name"))
+            elif e.tag == "category":
+                categories.append(self._getattr(e, "android:name"))
+            elif e.tag == "data":
+                datas.append(Data(*[self._getattr(e, f"android:{attr}") for attr in Data._fields]))
+        return IntentFilter(actions, categories, datas, str2Bool(self._getattr(elm, "android:autoVerify")))
+
+    def ofType(self, componentType):
+        """
+        Lists all the components of a given type (activity, provider, ...) in document order.
+        """
+        return self.byType.get(componentType, [])
+
+    def named(self, name):
+        """
+        Lists all the components (of any type) with the given name in document order.
+        """
+        return self.byName.get(name, [])
+
+    def getComponent(self, componentType, name):
+        """
+        Returns the first component of a given type with the given name or None.
+        """
+        for component in self.named(name):
+            if component.tag == componentType:
+                return component
+
+    def findall(self, path):
+        """
+        Lists the detached elements at the given path from <manifest> (uses-permission, application/uses-library, ...).
+        """
+        return self.elements.get(path, [])
+
+    def find(self, path):
+        """
+        Returns the first detached element at the given path from <manifest> or None.
+        """
+        elements = self.findall(path)
+        return elements[0] if elements else None
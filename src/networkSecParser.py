@@ -1,18 +1,19 @@
 from .parser import Parser
-import xml.etree.ElementTree as ET
-from collections import namedtuple
-from .utils import str2Bool
+from .records import Cert, BConfig, DomainTrustAnchors, DomainPinSet, DomainPinning, DomainPolicy
+from .utils import str2Bool, parseXML, memoized
+from .domainTrie import DomainTrie
 
 
 class NetworkSecParser(Parser):
 
-    def __init__(self, path, debuggable=False):
-        # here we have a clean manifest in a virtual file
-        self.path = path
-        self.namespaces = dict([node for _, node in ET.iterparse(path, events=['start-ns'])])
-        # because it's the same file object, we have to rewind to the beginning before parsing again
-        path.seek(0)
-        self.tree = ET.parse(path)
+    def __init__(self, xml, debuggable=False):
+        """
+        :param xml: The path of the file or the tree and namespaces already decoded from an APK.
+        """
+        if isinstance(xml, tuple):
+            self.tree, self.namespaces = xml
+        else:
+            self.tree, self.namespaces = parseXML(xml)
         self.root = self.tree.getroot()
         self.isDebuggable = debuggable
 
@@ -23,12 +24,11 @@ class NetworkSecParser(Parser):
         It is False by default unless specified in a <debug-overrides> element.
         https://developer.android.com/training/articles/security-config?hl=en#certificates
         """
-        cert = namedtuple("Cert", "src overridePins")
         src = self._getattr(elm, "src")
         overridePins = str2Bool(self._getattr(elm, "overridePins"))
         if overridePins is None:
             overridePins = default
-        return cert(src, overridePins)
+        return Cert(src, overridePins)
 
     def parseTrustAnchors(self, elm, default=False):
         """
@@ -48,12 +48,11 @@ class NetworkSecParser(Parser):
         https://developer.android.com/training/articles/security-config?hl=en#base-config
         Default values are API level dependant.
         """
-        config = namedtuple("BConfig", "cleartextTrafficPermitted trustanchors")
         bc = self.root.find("base-config")
         if bc is not None:
             cleartextTrafficPermitted = str2Bool(self._getattr(bc, "cleartextTrafficPermitted"))
             trustanchors = self.parseTrustAnchors(bc)
-            return config(cleartextTrafficPermitted, trustanchors)
+            return BConfig(cleartextTrafficPermitted, trustanchors)
 
     def getDebugOverrides(self):
         """
@@ -75,122 +74,105 @@ class NetworkSecParser(Parser):
         if ps is not None:
             return self._getattr(ps, "expiration")
 
-    def parseDomains(self, elm):
+    @memoized
+    def getDomainPolicies(self):
         """
-        Parses the <domain> elements of the specified parent.
-        https://developer.android.com/training/articles/security-config?hl=en#domain
-        If the includeSubdomains attribute is True, the domain will be prefixed with "*.".
+        Resolves the effective policy of every domain of the nested <domain-config> elements in a single traversal.
+        https://developer.android.com/training/articles/security-config?hl=en#ConfigInheritance
+        The cleartextTrafficPermitted, trust-anchors (with the debug overrides if the app is debuggable) and pin-set
+        of a domain are the ones of the closest <domain-config> defining them, or None if none of them does
+        (the caller then uses its own default).
+        Domains are listed in document order, the domains of a <domain-config> before the nested ones.
         """
+        debugOverrides = self.getDebugOverrides() if self.isDebuggable else []
         res = []
-        for e in elm.findall("domain"):
-            includeSubdomains = str2Bool(self._getattr(e, "includeSubdomains"))
-            domain = e.text
-            if includeSubdomains:
-                domain = f"*.{domain}"
-            res.append(domain)
+
+        def resolve(elm, inheritedCT, inheritedTA, inheritedPS):
+            for e in elm.findall("domain-config"):
+                cleartextTrafficPermitted = str2Bool(self._getattr(e, "cleartextTrafficPermitted"))
+                if cleartextTrafficPermitted is None:
+                    cleartextTrafficPermitted = inheritedCT
+                trustanchors = self.parseTrustAnchors(e) + debugOverrides or inheritedTA
+                pinset = self.parsePinSet(e)
+                if pinset is None:
+                    pinset = inheritedPS
+                for d in e.findall("domain"):
+                    includeSubdomains = str2Bool(self._getattr(d, "includeSubdomains")) or False
+                    domain = f"*.{d.text}" if includeSubdomains else d.text
+                    res.append(DomainPolicy(domain, d.text, includeSubdomains, cleartextTrafficPermitted,
+                                            trustanchors, pinset))
+                resolve(e, cleartextTrafficPermitted, trustanchors, pinset)
+
+        resolve(self.root, None, None, None)
         return res
 
-    def parseDomainConfig(self, elm=None):
+    @memoized
+    def getDomainTrie(self):
+        """
+        Indexes the policies of getDomainPolicies by domain, see getPolicy.
         """
-        Recursively parses the <domain-config> elements of the specified parent.
+        trie = DomainTrie()
+        for policy in self.getDomainPolicies():
+            if policy.name:
+                trie.add(policy.name.strip(), policy.includeSubdomains, policy)
+        return trie
+
+    def getPolicy(self, host):
+        """
+        Returns the policy applying to a hostname or None if it is only covered by the <base-config>.
         https://developer.android.com/training/articles/security-config?hl=en#domain-config
-        Any number of nested <domain-config> elements can be present.
+        The most specific <domain> wins: the one equal to the hostname, otherwise the closest parent domain
+        with includeSubdomains set to true. The time taken only depends on the number of labels of the hostname.
         """
-        if elm is None:
-            elm = self.root
-        config = namedtuple("DConfig", "cleartextTrafficPermitted domains trustanchors pinset domainConfigs")
-        dc = elm.findall("domain-config")
-        res = []
-        for e in dc:
-            cleartextTrafficPermitted = str2Bool(self._getattr(e, "cleartextTrafficPermitted"))
-            domains = self.parseDomains(e)
-            trustanchors = self.parseTrustAnchors(e)
-            if self.isDebuggable:
-                trustanchors += self.getDebugOverrides()
-            pinset = self.parsePinSet(e)
-            # recursive call to handle nested <domain-config> elements
-            dcs = self.parseDomainConfig(e)
-            res.append(config(cleartextTrafficPermitted, domains, trustanchors, pinset, dcs))
-        return res
+        return self.getDomainTrie().get(host)
 
-    def getAllDomains(self, dcs=None, inheritedCT=False, withCT=True):
+    def getPolicies(self, hosts):
         """
-        Recursively lists all the domains with cleartext traffic allowed or not.
-        Takes into consideration the inheriting properties of the parent.
+        Returns the policy applying to each hostname (hostname -> DomainPolicy or None), see getPolicy.
         """
-        if dcs is None:
-            dcs = self.parseDomainConfig()
-        res = []
-        for dc in dcs:
-            if dc.cleartextTrafficPermitted == withCT:
-                res += dc.domains
-            if dc.cleartextTrafficPermitted is None and not (inheritedCT ^ withCT):
-                res += dc.domains
-            # recursive call with inherited value
-            if dc.cleartextTrafficPermitted is not None:
-                # parent defined cleartextTrafficPermitted
-                res += self.getAllDomains(dc.domainConfigs, dc.cleartextTrafficPermitted, withCT=withCT)
-            else:
-                # parent did not define cleartextTrafficPermitted
-                # use parent inherited value
-                res += self.getAllDomains(dc.domainConfigs, inheritedCT, withCT=withCT)
-        return res
+        trie = self.getDomainTrie()
+        return {host: trie.get(host) for host in hosts}
 
-    def getDomainsWithTA(self, dcs=None, inheritedTA=None):
+    def getAllDomains(self, inheritedCT=False, withCT=True):
         """
-        Recursively lists all the domains with their associated trust-anchors.
-        Takes into consideration the inheriting properties of the parent.
+        Lists all the domains with cleartext traffic allowed or not.
+        Takes into consideration the inheriting properties of the parents,
+        inheritedCT is used if no parent defines cleartextTrafficPermitted.
         """
-        if dcs is None:
-            dcs = self.parseDomainConfig()
-        domainConf = namedtuple("DomainConf", "domain trustanchors")
         res = []
-        for dc in dcs:
-            if len(dc.trustanchors) > 0:
-                # add all domains of this domain config with the defined TA
-                res += [domainConf(e, dc.trustanchors) for e in dc.domains]
-                # recursive call with defined TA
-                res += self.getDomainsWithTA(dc.domainConfigs, dc.trustanchors)
-            else:
-                # add all domains of this domain config with the inherited TA
-                res += [domainConf(e, inheritedTA) for e in dc.domains]
-                # recursive call with the inherited TA
-                res += self.getDomainsWithTA(dc.domainConfigs, inheritedTA)
+        for policy in self.getDomainPolicies():
+            cleartextTrafficPermitted = policy.cleartextTrafficPermitted
+            if cleartextTrafficPermitted is None:
+                cleartextTrafficPermitted = inheritedCT
+            if cleartextTrafficPermitted == withCT:
+                res.append(policy.domain)
         return res
 
-    def getDomainsWithPS(self, dcs=None, inheritedPS=None):
+    def getDomainsWithTA(self, inheritedTA=None):
         """
-        Recursively lists all the domains with their associated pin-set.
-        Takes into consideration the inheriting properties of the parent.
+        Lists all the domains with their associated trust-anchors.
+        Takes into consideration the inheriting properties of the parents,
+        inheritedTA is used if no parent defines trust-anchors.
         """
-        if dcs is None:
-            dcs = self.parseDomainConfig()
-        domainConf = namedtuple("DomainConf", "domain pinset")
-        res = []
-        for dc in dcs:
-            if dc.pinset is not None:
-                # add all domains of this domain config with the defined PS
-                res += [domainConf(e, dc.pinset) for e in dc.domains]
-                # recursive call with defined PS
-                res += self.getDomainsWithPS(dc.domainConfigs, dc.pinset)
-            else:
-                # add all domains of this domain config with the inherited PS
-                res += [domainConf(e, inheritedPS) for e in dc.domains]
-                # recursive call with the inherited PS
-                res += self.getDomainsWithPS(dc.domainConfigs, inheritedPS)
-        return res
+        return [DomainTrustAnchors(p.domain, p.trustanchors or inheritedTA) for p in self.getDomainPolicies()]
+
+    def getDomainsWithPS(self, inheritedPS=None):
+        """
+        Lists all the domains with their associated pin-set.
+        Takes into consideration the inheriting properties of the parents,
+        inheritedPS is used if no parent defines a pin-set.
+        """
+        return [DomainPinSet(p.domain, p.pinset if p.pinset is not None else inheritedPS)
+                for p in self.getDomainPolicies()]
 
     def getPinningInfo(self, inheritedTA=None):
         """
         Lists all the domains with pinning configured and the certificates allowed to bypass this pinning.
         """
-        domain_with_pinning = [e for e in self.getDomainsWithPS() if e.pinset is not None]
-        ta_for_domains = {e.domain: e.trustanchors for e in self.getDomainsWithTA(inheritedTA=inheritedTA)}
-        domainConf = namedtuple("DomainConf", "domain pinset overridePins")
         res = []
-        for d in domain_with_pinning:
-            # get all the Cert.src with overridePins to True
-            overridePins = [c.src for c in ta_for_domains[d.domain] if c.overridePins]
-            res.append(domainConf(d.domain, d.pinset, overridePins))
-
+        for p in self.getDomainPolicies():
+            if p.pinset is not None:
+                # get all the Cert.src with overridePins to True
+                overridePins = [c.src for c in p.trustanchors or inheritedTA or [] if c.overridePins]
+                res.append(DomainPinning(p.domain, p.pinset, overridePins))
         return res
@@ -1,20 +1,51 @@
-import xml.etree.ElementTree as ET
 from .utils import (
+    parseXML,
+    iterparseXML,
     str2Bool,
     getResourceTypeName,
-    formatResource
+    formatResource,
+    memoized
+)
+from .manifestIndex import ManifestIndex
+from .uriSet import UriSet
+from .deepLinkMatcher import DeepLinkMatcher
+from .intentResolver import IntentResolver
+from .records import (
+    Info,
+    UsesLibrary,
+    UsesNativeLibrary,
+    UsesFeature,
+    CustomPerm,
+    ExportedComponents,
+    UniversalLink
 )
-from itertools import product
-from collections import namedtuple
 
 
 class Parser:
 
-    def __init__(self, path):
-        self.namespaces = dict([node for _, node in ET.iterparse(path, events=['start-ns'])])
-        self.tree = ET.parse(path)
-        self.root = self.tree.getroot()
+    def __init__(self, path, streaming=False):
+        """
+        :param path: The path of the manifest.
+        :param streaming: Only keep the facts needed by the analysis instead of the whole tree
+                          (self.tree and self.root are None), useful for huge manifests.
+        """
         self.apk = None
+        if streaming:
+            self.namespaces = {}
+            self.index = ManifestIndex(None, self._getattr)
+            self.index.consume(iterparseXML(path), self.namespaces)
+            self.tree, self.root = None, None
+        else:
+            self.tree, self.namespaces = parseXML(path)
+            self.root = self.tree.getroot()
+            self.index = ManifestIndex(self.root, self._getattr)
+
+    def invalidate(self):
+        """
+        Clears the results cached by the memoized methods.
+        Must be called if the manifest or the methods of the parser are changed after they have been used.
+        """
+        self.__dict__.pop("_memo", None)
 
     def _getattr(self, elm, attr):
         """
@@ -38,11 +69,9 @@ class Parser:
         https://developer.android.com/guide/topics/manifest/manifest-element
         The information is package, version code and version name.
         """
-        # use a namedtuple for more readable access to important attributes
-        Info = namedtuple("Info", "package versionCode versionName")
-        package = self._getattr(self.root, "package")
-        versionCode = self._getattr(self.root, "android:versionCode")
-        versionName = self._getattr(self.root, "android:versionName")
+        package = self._getattr(self.index.manifest, "package")
+        versionCode = self._getattr(self.index.manifest, "android:versionCode")
+        versionName = self._getattr(self.index.manifest, "android:versionName")
         return Info(package, versionCode, versionName)
 
     def usesLibrary(self):
@@ -50,9 +79,8 @@ class Parser:
         Parses the libraries used by the application.
         https://developer.android.com/guide/topics/manifest/uses-library-element
         """
-        UsesLibrary = namedtuple("UsesLibrary", "name required")
         res = []
-        for e in self.root.findall("application/uses-library"):
+        for e in self.index.findall("application/uses-library"):
             name = self._getattr(e, "android:name")
             required = str2Bool(self._getattr(e, "android:required"))
             # Default is true for android:required property
@@ -66,9 +94,8 @@ class Parser:
         Parses the native libraries used by the application.
         https://developer.android.com/guide/topics/manifest/uses-native-library-element
         """
-        UsesNativeLibrary = namedtuple("UsesNativeLibrary", "name required")
         res = []
-        for e in self.root.findall("application/uses-native-library"):
+        for e in self.index.findall("application/uses-native-library"):
             name = self._getattr(e, "android:name")
             required = str2Bool(self._getattr(e, "android:required"))
             # Default is true for android:required property
@@ -82,9 +109,8 @@ class Parser:
         Parses the hardware or software features used by the application.
         https://developer.android.com/guide/topics/manifest/uses-feature-element
         """
-        UsesFeature = namedtuple("UsesFeature", "name required")
         res = []
-        for e in self.root.findall("uses-feature"):
+        for e in self.index.findall("uses-feature"):
             name = self._getattr(e, "android:name")
             required = str2Bool(self._getattr(e, "android:required"))
             # Default is true for android:required property
@@ -98,14 +124,14 @@ class Parser:
         Lists all the permissions requested by the application.
         https://developer.android.com/guide/topics/manifest/uses-permission-element
         """
-        return [self._getattr(perm, "android:name") for perm in self.root.findall('uses-permission')]
+        return [self._getattr(perm, "android:name") for perm in self.index.findall('uses-permission')]
 
     def allowBackup(self):
         """
         Indicates if the application is allowing backups.
         https://developer.android.com/guide/topics/manifest/application-element#allowbackup
         """
-        allowBackup = str2Bool(self._getattr(self.root.find("application"), "android:allowBackup"))
+        allowBackup = str2Bool(self._getattr(self.index.application, "android:allowBackup"))
         # Default value is True
         if allowBackup is None:
             allowBackup = True
@@ -116,14 +142,14 @@ class Parser:
         Returns the configured backup agent or None.
         https://developer.android.com/guide/topics/manifest/application-element#agent
         """
-        return self._getattr(self.root.find("application"), "android:backupAgent")
+        return self._getattr(self.index.application, "android:backupAgent")
 
     def debuggable(self):
         """
         Indicates if the application is debuggable.
         https://developer.android.com/guide/topics/manifest/application-element#debug
         """
-        debuggable = str2Bool(self._getattr(self.root.find("application"), "android:debuggable"))
+        debuggable = str2Bool(self._getattr(self.index.application, "android:debuggable"))
         # Default value is False
         if debuggable is None:
             debuggable = False
@@ -134,21 +160,21 @@ class Parser:
         Indicates if the application allows clear text traffic.
         https://developer.android.com/guide/topics/manifest/application-element#usesCleartextTraffic
         """
-        return str2Bool(self._getattr(self.root.find("application"), "android:usesCleartextTraffic"))
+        return str2Bool(self._getattr(self.index.application, "android:usesCleartextTraffic"))
 
     def customPermissions(self):
         """
         Lists all the custom permissions defined by the application.
         https://developer.android.com/guide/topics/manifest/permission-element
         """
-        CustomPerm = namedtuple("CustomPerm", "name protectionLevel")
         res = []
-        for perm in self.root.findall('permission'):
+        for perm in self.index.findall('permission'):
             name = self._getattr(perm, "android:name")
             protectionLevel = self._getattr(perm, "android:protectionLevel")
             res.append(CustomPerm(name, protectionLevel))
         return res
 
+    @memoized
     def exportedComponents(self, component):
         """
         Lists all the exported components of a given type (activity, provider, ...).
@@ -164,17 +190,13 @@ class Parser:
         must explicitly declare whether they should be exported or not. Prior to Android 12, components (activities,
         services, and broadcast receivers only) with an intent-filter declared were automatically exported
         """
+        components = self.index.ofType(component)
         # check if there is android:exported property set to True (no matter intent filter)
-        exported_component = {self._getattr(e, "android:name") for e in
-                              self.root.findall(f'application/{component}[@android:exported="true"]',
-                                                namespaces=self.namespaces)}
+        exported_component = {e.name for e in components if e.exported is True}
         # check if there is an intent filter in component tag
-        intent_component = {self._getattr(e, "android:name") for e in
-                            self.root.findall(f'application/{component}/intent-filter/..', namespaces=self.namespaces)}
+        intent_component = {e.name for e in components if e.intentFilters}
         # check if there is android:exported property set to False (no matter intent filter)
-        unexported_component = {self._getattr(e, "android:name") for e in
-                                self.root.findall(f'application/{component}[@android:exported="false"]',
-                                                  namespaces=self.namespaces)}
+        unexported_component = {e.name for e in components if e.exported is False}
         # update components (if there is android:exported to False and intent-filter, component is not exported)
         exported_component.update(intent_component - unexported_component)
         return list(exported_component)
@@ -183,7 +205,7 @@ class Parser:
         """
         Counts the number of components of a given type (activity, provider, ...).
         """
-        return len(self.root.findall(f'application/{component}'))
+        return len(self.index.ofType(component))
 
     def exportedComponentStats(self, component):
         """
@@ -196,28 +218,28 @@ class Parser:
         Returns the configured backup rules file for android <= 11 or None.
         https://developer.android.com/guide/topics/manifest/application-element#fullBackupContent
         """
-        return self._getattr(self.root.find("application"), "android:fullBackupContent")
+        return self._getattr(self.index.application, "android:fullBackupContent")
 
     def dataExtractionRules(self):
         """
         Returns the configured backup rules file for android >= 12 or None.
         https://developer.android.com/guide/topics/manifest/application-element#dataExtractionRules
         """
-        return self._getattr(self.root.find("application"), "android:dataExtractionRules")
+        return self._getattr(self.index.application, "android:dataExtractionRules")
 
     def networkSecurityConfig(self):
         """
         Returns the network security configuration file or None.
         https://developer.android.com/guide/topics/manifest/application-element#networkSecurityConfig
         """
-        return self._getattr(self.root.find("application"), "android:networkSecurityConfig")
+        return self._getattr(self.index.application, "android:networkSecurityConfig")
 
     def getSdkVersion(self):
         """
         Returns the minimal and maximal SDK versions defined in the manifest.
         https://developer.android.com/guide/topics/manifest/uses-sdk-element
         """
-        usesSdk = self.root.find("uses-sdk")
+        usesSdk = self.index.find("uses-sdk")
         # if not defined return 0
         min_level = 0
         max_level = 0
@@ -228,6 +250,7 @@ class Parser:
             max_level = int(self._getattr(usesSdk, "android:maxSdkVersion") or 0)
         return min_level, max_level
 
+    @memoized
     def getExportedComponentPermission(self, componentType):
         """
         Lists all exported components of a given type (activity, provider, ...) and their permissions.
@@ -243,25 +266,21 @@ class Parser:
         take precedence over this one.
         """
 
-        # use a namedtuple for more readable access to important attributes
-        ExportedComponents = namedtuple("ExportedComponents",
-                                        "componentName componentType permission readPermission "
-                                        "writePermission grantUriPermissions")
         res = []
         for name in self.exportedComponents(componentType):
-            component = self.root.find(f'application/{componentType}[@android:name="{name}"]',
-                                       namespaces=self.namespaces)
-            permission = self._getattr(component, "android:permission")
+            component = self.index.getComponent(componentType, name)
+            permission = component.permission
             readPermission, writePermission, grantUriPermissions = None, None, None
             if componentType == "provider":
                 # only providers have those attributes
-                readPermission = self._getattr(component, "android:readPermission")
-                writePermission = self._getattr(component, "android:writePermission")
-                grantUriPermissions = str2Bool(self._getattr(component, "android:grantUriPermissions"))
+                readPermission = component.readPermission
+                writePermission = component.writePermission
+                grantUriPermissions = component.grantUriPermissions
             res.append(ExportedComponents(name, componentType, permission, readPermission, writePermission,
                                           grantUriPermissions))
         return res
 
+    @memoized
     def getUnexportedProviders(self):
         """
         Lists unexported providers with grantUriPermission set to True.
@@ -270,46 +289,40 @@ class Parser:
         https://blog.oversecured.com/Android-Access-to-app-protected-components/
         https://snyk.io/blog/exploring-android-intent-based-security-vulnerabilities-google-play/
         """
-        return {self._getattr(e, "android:name") for e in self.root.findall(
-            f'application/provider[@android:grantUriPermissions="true"][@android:exported="false"]',
-            namespaces=self.namespaces)}
+        return {e.name for e in self.index.ofType("provider") if e.grantUriPermissions is True and e.exported is False}
 
+    @memoized
     def getIntentFilterExportedComponents(self):
         """
         Returns a tuple (componentName, componentType) for each exported component having
         one or more intent_filter(s) (android:exported is true or none)
         """
-        all_intent = {(self._getattr(e, "android:name"), e.tag) for e in
-                      self.root.findall(f'application/*/intent-filter/..')}
-        not_exported = {(self._getattr(e, "android:name"), e.tag) for e in
-                        self.root.findall(f'application/*[@android:exported="false"]/intent-filter/..',
-                                          namespaces=self.namespaces)}
+        all_intent = {(e.name, e.tag) for e in self.index.components if e.intentFilters}
+        not_exported = {(e.name, e.tag) for e in self.index.components if e.intentFilters and e.exported is False}
         return all_intent - not_exported
 
     def getIntentFilters(self, compname):
         """
         Returns a list containing intent_filters information (action, category, data_uris, mimetypes)
-        from an Element with given name.
+        from an Element with given name. data_uris is a UriSet.
         """
-        # get intent-filter element from a Element with given name
-        intents = self.root.findall(f"application/*[@android:name=\"{compname}\"]/intent-filter",
-                                    namespaces=self.namespaces)
+        # get intent-filter information from the components with given name
+        intents = [i for e in self.index.named(compname) for i in e.intentFilters]
         res = []
         # each intent on a separated line
         for e in intents:
             # an intent can have multiple actions
-            actions = [self._getattr(e, "android:name").split(".")[-1] for e in e.findall("action")]
+            actions = [a.split(".")[-1] for a in e.actions]
             actions = "\n".join(actions)
             # an intent can have multiple categories
-            categories = [self._getattr(e, "android:name").split(".")[-1] for e in e.findall("category")]
+            categories = [c.split(".")[-1] for c in e.categories]
             categories = "\n".join(categories)
-            mimeType = {self._getattr(e, "android:mimeType") for e in e.findall("data")} - {None} or {""}
+            mimeType = {d.mimeType for d in e.datas} - {None} or {""}
             mimetypes = "\n".join(mimeType)
 
             # Compute all the merged combinations of data attributes
             # https://developer.android.com/guide/topics/manifest/data-element
             uris = self._getIntentFiltersUrisInfo(e, len(mimeType) > 1)
-            uris = "\n".join(uris)
 
             res.append([actions, categories, uris, mimetypes])
 
@@ -317,7 +330,7 @@ class Parser:
 
     def _getIntentFiltersUrisInfo(self, intent, hasMimeType):
         """
-        Lists all the URIs of the given <intent-filter> element.
+        Returns the UriSet of the given intent filter (see ManifestIndex).
 
         https://developer.android.com/training/app-links/verify-android-applinks#multi-host
         All <data> elements in the same intent filter are merged together to account for all variations of their
@@ -326,22 +339,22 @@ class Parser:
         http://www.example.com and https://www.example.com. As such, you must create separate intent filters when
         you want to define specific combinations of URI schemes and domains.
         """
-        datas = intent.findall("data")
+        datas = intent.datas
         # recover all the possible attributes
-        schemes = {self._getattr(e, "android:scheme") for e in datas} - {None}
+        schemes = {e.scheme for e in datas} - {None}
         schemes = {f"{e}://" for e in schemes} or {""}
         # https://developer.android.com/guide/topics/manifest/data-element
         if hasMimeType and schemes == {""}:
             schemes = {"content://", "file://"}
 
-        hosts = {self._getattr(e, "android:host") for e in datas} - {None} or {""}
-        port = {self._getattr(e, "android:port") for e in datas} - {None}
+        hosts = {e.host for e in datas} - {None} or {""}
+        port = {e.port for e in datas} - {None}
         port = {f":{e}" for e in port} or {""}
 
         # path, pathPattern and pathPrefix have the same role
-        path = {self._getattr(e, "android:path") for e in datas} - {None}
-        pathPattern = {self._getattr(e, "android:pathPattern") for e in datas} - {None}
-        pathPrefix = {self._getattr(e, "android:pathPrefix") for e in datas} - {None}
+        path = {e.path for e in datas} - {None}
+        pathPattern = {e.pathPattern for e in datas} - {None}
+        pathPrefix = {e.pathPrefix for e in datas} - {None}
         pathPrefix = {f"{e}/.*" for e in pathPrefix} or {""}  # respect syntax of pathPattern
         # put them in the same set
         path.update(pathPrefix)
@@ -349,15 +362,16 @@ class Parser:
 
         # https://developer.android.com/guide/topics/manifest/data-element
         if schemes == {""}:
-            return []
+            return UriSet()
 
         if hosts == {""}:
-            return schemes
+            return UriSet(schemes)
 
-        # Compute all the merged combinations of data attributes
+        # All the merged combinations of data attributes, they are only computed if the set is iterated
         # https://developer.android.com/guide/topics/manifest/data-element
-        return ["".join(uri) for uri in product(schemes, hosts, port, path)]
+        return UriSet(schemes, hosts, port, path)
 
+    @memoized
     def getUniversalLinks(self):
         """
         Returns a list containing Universal links (deep links and app links) information
@@ -368,27 +382,39 @@ class Parser:
         """
         # do not keep the tag
         exported_components = self.getIntentFilterExportedComponents()
-        # use a namedtuple for more readable access to important attributes
-        UniversalLink = namedtuple("UniversalLink", "name tag autoVerify uris hosts")
         deepLinks = []
         for compname, tag in exported_components:
-            # deep links must have ACTION_VIEW
-            intents = self.root.findall(f'application/*[@android:name=\"{compname}\"]/intent-filter/'
-                                        f'action[@android:name="android.intent.action.VIEW"]/..',
-                                        namespaces=self.namespaces)
-            for i in intents:
-                # deep links must have category BROWSABLE
-                if i.find('category[@android:name="android.intent.category.BROWSABLE"]',
-                          namespaces=self.namespaces) is not None:
-                    mimeType = {self._getattr(e, "android:mimeType") for e in i.findall("data")}
+            for i in [i for e in self.index.named(compname) for i in e.intentFilters]:
+                # deep links must have ACTION_VIEW and category BROWSABLE
+                if "android.intent.action.VIEW" in i.actions and "android.intent.category.BROWSABLE" in i.categories:
+                    mimeType = {e.mimeType for e in i.datas}
                     uris = self._getIntentFiltersUrisInfo(i, len(mimeType) > 1)
                     # add additional info to check if a deeplink is actually an app link
-                    hosts = {self._getattr(e, "android:host") for e in i.findall("data")} - {None} or {""}
-                    autoVerify = str2Bool(self._getattr(i, "android:autoVerify"))
-                    deepLinks.append(UniversalLink(compname, tag, autoVerify, uris, hosts))
+                    hosts = {e.host for e in i.datas} - {None} or {""}
+                    deepLinks.append(UniversalLink(compname, tag, i.autoVerify, uris, hosts))
 
         return deepLinks
 
+    @memoized
+    def getDeepLinkMatcher(self, browsableOnly=True):
+        """
+        Compiles the intent filters of the exported components into a DeepLinkMatcher,
+        used to find the components handling a batch of URLs.
+        """
+        # same components as getIntentFilterExportedComponents, in document order
+        components = [e for e in self.index.components if e.intentFilters and e.exported is not False]
+        return DeepLinkMatcher(components, browsableOnly)
+
+    @memoized
+    def getIntentResolver(self):
+        """
+        Indexes the intent filters of the exported components into an IntentResolver,
+        used to find the components receiving a batch of implicit intents.
+        The full action and category names are used, not the shortened ones displayed by getIntentFilters.
+        """
+        components = [e for e in self.index.components if e.intentFilters and e.exported is not False]
+        return IntentResolver(components)
+
     def getFullBackupContentRules(self):
         # will be overridden in the APKParser class
         return []
@@ -409,12 +435,20 @@ class Parser:
         # will be overridden in the APKParser class
         return None
 
+    def getNetworkSecParser(self):
+        # will be overridden in the APKParser class
+        return None
+
+    def getSignatures(self):
+        # will be overridden in the APKParser class
+        return []
+
     def fullBackupOnly(self):
         """
         Checks whether to use Auto Backup on devices where it is available
         https://developer.android.com/guide/topics/manifest/application-element#fullBackupOnly
         """
-        fullBackupOnly = str2Bool(self._getattr(self.root.find("application"), "android:fullBackupOnly"))
+        fullBackupOnly = str2Bool(self._getattr(self.index.application, "android:fullBackupOnly"))
         # Default value is False
         if fullBackupOnly is None:
             fullBackupOnly = False
@@ -0,0 +1,56 @@
+from collections import namedtuple
+
+# The records returned by the parsers.
+# They are defined once at module level so they can be compared and pickled (to send them to other processes).
+# namedtuples have no __dict__ (__slots__ is empty) so instances are as cheap as tuples.
+
+# Manifest
+Info = namedtuple("Info", "package versionCode versionName")
+UsesLibrary = namedtuple("UsesLibrary", "name required")
+UsesNativeLibrary = namedtuple("UsesNativeLibrary", "name required")
+UsesFeature = namedtuple("UsesFeature", "name required")
+CustomPerm = namedtuple("CustomPerm", "name protectionLevel")
+ExportedComponents = namedtuple("ExportedComponents", "componentName componentType permission readPermission "
+                                                      "writePermission grantUriPermissions")
+UniversalLink = namedtuple("UniversalLink", "name tag autoVerify uris hosts")
+
+# Components indexed by ManifestIndex
+Component = namedtuple("Component", "name tag exported permission readPermission writePermission "
+                                    "grantUriPermissions intentFilters")
+IntentFilter = namedtuple("IntentFilter", "actions categories datas autoVerify")
+Data = namedtuple("Data", "scheme host port path pathPrefix pathPattern mimeType")
+# an implicit intent resolved by IntentResolver, data is a URI and type a MIME type (both can be None)
+Intent = namedtuple("Intent", "action categories data type", defaults=((), None, None))
+
+# Backup rules
+Rule = namedtuple("Rule", "type domain path requireFlags")
+ExtractionRules = namedtuple("ExtractionRules", "cloudBackupRules disableIfNoEncryptionCapabilities "
+                                                "deviceTransferRules")
+
+# APK signature, digests maps the name of the signature algorithm to the hexadecimal content digest
+Certificate = namedtuple("Certificate", "subject issuer serialNumber notBefore notAfter sha256")
+Signer = namedtuple("Signer", "certificates keyAlgorithm keySize digests minSdkVersion maxSdkVersion")
+# digestsVerified is None when the scheme has no content digest (v1) or none could be checked,
+# False when they do not match or the scheme could not be parsed (it has no signers then)
+SignatureScheme = namedtuple("SignatureScheme", "version signers digestsVerified")
+
+# Digital Asset Links of a host, packages maps the package names of the statements delegating
+# common.handle_all_urls to their certificate fingerprints
+AssetLinks = namedtuple("AssetLinks", "host available packages")
+
+# Network security config
+Cert = namedtuple("Cert", "src overridePins")
+BConfig = namedtuple("BConfig", "cleartextTrafficPermitted trustanchors")
+DomainTrustAnchors = namedtuple("DomainTrustAnchors", "domain trustanchors")
+DomainPinSet = namedtuple("DomainPinSet", "domain pinset")
+DomainPinning = namedtuple("DomainPinning", "domain pinset overridePins")
+# the effective policy of a <domain> element, domain is prefixed with "*." if includeSubdomains is True
+DomainPolicy = namedtuple("DomainPolicy", "domain name includeSubdomains cleartextTrafficPermitted trustanchors "
+                                          "pinset")
+
+# Analysis
+# a result of a check reported to FindingsCollector, [minSdk, maxSdk] is the range of Android versions it applies to
+Finding = namedtuple("Finding", "check severity message minSdk maxSdk component evidence")
+
+# External programs, returncode is None if the process was killed when it timed out
+ProcResult = namedtuple("ProcResult", "stdout stderr returncode timedOut")
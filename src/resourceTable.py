@@ -0,0 +1,264 @@
+import struct
+from collections import namedtuple
+from pyaxmlparser.utils import format_value
+from .axmlDecoder import StringPool, RES_STRING_POOL_TYPE
+
+# Chunk types of the resource table
+# https://android.googlesource.com/platform/frameworks/base/+/master/libs/androidfw/include/androidfw/ResourceTypes.h
+RES_TABLE_TYPE = 0x0002
+RES_TABLE_PACKAGE_TYPE = 0x0200
+RES_TABLE_TYPE_TYPE = 0x0201
+
+# ResTable_type flags
+FLAG_SPARSE = 0x01
+FLAG_OFFSET16 = 0x02
+# ResTable_entry flags
+FLAG_COMPLEX = 0x0001
+FLAG_COMPACT = 0x0008
+
+NO_ENTRY = 0xFFFFFFFF
+NO_ENTRY16 = 0xFFFF
+TYPE_STRING = 0x03
+
+# offset of the ResTable_type chunk holding the values for one configuration
+# default is True when the configuration does not target a specific locale
+TypeChunk = namedtuple("TypeChunk", "offset default")
+
+
+class Package:
+    """
+    A package of the resource table. Only the headers are read, type chunks are decoded on demand.
+    https://android.googlesource.com/platform/frameworks/base/+/master/libs/androidfw/include/androidfw/ResourceTypes.h#1290
+    """
+
+    def __init__(self, data, offset):
+        _, headerSize, size, self.id = struct.unpack_from("<HHII", data, offset)
+        name = bytes(data[offset + 12:offset + 12 + 256]).decode("utf-16-le", "replace")
+        self.name = name[:name.find("\x00")] if "\x00" in name else name
+        typeStrings, _, keyStrings = struct.unpack_from("<III", data, offset + 12 + 256)
+        self.typeStrings = StringPool(data, offset + typeStrings)
+        self.keyStrings = StringPool(data, offset + keyStrings)
+        # type ID (1-based index in typeStrings) -> TypeChunk list in file order
+        self.types = {}
+        self.typeIds = {}
+        end = offset + size
+        chunk = offset + headerSize
+        while chunk + 8 <= end:
+            chunkType, _, chunkSize = struct.unpack_from("<HHI", data, chunk)
+            if chunkSize < 8:
+                break
+            if chunkType == RES_TABLE_TYPE_TYPE:
+                typeId, = struct.unpack_from("<B", data, chunk + 8)
+                # the locale is the third field of the ResTable_config that follows the 20 bytes header
+                locale, = struct.unpack_from("<I", data, chunk + 20 + 8)
+                self.types.setdefault(typeId, []).append(TypeChunk(chunk, locale == 0))
+            chunk += chunkSize
+        for typeId in self.types:
+            self.typeIds[self.typeStrings[typeId - 1]] = typeId
+
+
+class ResourceTable:
+    """
+    A lazy reader of resources.arsc.
+
+    Parsing the whole table is expensive on big applications while only a handful of lookups are needed
+    (resolving the IDs found in XML files, finding the path of a XML resource and reading the strings).
+    Only the package headers and the type/key string pools are read up front,
+    the type chunks are decoded when they are queried and what is decoded is cached.
+    https://android.googlesource.com/platform/frameworks/base/+/master/libs/androidfw/include/androidfw/ResourceTypes.h#1252
+    """
+
+    def __init__(self, data):
+        self.data = data
+        _, headerSize, size, _ = struct.unpack_from("<HHII", data, 0)
+        self.strings = None
+        self.packages = {}
+        self._keys = {}
+        self._strings = {}
+        chunk = headerSize
+        end = min(size, len(data))
+        while chunk + 8 <= end:
+            chunkType, _, chunkSize = struct.unpack_from("<HHI", data, chunk)
+            if chunkSize < 8:
+                break
+            if chunkType == RES_STRING_POOL_TYPE and self.strings is None:
+                self.strings = StringPool(data, chunk)
+            elif chunkType == RES_TABLE_PACKAGE_TYPE:
+                package = Package(data, chunk)
+                self.packages[package.name] = package
+            chunk += chunkSize
+
+    def getPackagesNames(self):
+        """
+        Lists the names of the packages defined in the table.
+        """
+        return list(self.packages)
+
+    def _entryOffset(self, chunk, index):
+        """
+        Returns the offset of the entry with the given index in a ResTable_type chunk,
+        or None if the chunk does not define a value for it.
+        """
+        _, headerSize, _, _, flags, _, entryCount, entriesStart = struct.unpack_from("<HHIBBHII", self.data, chunk)
+        offsets = chunk + headerSize
+        if flags & FLAG_SPARSE:
+            # (index, offset / 4) pairs sorted by index
+            low, high = 0, entryCount
+            while low < high:
+                middle = (low + high) // 2
+                idx, offset = struct.unpack_from("<HH", self.data, offsets + middle * 4)
+                if idx == index:
+                    return chunk + entriesStart + offset * 4
+                if idx < index:
+                    low = middle + 1
+                else:
+                    high = middle
+            return None
+        if index >= entryCount:
+            return None
+        if flags & FLAG_OFFSET16:
+            offset, = struct.unpack_from("<H", self.data, offsets + index * 2)
+            if offset == NO_ENTRY16:
+                return None
+            return chunk + entriesStart + offset * 4
+        offset, = struct.unpack_from("<I", self.data, offsets + index * 4)
+        if offset == NO_ENTRY:
+            return None
+        return chunk + entriesStart + offset
+
+    def _entries(self, chunk):
+        """
+        Lists the (index, offset) of all the entries of a ResTable_type chunk.
+        """
+        _, headerSize, _, _, flags, _, entryCount, entriesStart = struct.unpack_from("<HHIBBHII", self.data, chunk)
+        offsets = chunk + headerSize
+        if flags & FLAG_SPARSE:
+            for i in range(entryCount):
+                idx, offset = struct.unpack_from("<HH", self.data, offsets + i * 4)
+                yield idx, chunk + entriesStart + offset * 4
+        elif flags & FLAG_OFFSET16:
+            for idx, offset in enumerate(struct.unpack_from(f"<{entryCount}H", self.data, offsets)):
+                if offset != NO_ENTRY16:
+                    yield idx, chunk + entriesStart + offset * 4
+        else:
+            for idx, offset in enumerate(struct.unpack_from(f"<{entryCount}I", self.data, offsets)):
+                if offset != NO_ENTRY:
+                    yield idx, chunk + entriesStart + offset
+
+    def _readEntry(self, offset):
+        """
+        Reads a ResTable_entry.
+        :return: The index of its name in the key strings, the type of its value and its data.
+                 The type is None for complex entries (styles, plurals, ...).
+        """
+        size, flags, key = struct.unpack_from("<HHI", self.data, offset)
+        if flags & FLAG_COMPACT:
+            # the key index is stored in place of the size and the value type in the high byte of the flags
+            return size, flags >> 8, key
+        if flags & FLAG_COMPLEX:
+            return key, None, None
+        _, _, valueType, data = struct.unpack_from("<HBBI", self.data, offset + size)
+        return key, valueType, data
+
+    def _formatValue(self, valueType, data):
+        if valueType == TYPE_STRING:
+            return self.strings[data]
+        return format_value(valueType, data, lambda idx: self.strings[idx])
+
+    def _find(self, rid, defaultOnly):
+        """
+        Finds the first entry defining a resource ID.
+        :return: The offset of the entry or None.
+        """
+        packageId, typeId, index = rid >> 24, (rid >> 16) & 0xFF, rid & 0xFFFF
+        for package in self.packages.values():
+            if package.id != packageId:
+                continue
+            for chunk in package.types.get(typeId, []):
+                if defaultOnly and not chunk.default:
+                    continue
+                offset = self._entryOffset(chunk.offset, index)
+                if offset is not None:
+                    return offset
+
+    def getId(self, packageName, rid):
+        """
+        Returns the type and the name of a resource ID defined for the default locale.
+        :return: (type, name, rid) or (None, None, None) if it is not defined
+        """
+        package = self.packages.get(packageName)
+        if package is None or package.id != rid >> 24:
+            return None, None, None
+        typeId = (rid >> 16) & 0xFF
+        for chunk in package.types.get(typeId, []):
+            if chunk.default:
+                offset = self._entryOffset(chunk.offset, rid & 0xFFFF)
+                if offset is not None:
+                    key, _, _ = self._readEntry(offset)
+                    return package.typeStrings[typeId - 1], package.keyStrings[key], rid
+        return None, None, None
+
+    def getValue(self, rid, defaultOnly=False):
+        """
+        Returns the value of a resource in the first configuration that defines it.
+        For files (XML, images, ...) the value is the path of the file in the APK.
+        :param defaultOnly: Only look for configurations without a locale.
+        """
+        offset = self._find(rid, defaultOnly)
+        if offset is None:
+            return None
+        _, valueType, data = self._readEntry(offset)
+        if valueType is None:
+            return None
+        return self._formatValue(valueType, data)
+
+    def getResourceIds(self, packageName, resType):
+        """
+        Maps the names of all the resources of a type (string, xml, ...) to their IDs.
+        Only the chunks of this type are decoded.
+        """
+        key = (packageName, resType)
+        if key not in self._keys:
+            names = {}
+            package = self.packages.get(packageName)
+            typeId = package.typeIds.get(resType) if package is not None else None
+            if typeId is not None:
+                for chunk in package.types[typeId]:
+                    for idx, offset in self._entries(chunk.offset):
+                        names[package.keyStrings[self._readEntry(offset)[0]]] = (package.id << 24) | (typeId << 16) | idx
+            self._keys[key] = names
+        return self._keys[key]
+
+    def getResourceId(self, packageName, resType, name):
+        """
+        Returns the ID of the resource with the given type and name or None.
+        """
+        return self.getResourceIds(packageName, resType).get(name)
+
+    def getString(self, packageName, name):
+        """
+        Returns the value of a string resource for the default locale or None.
+        """
+        rid = self.getResourceId(packageName, "string", name)
+        if rid is None:
+            return None
+        return self.getValue(rid, defaultOnly=True)
+
+    def getStrings(self, packageName):
+        """
+        Lists the values of all the string resources for the default locale.
+        """
+        if packageName not in self._strings:
+            strings = {}
+            package = self.packages.get(packageName)
+            typeId = package.typeIds.get("string") if package is not None else None
+            if typeId is not None:
+                for chunk in package.types[typeId]:
+                    if not chunk.default:
+                        continue
+                    for idx, offset in self._entries(chunk.offset):
+                        _, valueType, data = self._readEntry(offset)
+                        if valueType is not None:
+                            strings[idx] = self._formatValue(valueType, data)
+            self._strings[packageName] = list(strings.values())
+        return self._strings[packageName]
@@ -0,0 +1,178 @@
+import os
+import io
+import sys
+import json
+import glob
+import hashlib
+import time
+import logging
+import tempfile
+import functools
+from .records import Finding
+
+logger = logging.getLogger("MainLogger")
+
+# the command line options changing the output of an analysis, besides the file and the SDK range
+KEY_OPTIONS = ("log_level", "expand_uris", "apksigner", "format")
+# stands for the path of the analyzed file in the recorded outputs, the same file can be analyzed under other paths
+PATH_PLACEHOLDER = "\x00path\x00"
+
+
+@functools.lru_cache(maxsize=None)
+def toolVersion():
+    """
+    Identifies the version of the analyzer by the digest of its sources,
+    so the results cached by another version are never used.
+    """
+    h = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.py"))):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def fileDigest(path):
+    """
+    Returns the SHA-256 of a file, read by blocks.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class _Recorder(io.TextIOBase):
+    """
+    Records what an analysis displays, in order: the text written to STDOUT and the messages of the logger
+    (before they are formatted, so they are formatted again when they are replayed).
+    """
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        # ["out", text] or [level, message]
+        self.events = []
+
+    def write(self, s):
+        self.events.append(["out", s])
+        return self.stream.write(s)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self):
+        # termcolor only colors the output of terminals
+        return self.stream.isatty()
+
+    def filter(self, record):
+        self.events.append([record.levelno, record.getMessage()])
+        return True
+
+
+class ResultCache:
+    """
+    An on-disk cache of the analysis results, addressed by the content of the analyzed file.
+
+    The key is the SHA-256 of the file with the SDK range, the version of the analyzer and the options changing
+    the output, so a file analyzed again with the same parameters is answered without being opened as an APK.
+    The cached results do not depend on the path of the file: the findings are rendered again (NDJSON, SARIF)
+    or the path is replaced in the recorded output.
+    The results depending on the network (Digital Asset Links) are only kept as long as the files they come from
+    are cached, see put.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def key(self, path, args, checks=()):
+        """
+        Computes the key of the analysis of a file.
+        :param checks: The names of the checks that are run.
+        """
+        key = {
+            "sha256": fileDigest(path),
+            "minSdkVersion": args.min_sdk_version,
+            "maxSdkVersion": args.max_sdk_version,
+            "version": toolVersion(),
+            "checks": sorted(checks),
+            "options": {e: getattr(args, e, None) for e in KEY_OPTIONS},
+            "color": sys.stdout.isatty() or "FORCE_COLOR" in os.environ,
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def get(self, key, kind="events"):
+        """
+        Returns the cached result of an analysis or None if it is not cached or has expired.
+        :param kind: "events" (the recorded output) or "findings".
+        """
+        try:
+            with open(self._file(key)) as f:
+                entry = json.load(f)
+            if entry.get("expires") is not None and entry["expires"] <= time.time():
+                return None
+            return entry[kind]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, value, ttl=None, kind="events"):
+        """
+        Caches the result of an analysis.
+        :param ttl: The number of seconds it is valid, forever by default.
+        :param kind: See get.
+        """
+        expires = time.time() + ttl if ttl is not None else None
+        try:
+            os.makedirs(os.path.dirname(self._file(key)), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self._file(key)), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({kind: value, "expires": expires}, f, default=str)
+            os.replace(tmp, self._file(key))
+        except OSError as e:
+            logger.debug(f"Could not cache the result: {e}")
+
+    def record(self, key, path, analysis, ttl=None):
+        """
+        Runs an analysis while recording what it displays and caches it if it succeeds.
+        :param path: The analyzed file.
+        :param ttl: See put.
+        """
+        recorder = _Recorder(sys.stdout)
+        logger.addFilter(recorder)
+        sys.stdout = recorder
+        try:
+            analysis()
+        finally:
+            sys.stdout = recorder.stream
+            logger.removeFilter(recorder)
+        self.put(key, [[kind, text.replace(path, PATH_PLACEHOLDER)] for kind, text in recorder.events], ttl)
+
+    @staticmethod
+    def replay(events, path):
+        """
+        Displays a cached output as the analysis of the file did.
+        """
+        for kind, text in events:
+            text = text.replace(PATH_PLACEHOLDER, path)
+            if kind == "out":
+                sys.stdout.write(text)
+            else:
+                logger.log(kind, text)
+        sys.stdout.flush()
+
+    def putFindings(self, key, findings, ttl=None):
+        """
+        Caches the findings of an analysis, see replayFindings.
+        """
+        self.put(key, [e._asdict() for e in findings], ttl, "findings")
+
+    @staticmethod
+    def replayFindings(findings, renderer):
+        """
+        Renders cached findings again, for the file being analyzed.
+        """
+        for e in findings:
+            renderer.render(Finding(**e))
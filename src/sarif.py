@@ -0,0 +1,239 @@
+import os
+import json
+import pathlib
+from xml.parsers import expat
+
+# https://docs.oasis-open.org/sarif/sarif/v2.1.0/sarif-v2.1.0.html
+SARIF_VERSION = "2.1.0"
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+TOOL_NAME = "AMAnDe"
+ANDROID_NAMESPACE = "http://schemas.android.com/apk/res/android"
+
+# severity of a finding -> SARIF level
+LEVELS = {
+    "info": "note",
+    "warning": "warning",
+    "error": "error",
+    "critical": "error",
+}
+
+# check ID -> (manifest element the finding is located on, description, documentation)
+RULES = {
+    "max-sdk-version-declared": ("uses-sdk", "The android:maxSdkVersion attribute is declared",
+                                 "https://developer.android.com/guide/topics/manifest/uses-sdk-element#max"),
+    "apk-not-signed": (None, "The APK is not signed",
+                       "https://source.android.com/docs/security/features/apksigning"),
+    "apk-signed-with-v1-only": (None, "The APK is only signed with the JAR signature scheme (v1)",
+                                "https://source.android.com/docs/security/features/apksigning/v2"),
+    "apk-digest-mismatch": (None, "The content digests of the APK signature do not match the APK",
+                            "https://source.android.com/docs/security/features/apksigning/v2#verification"),
+    "apk-signature-malformed": (None, "A signature scheme of the APK could not be parsed",
+                                "https://source.android.com/docs/security/features/apksigning"),
+    "dangerous-permissions": ("uses-permission", "Dangerous builtin permissions are required",
+                              "https://developer.android.com/guide/topics/permissions/overview#dangerous_permissions"),
+    "custom-permissions-protection-level": ("permission", "Custom permissions with a protectionLevel <= dangerous",
+                                            "https://developer.android.com/guide/topics/manifest/permission-element"),
+    "adb-backup": ("application", "ADB backups are allowed",
+                   "https://developer.android.com/guide/topics/manifest/application-element#allowbackup"),
+    "auto-backup": ("application", "Auto-Backup to Google Drive is activated",
+                    "https://developer.android.com/guide/topics/data/autobackup"),
+    "auto-backup-unencrypted": ("application", "Auto-Backup is not end-to-end encrypted",
+                                "https://developer.android.com/guide/topics/data/autobackup"),
+    "backup-agent": ("application", "A custom backup agent is implemented",
+                     "https://developer.android.com/guide/topics/manifest/application-element#agent"),
+    "backup-rules-missing": ("application", "No backup rules file excludes data from the backups",
+                             "https://developer.android.com/guide/topics/data/autobackup#IncludingFiles"),
+    "cloud-backup-unencrypted": ("application", "Cloud backups are performed even if they cannot be encrypted",
+                                 "https://developer.android.com/guide/topics/data/autobackup#xml-syntax-android-12"),
+    "network-security-config-missing": ("application", "No network security configuration",
+                                        "https://developer.android.com/training/articles/security-config"),
+    "debuggable": ("application", "The application is debuggable",
+                   "https://developer.android.com/guide/topics/manifest/application-element#debug"),
+    "debuggable-flutter": ("application", "The source code of a debuggable Flutter app is embedded",
+                           "https://developer.android.com/guide/topics/manifest/application-element#debug"),
+    "exported-components-without-permission": (None, "Exported components without permission",
+                                               "https://developer.android.com/guide/topics/manifest/"
+                                               "activity-element#exported"),
+    "unexported-providers-grant-uri-permissions": (None, "Unexported providers granting URI permissions",
+                                                   "https://developer.android.com/guide/topics/manifest/"
+                                                   "provider-element#gprmsn"),
+    "cleartext-traffic": ("application", "Cleartext network traffic is allowed",
+                          "https://developer.android.com/guide/topics/manifest/"
+                          "application-element#usesCleartextTraffic"),
+    "nsc-cleartext-traffic": (None, "The network security configuration allows cleartext traffic",
+                              "https://developer.android.com/training/articles/security-config"
+                              "#CleartextTrafficPermitted"),
+    "nsc-pinning-gap": (None, "Certificate pinning can be bypassed or has expired",
+                        "https://developer.android.com/training/articles/security-config#CertificatePinning"),
+    "app-link": (None, "App Links and their Digital Asset Links",
+                 "https://developer.android.com/training/app-links/verify-android-applinks"),
+    "deep-link": (None, "Deep links handled by the application",
+                  "https://developer.android.com/training/app-links/deep-linking"),
+    "url-handled": (None, "URLs handled by the application",
+                    "https://developer.android.com/training/app-links/deep-linking"),
+}
+RULE_INDEXES = {check: i for i, check in enumerate(RULES)}
+
+
+def _ruleName(check):
+    return "".join(e.capitalize() for e in check.split("-"))
+
+
+def rules():
+    """
+    Describes the checks as SARIF reportingDescriptor objects.
+    """
+    return [{
+        "id": check,
+        "name": _ruleName(check),
+        "shortDescription": {"text": description},
+        "helpUri": helpUri,
+        "properties": {"tags": ["security", "android"]},
+    } for check, (_, description, helpUri) in RULES.items()]
+
+
+def locateElements(path):
+    """
+    Finds the lines of the elements of a manifest file (the decoded AndroidManifest.xml files only,
+    an APK has no lines).
+    :return: android:name -> line and tag -> line of the first element, or None if the file is not an XML file.
+    """
+    names, tags = {}, {}
+    parser = expat.ParserCreate(namespace_separator=" ")
+
+    def start(tag, attrs):
+        tags.setdefault(tag, parser.CurrentLineNumber)
+        name = attrs.get(f"{ANDROID_NAMESPACE} name")
+        if name is not None:
+            names.setdefault(name, parser.CurrentLineNumber)
+
+    parser.StartElementHandler = start
+    try:
+        with open(path, "rb") as f:
+            parser.ParseFile(f)
+    except (OSError, expat.ExpatError):
+        return None
+    return names, tags
+
+
+def _artifactLocation(path):
+    if os.path.isabs(path):
+        return {"uri": pathlib.Path(path).as_uri()}
+    return {"uri": pathlib.PurePath(path).as_posix(), "uriBaseId": "%SRCROOT%"}
+
+
+class SarifRenderer:
+    """
+    Writes each finding as a SARIF result object on its own line, SarifWriter joins them into a SARIF log.
+    The findings are located on the manifest elements they are about: the lines are known for manifest files,
+    the components are also given as logical locations.
+    """
+
+    def __init__(self, stream, path):
+        self.stream = stream
+        self.path = path
+        self.artifact = _artifactLocation(path)
+        self._elements = None
+
+    def _line(self, tag=None, name=None):
+        if self._elements is None:
+            self._elements = locateElements(self.path) or False
+        if not self._elements:
+            return None
+        names, tags = self._elements
+        return names.get(name) if name is not None else tags.get(tag)
+
+    def _location(self, tag=None, name=None):
+        location = {"physicalLocation": {"artifactLocation": self.artifact}}
+        line = self._line(tag, name)
+        if line is not None:
+            location["physicalLocation"]["region"] = {"startLine": line}
+        if name is not None:
+            # components are classes, the other named elements are permissions
+            location["logicalLocations"] = [{"fullyQualifiedName": name, "kind": "type" if tag is None else "resource"}]
+        return location
+
+    def locations(self, finding):
+        """
+        Lists the SARIF locations of a finding.
+        """
+        evidence = finding.evidence
+        tag = RULES.get(finding.check, (None,))[0]
+        names = []
+        if finding.component is not None:
+            names = [finding.component]
+        elif "components" in evidence:
+            names = [e["name"] if isinstance(e, dict) else e for e in evidence["components"]]
+        elif "providers" in evidence:
+            names = evidence["providers"]
+        if names:
+            return [self._location(name=name) for name in names]
+        if tag in ("permission", "uses-permission"):
+            return [self._location(tag, name) for name in evidence.get("permissions", ())]
+        return [self._location(tag)]
+
+    def render(self, finding, display=None):
+        result = {
+            "ruleId": finding.check,
+            "level": LEVELS[finding.severity],
+            "message": {"text": finding.message},
+            "locations": self.locations(finding),
+            "properties": {
+                "severity": finding.severity,
+                "minSdkVersion": finding.minSdk,
+                "maxSdkVersion": finding.maxSdk,
+                "evidence": finding.evidence,
+            },
+        }
+        if finding.check in RULE_INDEXES:
+            result["ruleIndex"] = RULE_INDEXES[finding.check]
+        self.stream.write(json.dumps(result, default=str) + "\n")
+        self.stream.flush()
+
+
+class SarifWriter:
+    """
+    Writes a SARIF log with a single run, the results are written as they come so the memory used does not grow
+    with the number of analyzed files.
+    It is a text stream receiving the lines of SarifRenderer, from the analyses or the workers of a batch.
+    Each line is a result, the text written is buffered until the end of its line.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+        # the beginning of a line not written yet
+        self._pending = ""
+        header = {
+            "version": SARIF_VERSION,
+            "$schema": SARIF_SCHEMA,
+            "runs": [{"tool": {"driver": {"name": TOOL_NAME, "rules": rules()}},
+                      "results": []}],
+        }
+        # everything up to the opening bracket of the results
+        text = json.dumps(header, indent=1)
+        self.footer = text[text.rindex("[]") + 1:]
+        self.stream.write(text[:text.rindex("[]") + 1])
+
+    def write(self, s):
+        *lines, self._pending = (self._pending + s).split("\n")
+        for line in lines:
+            self._writeResult(line)
+        return len(s)
+
+    def _writeResult(self, line):
+        if line.strip():
+            self.stream.write(("," if self.count else "") + "\n" + line)
+            self.count += 1
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self):
+        return False
+
+    def close(self):
+        self._writeResult(self._pending)
+        self._pending = ""
+        self.stream.write("\n" + self.footer + "\n")
+        self.stream.flush()
@@ -0,0 +1,71 @@
+from itertools import product
+from math import prod
+
+
+class UriSet:
+    """
+    The URIs handled by an intent filter, i.e. all the combinations of the scheme, host, port and path
+    of its <data> elements.
+    https://developer.android.com/guide/topics/manifest/data-element
+
+    Only the values of each part are stored, the number of combinations grows with their product
+    so they are counted, iterated or rendered in a compressed form without being expanded.
+    """
+    __slots__ = ("schemes", "hosts", "ports", "paths")
+
+    def __init__(self, schemes=(), hosts=("",), ports=("",), paths=("",)):
+        """
+        The parts are formatted to be concatenated (https://, :8080, ...), the URIs are iterated in their order.
+        """
+        self.schemes = tuple(schemes)
+        self.hosts = tuple(hosts)
+        self.ports = tuple(ports)
+        self.paths = tuple(paths)
+
+    def _parts(self):
+        return self.schemes, self.hosts, self.ports, self.paths
+
+    def __len__(self):
+        return prod(len(e) for e in self._parts())
+
+    def __iter__(self):
+        return ("".join(uri) for uri in product(*self._parts()))
+
+    def __eq__(self, other):
+        if not isinstance(other, UriSet):
+            return NotImplemented
+        return [set(e) for e in self._parts()] == [set(e) for e in other._parts()]
+
+    def __hash__(self):
+        return hash(tuple(frozenset(e) for e in self._parts()))
+
+    def __repr__(self):
+        return f"UriSet({self.compressed()!r})"
+
+    def __getstate__(self):
+        return self._parts()
+
+    def __setstate__(self, state):
+        self.schemes, self.hosts, self.ports, self.paths = state
+
+    def compressed(self):
+        """
+        Renders the set in a brace expansion form: {http://,https://}{a.com,b.com}/path
+        """
+        if len(self) == 0:
+            return ""
+        res = ""
+        for part in self._parts():
+            if len(part) == 1:
+                res += part[0]
+            else:
+                res += f"{{{','.join(sorted(part))}}}"
+        return res
+
+    def lines(self, limit=None):
+        """
+        Lists the URIs, or only the compressed form if there are more than limit of them.
+        """
+        if limit is not None and len(self) > limit:
+            return [self.compressed(), f"({len(self)} URIs)"]
+        return list(self)
@@ -2,7 +2,15 @@
 
 from termcolor import *
 import logging
-import requests
+import xml.etree.ElementTree as ET
+import functools
+import re
+
+# time given to the output of an exited subprocess to be read (seconds)
+PIPE_GRACE_PERIOD = 1
+
+# the color and style codes added by termcolor
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
 
 
 class CustomFormatter(logging.Formatter):
@@ -21,6 +29,28 @@ class CustomFormatter(logging.Formatter):
         return super(CustomFormatter, self).format(record)
 
 
+def setupLogger(logLevel, handler):
+    """
+    Configures the logger used by the analysis.
+    :param logLevel: 0 (info), 1 (warning) or 2 (error)
+    :param handler: A handler to add, its messages are formatted with CustomFormatter. None to only set the level.
+    """
+    # silence https://github.com/appknox/pyaxmlparser/blob/d111a4fc6330a0c293ffc2f114af360eb78ad2ef/pyaxmlparser
+    # /stringblock.py#L208
+    logging.getLogger("pyaxmlparser.stringblock").setLevel(logging.CRITICAL)
+
+    logger = logging.getLogger("MainLogger")
+    logger.setLevel(logging.INFO)
+    if logLevel == 1:
+        logger.setLevel(logging.WARNING)
+    elif logLevel == 2:
+        logger.setLevel(logging.ERROR)
+    if handler is not None:
+        handler.setFormatter(CustomFormatter())
+        logger.addHandler(handler)
+    return logger
+
+
 def str2Bool(s):
     """
     Associates true or false string with their corresponding boolean
@@ -33,6 +63,46 @@ def str2Bool(s):
         return None
 
 
+def parseXML(source):
+    """
+    Parses an XML document and collects its namespaces in a single pass.
+    The start-ns events are recorded while the tree is being built, so the document is only tokenized once.
+
+    :param source: A file name or a file object.
+    :return: The tree and the namespaces declared in the document (prefix -> URI).
+    :rtype: (xml.etree.ElementTree.ElementTree, dict)
+    """
+    namespaces = {}
+    events = ET.iterparse(source, events=["start-ns"])
+    for _, (prefix, uri) in events:
+        namespaces[prefix] = uri
+    return ET.ElementTree(events.root), namespaces
+
+
+def memoized(method):
+    """
+    Caches the result of a parser method for each instance and arguments.
+    The cached results are shared between the callers so they must not be modified.
+    The cache can be cleared with Parser.invalidate.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # the cache is created lazily because some parsers (unit tests) do not call __init__
+        memo = self.__dict__.setdefault("_memo", {})
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        if key not in memo:
+            memo[key] = method(self, *args, **kwargs)
+        return memo[key]
+    return wrapper
+
+
+def iterparseXML(source):
+    """
+    Parses an XML document incrementally, the events are meant to be consumed by ManifestIndex.consume.
+    """
+    return ET.iterparse(source, events=("start-ns", "start", "end"))
+
+
 def getResourceTypeName(value):
     """
     Parses resources like @XXX/XXX and gets their values
@@ -65,17 +135,6 @@ def printSubTestInfo(title):
     print(colored(f"\n[+] {title}", "cyan"))
 
 
-def checkDigitalAssetLinks(host):
-    """
-    Checks if Digital Asset Link JSON file is publicly available
-    """
-    try:
-        if requests.get(f'https://{host}/.well-known/assetlinks.json').status_code == 200:
-            return True
-    except requests.exceptions.ConnectionError:
-        return False
-
-
 def formatResource(path, name):
     """
     Formats a file name by adding an underline.
@@ -94,37 +153,99 @@ def formatResource(path, name):
 def unformatFilename(name):
     """
     Because Parser._getResValue formats filenames in a specific way
-    we must undo the formatting to work with the raw string
+    we must undo the formatting to work with the raw string.
+    The name is only colored when the output is a terminal.
+    """
+    return ANSI_ESCAPE.sub("", name)
+
+
+def _pump(pipe, consumer, closed):
+    # read1 returns what is available (up to 64 KiB) instead of waiting for a full buffer
+    try:
+        for chunk in iter(lambda: pipe.read1(65536), b""):
+            if not closed.is_set():
+                consumer(chunk)
+    finally:
+        pipe.close()
+
+
+def killTree(p):
+    """
+    Kills a process launched by runProc and all the processes it started.
     """
-    return name[4:-4]
+    import os
+    import signal
+    import subprocess
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(p.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            # the process leads its own group (start_new_session)
+            os.killpg(p.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    if p.poll() is None:
+        p.kill()
 
 
-def runProc(*args, **kwargs):
+def runProc(args, stdout=None, timeout=None, **kwargs):
     """
-    Launches a subprocess that kills itself when its parent dies.
+    Launches a subprocess and reads its outputs while it runs: a child filling a pipe is never blocked.
+    The subprocess and its children are killed when the timeout expires or if runProc is interrupted.
 
     :param args: The arguments to launch the subprocess.
     :type args: list[str]
+    :param stdout: Where the standard output goes: None to return it, a callable receiving each chunk of bytes as
+    soon as it is read or a binary file object.
+    :param timeout: The time allowed to the subprocess (seconds), None to wait until it exits.
 
-    :return: The STDOUT and STDERR output of the subprocess launched or None if the program does not exist.
-    :rtype: (bytes, bytes)
+    :return: The STDOUT (None if it was given to the stdout parameter or the program does not exist) and STDERR
+    output of the subprocess, its return code (None if it did not exit by itself) and whether it timed out.
+    :rtype: ProcResult
 
     """
+    import os
     import subprocess
-    p = None
-    output = None
-    output_stderr = None
+    import threading
+    from .records import ProcResult
+    chunks = []
+    errChunks = []
+    consumer = chunks.append if stdout is None else getattr(stdout, "write", stdout)
+    if os.name == "nt":
+        kwargs.setdefault("creationflags", subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        kwargs.setdefault("start_new_session", True)
     try:
-        p = subprocess.Popen(stdout=subprocess.PIPE, stderr=subprocess.PIPE, *args, **kwargs)
-        p.wait()
-        output = p.stdout.read()
-        output_stderr = p.stderr.read()
-        p.stdout.close()
+        p = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             **kwargs)
+    except OSError as e:
+        return ProcResult(None, str(e).encode(), None, False)
+
+    # set once the outputs are abandoned, a detached grandchild can keep the pipes open after the subprocess exits
+    closed = threading.Event()
+    readers = [threading.Thread(target=_pump, args=(p.stdout, consumer, closed), daemon=True),
+               threading.Thread(target=_pump, args=(p.stderr, errChunks.append, closed), daemon=True)]
+    for reader in readers:
+        reader.start()
+    timedOut = False
+    try:
+        p.wait(timeout)
+    except subprocess.TimeoutExpired:
+        timedOut = True
     finally:
-        if p is not None and p.poll() is None:
-            p.terminate()  # send sigterm, or ...
-            p.kill()  # send sigkill
-        return output, output_stderr
+        if p.poll() is None:
+            killTree(p)
+            p.wait()
+        for reader in readers:
+            reader.join(PIPE_GRACE_PERIOD)
+        closed.set()
+
+    err = b"".join(errChunks)
+    if timedOut:
+        err += f"{args[0]} timed out after {timeout} seconds".encode()
+    return ProcResult(b"".join(chunks) if stdout is None else None, err, None if timedOut else p.returncode,
+                      timedOut)
 
 
 def handleVersion(lower_func, higher_func, trigger, min_sdk, max_sdk):
@@ -1,12 +1,64 @@
 #!/usr/bin/env python3
 import unittest
-from src.analyzer import Analyzer
+from src.analyzer import Analyzer, CHECKS, enabledChecks, requiredFacts
 from src.apkParser import APKParser
+from src.parser import Parser
+from src.networkSecParser import NetworkSecParser
+from io import StringIO
+from src.axmlDecoder import decodeAXML
+from src.apkArchive import APKArchive
+from src.resourceTable import ResourceTable
+from src.config import DAL_NEGATIVE_CACHE_TTL
+from src.uriSet import UriSet
+from src.deepLinkMatcher import DeepLinkMatcher, compilePathPattern
+from src.records import Component, IntentFilter, Data, Intent, AssetLinks, ProcResult, SignatureScheme
+from zipfile import ZipFile, BadZipFile, ZIP_STORED, ZIP_DEFLATED
+import tempfile
+import os
 from collections import namedtuple
 import logging
+import struct
+import pickle
+import base64
+import hashlib
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from src.assetLinks import AssetLinksChecker, AssetLinksCache, _isUnknownHost, NameResolutionError
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+import requests
+import socket
+from src.apkSignature import readSignatures, _contentDigest
+from asn1crypto import cms
+from src.batch import collectInputs, runBatch, analyzeFile
+from src.findings import FindingsCollector, NDJSONRenderer
+from src.sarif import SarifRenderer, SarifWriter, RULES
+from src.utils import runProc
+import sys
+from unittest import mock
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from src.external import startBackup, performBackup
+from src.utils import ANSI_ESCAPE
+from termcolor import colored
+import argparse
+import json
 logging.disable(logging.CRITICAL)
 
 
+def buildStringPool(strings):
+    # UTF-8 string pool, strings are assumed to be short ASCII
+    data = b"".join(bytes([len(s), len(s)]) + s.encode() + b"\x00" for s in strings)
+    data += b"\x00" * (-len(data) % 4)
+    offsets, offset = [], 0
+    for s in strings:
+        offsets.append(offset)
+        offset += len(s) + 3
+    header = 0x1C + 4 * len(strings)
+    pool = struct.pack("<HHIIIIII", 0x0001, 0x1C, header + len(data), len(strings), 0, 1 << 8, header, 0)
+    return pool + struct.pack(f"<{len(strings)}I", *offsets) + data
+
+
 class FakeParser(APKParser):
     # a fake parser class that allows init with no args
     def __init__(self):
@@ -21,6 +73,10 @@ class TestAnalyzer(unittest.TestCase):
     args = namedtuple("a", "log_level max_sdk_version min_sdk_version")
     analyzer = Analyzer(parser, args)
 
+    def setUp(self):
+        # the parser is shared by all the tests which replace its methods, drop the cached results
+        self.parser.invalidate()
+
     def test_isADBBackupAllowed(self):
         # the tuple elements represents :
         # allowBackup, debuggable, min_sdk_version, max_sdk_version, expectedResult
@@ -580,6 +636,991 @@ class TestAnalyzer(unittest.TestCase):
             res = self.analyzer.analyzeNSCPinning(self.parser)
             self.assertEqual(expected, res, f"{parsed=} should produce {expected} but produced {res}")
 
+        # the finding has a plain message, the terminal shows it with the expiration date in red
+        rendered = []
+        renderer = namedtuple("Renderer", "render")(lambda finding, display=None: rendered.append((finding, display)))
+        findings, self.analyzer.findings = self.analyzer.findings, FindingsCollector([renderer])
+        try:
+            parsed = [domainConf("a", "2001-01-01", ["ss"])]
+            self.analyzer.analyzeNSCPinning(self.parser)
+        finally:
+            self.analyzer.findings = findings
+        finding, display = rendered[0]
+        self.assertEqual("Pinning is configured for domain a (expires 2001-01-01) but can be bypassed by "
+                         "certificates signed by one of the CAs from this source: ss", finding.message)
+        self.assertIn(colored(" (expires 2001-01-01)", "red"), display)
+        self.assertTrue(display.endswith(colored(finding.message[finding.message.index(" but"):], "yellow")))
+
+
+class TestFindings(unittest.TestCase):
+
+    def test_sdkRange(self):
+        parser = FakeParser()
+        parser.allowBackup = lambda: True
+        parser.fullBackupOnly = lambda: None
+        parser.backupAgent = lambda: None
+        args = argparse.Namespace(log_level=0, min_sdk_version=21, max_sdk_version=33)
+        analyzer = Analyzer(parser, args)
+        analyzer.findings.renderers = []
+        analyzer.isAutoBackupAllowed()
+        # the findings only cover the versions concerned, nested version switches included
+        self.assertEqual([("auto-backup", 23, 33), ("auto-backup-unencrypted", 23, 27)],
+                         [(e.check, e.minSdk, e.maxSdk) for e in analyzer.findings.findings])
+        self.assertIsNone(analyzer.sdkRange)
+
+    def test_NDJSONRenderer(self):
+        output = StringIO()
+        collector = FindingsCollector([NDJSONRenderer(output, "app.apk")])
+        collector.add("debuggable", "warning", "Debuggable flag found", 21, 33)
+        collector.add("deep-link", "warning", "Found a deeplink", 21, 33, "com.example.Link", {"uris": ["a://b"]})
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(2, len(lines))
+        self.assertEqual({"file": "app.apk", "check": "deep-link", "severity": "warning",
+                          "message": "Found a deeplink", "minSdk": 21, "maxSdk": 33, "component": "com.example.Link",
+                          "evidence": {"uris": ["a://b"]}}, lines[1])
+        self.assertEqual({}, lines[0]["evidence"])
+
+
+class TestChecks(unittest.TestCase):
+
+    def test_enabledChecks(self):
+        self.assertEqual(list(CHECKS), enabledChecks(argparse.Namespace()))
+        # in the order they are run
+        args = argparse.Namespace(checks=["firebase", "info", "app-links"], skip_checks=["firebase"])
+        self.assertEqual(["info", "app-links"], enabledChecks(args))
+        self.assertEqual({"dal"}, requiredFacts(enabledChecks(args)))
+        args = argparse.Namespace(checks=None, skip_checks=["app-links", "backup"])
+        self.assertEqual(len(CHECKS) - 2, len(enabledChecks(args)))
+
+    def test_selectedChecks(self):
+        parser = Parser("examples/Signal_AndroidManifest.xml")
+        args = argparse.Namespace(log_level=0, min_sdk_version=28, max_sdk_version=32, path="Signal",
+                                  checks=["component-permissions", "deep-links"])
+        analyzer = Analyzer(parser, args)
+        analyzer.findings.renderers = []
+        # the inputs of the other checks are not loaded
+        with mock.patch.object(Parser, "getNetworkSecParser", side_effect=AssertionError), \
+                mock.patch.object(Parser, "searchInStrings", side_effect=AssertionError), \
+                mock.patch("src.assetLinks.AssetLinksChecker.checkAll", side_effect=AssertionError), \
+                contextlib.redirect_stdout(StringIO()):
+            findings = analyzer.runAllTests()
+        self.assertEqual({"deep-link", "exported-components-without-permission"}, {e.check for e in findings})
+
+
+class TestExternalOperations(unittest.TestCase):
+
+    def test_overlap(self):
+        # (start, end) of each external operation
+        intervals = {}
+
+        def slowProc(*args, **kwargs):
+            start = time.monotonic()
+            time.sleep(0.2)
+            intervals["apksigner"] = (start, time.monotonic())
+            return ProcResult(b"Verified using v2 scheme (APK Signature Scheme v2): true\n", b"", 0, False)
+
+        def slowAssetLinks(_, hosts):
+            start = time.monotonic()
+            time.sleep(0.2)
+            intervals["dal"] = (start, time.monotonic())
+            return {host: AssetLinks(host, False, {}) for host in hosts}
+
+        args = argparse.Namespace(log_level=0, min_sdk_version=28, max_sdk_version=32, path="app.apk", apksigner=True,
+                                  checks=["signature", "permissions", "deep-links", "app-links"])
+        # Signal declares app links
+        analyzer = Analyzer(Parser("examples/Signal_AndroidManifest.xml"), args)
+        analyzer.findings.renderers = []
+        # the signature is only analyzed for APKs
+        analyzer.isAPK = True
+        output = StringIO()
+        with mock.patch("src.external.runProc", side_effect=slowProc), \
+                mock.patch.object(Analyzer, "_checkAssetLinks", slowAssetLinks), \
+                contextlib.redirect_stdout(output):
+            analyzer.runAllTests()
+        # apksigner and the Digital Asset Links run at the same time
+        self.assertLess(max(e[0] for e in intervals.values()), min(e[1] for e in intervals.values()))
+        # the sections are displayed in order
+        text = output.getvalue()
+        self.assertLess(text.index("Output of apksigner"), text.index("Analyzing required permissions"))
+        self.assertLess(text.index("Checking for DeepLinks"), text.index("Checking for AppLinks"))
+
+    def test_backup(self):
+        events = []
+        backedUp = ProcResult(None, b"", 0, False)
+
+        def proc(args, **kwargs):
+            events.append(args[2])
+            return ProcResult(b"Events injected: 1", b"", 0, False)
+
+        with mock.patch("src.external.runProc", side_effect=proc), \
+                mock.patch("src.external._backup", side_effect=lambda cmd: events.append("backup") or (backedUp, 1)), \
+                mock.patch("src.external.logger.info", side_effect=lambda msg: events.append(msg)), \
+                mock.patch("sys.stderr", new_callable=StringIO) as stderr, \
+                ThreadPoolExecutor(1) as executor:
+            opened, backup = startBackup("com.example", executor)
+            self.assertEqual((backedUp, 1), backup.result())
+            self.assertEqual(["monkey", "backup"], events)
+            # the user is asked to validate the backup when it starts, outside of the logged sections
+            self.assertEqual("Backing APK com.example. Validate the backup on the device...\n", stderr.getvalue())
+            # the results are displayed in order, as executed commands
+            performBackup("com.example", (opened, backup))
+        self.assertEqual(["executed command : adb shell monkey -p com.example 1",
+                          "executed command : adb shell bu backup com.example"],
+                         [ANSI_ESCAPE.sub("", e) for e in events[2:4]])
+
+
+class TestRunProc(unittest.TestCase):
+
+    def test_largeOutput(self):
+        # more than the pipe buffers, read while the process runs
+        code = "import sys; sys.stdout.write('a' * 1000000); sys.stderr.write('b' * 1000000)"
+        result = runProc([sys.executable, "-c", code], timeout=30)
+        self.assertEqual((1000000, 1000000, 0, False),
+                         (len(result.stdout), len(result.stderr), result.returncode, result.timedOut))
+        # streamed to a callback
+        chunks = []
+        result = runProc([sys.executable, "-c", code], stdout=chunks.append, timeout=30)
+        self.assertIsNone(result.stdout)
+        self.assertEqual(b"a" * 1000000, b"".join(chunks))
+
+    def test_timeout(self):
+        # the grandchild keeps the pipes open, it is killed with its parent
+        code = "import subprocess, sys; subprocess.run([sys.executable, '-c', 'import time; time.sleep(30)'])"
+        start = time.monotonic()
+        result = runProc([sys.executable, "-c", code], timeout=0.5)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertTrue(result.timedOut)
+        self.assertIsNone(result.returncode)
+        self.assertIn(b"timed out", result.stderr)
+
+    def test_missingProgram(self):
+        result = runProc(["amande-missing-program"])
+        self.assertIsNone(result.stdout)
+        self.assertIsNone(result.returncode)
+
+
+class TestSarif(unittest.TestCase):
+
+    def test_sarifLog(self):
+        output = StringIO()
+        writer = SarifWriter(output)
+        path = "examples/AmazeFileManager_AndroidManifest.xml"
+        collector = FindingsCollector([SarifRenderer(writer, path)])
+        collector.add("debuggable", "warning", "Debuggable flag found", 21, 33)
+        collector.add("exported-components-without-permission", "warning", "2 components", 21, 33, None,
+                      {"components": [{"name": ".ui.activities.PreferencesActivity", "type": "activity"},
+                                      {"name": ".unknown", "type": "service"}]})
+        # the results of another file, as written by a worker of a batch
+        other = StringIO()
+        SarifRenderer(other, "/tmp/app.apk").render(collector.findings[0])
+        writer.write(other.getvalue())
+        writer.close()
+
+        log = json.loads(output.getvalue())
+        self.assertEqual("2.1.0", log["version"])
+        run = log["runs"][0]
+        self.assertEqual(list(RULES), [e["id"] for e in run["tool"]["driver"]["rules"]])
+        results = run["results"]
+        self.assertEqual(["debuggable", "exported-components-without-permission", "debuggable"],
+                         [e["ruleId"] for e in results])
+        self.assertEqual("debuggable", run["tool"]["driver"]["rules"][results[0]["ruleIndex"]]["id"])
+        # the <application> element
+        self.assertEqual(47, results[0]["locations"][0]["physicalLocation"]["region"]["startLine"])
+        locations = results[1]["locations"]
+        self.assertEqual(129, locations[0]["physicalLocation"]["region"]["startLine"])
+        self.assertEqual(".ui.activities.PreferencesActivity",
+                         locations[0]["logicalLocations"][0]["fullyQualifiedName"])
+        self.assertNotIn("region", locations[1]["physicalLocation"])
+        self.assertEqual({"uri": "file:///tmp/app.apk"},
+                         results[2]["locations"][0]["physicalLocation"]["artifactLocation"])
+        self.assertEqual({"minSdkVersion": 21, "maxSdkVersion": 33, "severity": "warning", "evidence": {}},
+                         results[0]["properties"])
+
+    def test_emptySarifLog(self):
+        output = StringIO()
+        SarifWriter(output).close()
+        self.assertEqual([], json.loads(output.getvalue())["runs"][0]["results"])
+
+    def test_partialWrites(self):
+        output = StringIO()
+        writer = SarifWriter(output)
+        other = StringIO()
+        renderer = SarifRenderer(other, "/tmp/app.apk")
+        collector = FindingsCollector([renderer])
+        collector.add("debuggable", "warning", "Debuggable flag found", 21, 33)
+        collector.add("adb-backup", "warning", "ADB backups are allowed", 21, 33)
+        first, second = other.getvalue().splitlines()
+        writer.write(first[:10])
+        writer.write(first[10:] + "\n" + second[:10])
+        # the last result is not terminated by a newline
+        writer.write(second[10:])
+        writer.close()
+        self.assertEqual(["debuggable", "adb-backup"],
+                         [e["ruleId"] for e in json.loads(output.getvalue())["runs"][0]["results"]])
+
+
+class TestManifestIndex(unittest.TestCase):
+    # The index replaces XPath queries, so its answers are checked against a real manifest.
+    parser = Parser("examples/AmazeFileManager_AndroidManifest.xml")
+
+    def test_exportedComponents(self):
+        # the tuple elements represents :
+        # componentType, expectedResult
+        testCases = [
+            ("activity", ['.ui.activities.DatabaseViewerActivity', '.ui.activities.MainActivity',
+                          '.ui.activities.PreferencesActivity', '.ui.activities.UtilitiesAliasActivity',
+                          '.ui.activities.texteditor.TextEditorActivity']),
+            ("service", ['.asynchronous.services.ftp.FtpService', '.asynchronous.services.ftp.FtpTileService']),
+            ("provider", []),
+        ]
+        for testCase in testCases:
+            componentType = testCase[0]
+            expected = testCase[1]
+            res = sorted(self.parser.exportedComponents(componentType))
+            self.assertEqual(expected, res, f"{componentType=} should produce {expected} but produced {res}")
+
+    def test_getIntentFilterExportedComponents(self):
+        res = self.parser.getIntentFilterExportedComponents()
+        self.assertIn(("amazeutilsalias", "activity-alias"), res)
+        self.assertNotIn((".ui.activities.UtilitiesAliasActivity", "activity"), res)
+        self.assertEqual({"androidx.core.content.FileProvider"}, self.parser.getUnexportedProviders())
+        self.assertEqual(7, self.parser.componentStats("service"))
+
+    def test_memoized(self):
+        parser = Parser("examples/AmazeFileManager_AndroidManifest.xml")
+        self.assertIs(parser.getUniversalLinks(), parser.getUniversalLinks())
+        self.assertIs(parser.exportedComponents("activity"), parser.exportedComponents("activity"))
+        self.assertIsNot(parser.exportedComponents("activity"), parser.exportedComponents("service"))
+        # keyword arguments are part of the key
+        self.assertIs(parser.getDeepLinkMatcher(browsableOnly=False), parser.getDeepLinkMatcher(browsableOnly=False))
+        self.assertIsNot(parser.getDeepLinkMatcher(browsableOnly=False), parser.getDeepLinkMatcher())
+        # derived facts are recomputed after an invalidation
+        links = parser.getUniversalLinks()
+        parser.getIntentFilterExportedComponents = lambda: set()
+        self.assertIs(links, parser.getUniversalLinks())
+        parser.invalidate()
+        self.assertEqual([], parser.getUniversalLinks())
+
+    def test_records(self):
+        # records are shared between calls and can be sent to other processes
+        self.assertIs(type(self.parser.getApkInfo()), type(self.parser.getApkInfo()))
+        for res in [self.parser.getApkInfo(), self.parser.usesFeatures(), self.parser.getUniversalLinks(),
+                    self.parser.getExportedComponentPermission("activity"), self.parser.index.components]:
+            self.assertEqual(res, pickle.loads(pickle.dumps(res)))
+
+    def test_streaming(self):
+        # the streaming mode must give the same answers without keeping the tree
+        streamed = Parser("examples/AmazeFileManager_AndroidManifest.xml", streaming=True)
+        self.assertIsNone(streamed.root)
+        for method in ["getApkInfo", "requiredPermissions", "customPermissions", "usesFeatures", "usesLibrary",
+                       "getSdkVersion", "allowBackup", "debuggable", "fullBackupContent", "getUniversalLinks"]:
+            expected = getattr(self.parser, method)()
+            res = getattr(streamed, method)()
+            self.assertEqual(expected, res, f"{method=} should produce {expected} but produced {res}")
+        for componentType in ["activity", "service", "receiver", "provider"]:
+            self.assertEqual(sorted(self.parser.exportedComponents(componentType)),
+                             sorted(streamed.exportedComponents(componentType)))
+
+
+class TestUriSet(unittest.TestCase):
+
+    def test_uriSet(self):
+        uris = UriSet(["https://", "http://"], ["a.com", "b.com"], [""], ["/x", "/y", ""])
+        self.assertEqual(12, len(uris))
+        self.assertEqual(12, len(set(uris)))
+        self.assertIn("http://b.com/y", set(uris))
+        self.assertEqual("{http://,https://}{a.com,b.com}{,/x,/y}", uris.compressed())
+        self.assertEqual(list(uris), uris.lines(12))
+        self.assertEqual([uris.compressed(), "(12 URIs)"], uris.lines(11))
+        self.assertEqual(uris, pickle.loads(pickle.dumps(uris)))
+        self.assertEqual([], list(UriSet()))
+        self.assertEqual(["content://"], list(UriSet(["content://"])))
+
+    def test_getIntentFilters(self):
+        parser = Parser("examples/AmazeFileManager_AndroidManifest.xml")
+        for name, _ in parser.getIntentFilterExportedComponents():
+            for _, _, uris, _ in parser.getIntentFilters(name):
+                self.assertIsInstance(uris, UriSet)
+        for link in parser.getUniversalLinks():
+            self.assertEqual(len(link.uris), len(list(link.uris)))
+
+
+class TestDeepLinkMatcher(unittest.TestCase):
+
+    @staticmethod
+    def data(scheme=None, host=None, port=None, path=None, pathPrefix=None, pathPattern=None, mimeType=None):
+        return Data(scheme, host, port, path, pathPrefix, pathPattern, mimeType)
+
+    def component(self, name, datas, actions=("android.intent.action.VIEW",),
+                  categories=("android.intent.category.BROWSABLE",)):
+        return Component(name, "activity", True, None, None, None, None,
+                         [IntentFilter(list(actions), list(categories), datas, None)])
+
+    def test_compilePathPattern(self):
+        # the tuple elements represents :
+        # pathPattern, path, expectedResult
+        testCases = [
+            ("/foo/.*", "/foo/bar", True),
+            ("/foo/.*", "/foo", False),
+            ("/a.b", "/axb", True),
+            ("/a\\.b", "/axb", False),
+            ("/a\\.b", "/a.b", True),
+            ("/ab*c", "/abbbc", True),
+            ("/ab*c", "/ac", True),
+            # the platform does not backtrack
+            ("/.*a", "/bab", False),
+            ("/a*a", "/aa", False),
+            ("/ab*", "/a", False),
+            ("/a.*/b", "/ab/c/b", False),
+        ]
+        for pathPattern, path, expected in testCases:
+            res = compilePathPattern(pathPattern).fullmatch(path) is not None
+            self.assertEqual(expected, res, f"{pathPattern=} {path=} should produce {expected} but produced {res}")
+
+    def test_match(self):
+        d = self.data
+        matcher = DeepLinkMatcher([
+            self.component("Exact", [d("https"), d(host="example.com"), d(path="/a"), d(pathPrefix="/b")]),
+            self.component("Wildcard", [d("https"), d("http"), d(host="*.example.com")]),
+            self.component("Port", [d("https", "example.com", "8443", pathPattern="/p.*")]),
+            self.component("Scheme", [d("myapp")]),
+            self.component("Typed", [d("https", "example.com"), d(mimeType="text/plain")]),
+            self.component("NotBrowsable", [d("https", "example.com")], categories=()),
+        ])
+        testCases = [
+            ("https://example.com/a", {"Exact"}),
+            ("https://Example.COM/b/c", {"Exact"}),
+            ("https://example.com/c", set()),
+            ("https://www.example.com/c", {"Wildcard"}),
+            ("http://a.b.example.com", {"Wildcard"}),
+            ("ftp://www.example.com/", set()),
+            ("https://example.com:8443/path", {"Port"}),
+            ("https://example.com/path", set()),
+            ("myapp://anything/at/all", {"Scheme"}),
+            ("https://example.com:port/a", set()),
+        ]
+        for url, expected in testCases:
+            res = {name for name, _ in matcher.match(url)}
+            self.assertEqual(expected, res, f"{url=} should produce {expected} but produced {res}")
+        urls = [url for url, _ in testCases]
+        self.assertEqual(urls, [url for url, _ in matcher.matchAll(iter(urls))])
+
+    def test_getDeepLinkMatcher(self):
+        parser = Parser("examples/AmazeFileManager_AndroidManifest.xml")
+        self.assertIs(parser.getDeepLinkMatcher(), parser.getDeepLinkMatcher())
+        for link in parser.getUniversalLinks():
+            for uri in link.uris:
+                self.assertIn((link.name, link.tag), parser.getDeepLinkMatcher().match(uri))
+
+
+class TestIntentResolver(unittest.TestCase):
+    parser = Parser("examples/AmazeFileManager_AndroidManifest.xml")
+
+    def test_resolve(self):
+        resolver = self.parser.getIntentResolver()
+        self.assertIs(resolver, self.parser.getIntentResolver())
+        # the tuple elements represents :
+        # intent, target, expectedResult
+        testCases = [
+            (Intent("android.intent.action.MAIN", ["android.intent.category.LAUNCHER"]), None,
+             [(".ui.activities.MainActivity", "activity")]),
+            # startActivity adds the DEFAULT category
+            (Intent("android.intent.action.MAIN", ["android.intent.category.LAUNCHER"]), "activity", []),
+            (Intent("android.intent.action.VIEW", ["android.intent.category.BROWSABLE"],
+                    "http://teamamaze.xyz/open_file/x"), "activity", [(".ui.activities.MainActivity", "activity")]),
+            (Intent("android.intent.action.VIEW", ["android.intent.category.BROWSABLE"],
+                    "http://teamamaze.xyz/other"), "activity", []),
+            (Intent("android.intent.action.VIEW", [], "file:///sdcard/a.zip", "application/zip"), "activity",
+             [(".ui.activities.MainActivity", "activity")]),
+            (Intent("android.intent.action.VIEW", [], "file:///sdcard/a.txt", "text/plain"), "service", []),
+            (Intent("unknown.ACTION"), None, []),
+        ]
+        for intent, target, expected in testCases:
+            res = resolver.resolve(intent, target)
+            self.assertEqual(expected, res, f"{intent=} {target=} should produce {expected} but produced {res}")
+        intents = [intent for intent, _, _ in testCases]
+        self.assertEqual(len(intents), len(list(resolver.resolveAll(intents))))
+
+
+class AssetLinksHandler(BaseHTTPRequestHandler):
+    # a stand-in for the hosts serving assetlinks.json, the behavior depends on the host
+    # 127.0.0.1: available, 127.0.0.2: unavailable once then available, 127.0.0.3: too slow, 127.0.0.4: missing
+    attempts = {}
+    statements = [{"relation": ["delegate_permission/common.handle_all_urls"],
+                   "target": {"namespace": "android_app", "package_name": "com.example",
+                              "sha256_cert_fingerprints": ["AB:CD"]}}]
+
+    def do_GET(self):
+        host = self.headers["Host"].split(":")[0]
+        self.attempts[host] = self.attempts.get(host, 0) + 1
+        status = 200
+        if host == "127.0.0.2" and self.attempts[host] == 1:
+            status = 503
+        elif host == "127.0.0.3":
+            time.sleep(1)
+        elif host == "127.0.0.4":
+            status = 404
+        body = json.dumps(self.statements).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ConnectionError:
+            # the client gave up on a slow host, the error would be printed over the output of the next tests
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAssetLinksChecker(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("", 0), AssetLinksHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def checker(self, **kwargs):
+        url = f"http://{{host}}:{self.server.server_address[1]}/.well-known/assetlinks.json"
+        return AssetLinksChecker(url=url, backoff=0.01, **kwargs)
+
+    def test_checkAll(self):
+        AssetLinksHandler.attempts.clear()
+        checker = self.checker(timeout=0.3, deadline=5)
+        hosts = ["127.0.0.4", "127.0.0.3", "127.0.0.2", "127.0.0.1"]
+        res = checker.checkAll(hosts)
+        checker.close()
+        # the results keep the order of the hosts
+        self.assertEqual(hosts, list(res))
+        self.assertEqual({"127.0.0.1": True, "127.0.0.2": True, "127.0.0.3": False, "127.0.0.4": False},
+                         {host: e.available for host, e in res.items()})
+        self.assertEqual({"com.example": ["AB:CD"]}, res["127.0.0.1"].packages)
+        # transient errors are retried, missing files are not
+        self.assertEqual(2, AssetLinksHandler.attempts["127.0.0.2"])
+        self.assertEqual(1, AssetLinksHandler.attempts["127.0.0.4"])
+
+    def test_deadline(self):
+        checker = self.checker(timeout=5, deadline=0.3, retries=0)
+        start = time.monotonic()
+        res = checker.checkAll(["127.0.0.3", "127.0.0.1"])
+        self.assertEqual({"127.0.0.3": False, "127.0.0.1": True}, {host: e.available for host, e in res.items()})
+        self.assertLess(time.monotonic() - start, 0.9)
+        checker.close()
+
+    def test_cache(self):
+        AssetLinksHandler.attempts.clear()
+        hosts = ["127.0.0.1", "127.0.0.4"]
+        with tempfile.TemporaryDirectory() as tmp:
+            checker = self.checker(cache=AssetLinksCache(tmp))
+            expected = checker.checkAll(hosts)
+            checker.close()
+            # another analysis reads the files cached by the first one
+            checker = self.checker(cache=AssetLinksCache(tmp))
+            self.assertEqual(expected, checker.checkAll(hosts))
+            checker.close()
+            self.assertEqual({"127.0.0.1": 1, "127.0.0.4": 1}, AssetLinksHandler.attempts)
+            # missing files expire sooner
+            checker = self.checker(cache=AssetLinksCache(tmp, negativeTTL=0))
+            self.assertEqual(expected, checker.checkAll(hosts))
+            checker.close()
+            self.assertEqual({"127.0.0.1": 1, "127.0.0.4": 2}, AssetLinksHandler.attempts)
+
+    def test_unknownHost(self):
+        def connectionError(cause):
+            # what urllib3 < 2 raises and requests wraps
+            try:
+                try:
+                    raise cause
+                except OSError:
+                    raise NewConnectionError(None, "Failed to establish a new connection")
+            except NewConnectionError as e:
+                return requests.exceptions.ConnectionError(MaxRetryError(None, "/", e))
+
+        if NameResolutionError is not None:
+            reason = NameResolutionError("example.invalid", None, socket.gaierror(-2, "Name or service not known"))
+            self.assertTrue(_isUnknownHost(requests.exceptions.ConnectionError(MaxRetryError(None, "/", reason))))
+        with mock.patch("src.assetLinks.NameResolutionError", None):
+            self.assertTrue(_isUnknownHost(connectionError(socket.gaierror(-2, "Name or service not known"))))
+            self.assertFalse(_isUnknownHost(connectionError(ConnectionRefusedError(111, "Connection refused"))))
+
+
+class TestAPKSignature(unittest.TestCase):
+    # PKCS #7 signature block of META-INF/CERT.SF, signed by a self-signed EC P-256 certificate (CN=AMAnDe test)
+    signatureBlock = base64.b64decode(
+        "MIICXQYJKoZIhvcNAQcCoIICTjCCAkoCAQExDzANBglghkgBZQMEAgEFADALBgkqhkiG9w0BBwGgggGHMIIBgzCCASmgAwIBAgIU"
+        "dqfwrs7mG2pY7sD8vsvdtCYRu9IwCgYIKoZIzj0EAwIwFjEUMBIGA1UEAwwLQU1BbkRlIHRlc3QwIBcNMjYxMDE3MTkwODMyWhgP"
+        "MjEyNjA5MjMxOTA4MzJaMBYxFDASBgNVBAMMC0FNQW5EZSB0ZXN0MFkwEwYHKoZIzj0CAQYIKoZIzj0DAQcDQgAEsV2qoYJ/kzap"
+        "m+1uc7+QHpovtFINeuEck+VIbmQk1BbqZp2hfA3m3nEk9UFP4GPtEQF/mqgfRW2XAgvcloaZEKNTMFEwHQYDVR0OBBYEFIjSHoq0"
+        "C0CXTH2NCKl1FrkHY0q1MB8GA1UdIwQYMBaAFIjSHoq0C0CXTH2NCKl1FrkHY0q1MA8GA1UdEwEB/wQFMAMBAf8wCgYIKoZIzj0E"
+        "AwIDSAAwRQIgeBZP/YrKKe2gnF69K1ZZFLOG+QMCUGnyQVGzZLGHh+UCIQDSOGzxOKmRVliNUuTpaXnKCNOhUtwVnZpwo79YbRar"
+        "3TGBmzCBmAIBATAuMBYxFDASBgNVBAMMC0FNQW5EZSB0ZXN0AhR2p/CuzuYbaljuwPy+y920JhG70jANBglghkgBZQMEAgEFADAK"
+        "BggqhkjOPQQDAgRIMEYCIQC5s7Evnbm4lADJijV3/FUwkLJFuFNGIS0ONz4Nb4+eMgIhAJJUqmdaan/zh0D7EY3RjiN1wi4Y7U+x"
+        "NmY6k+Qo86IB")
+
+    @staticmethod
+    def lengthPrefixed(*values):
+        data = b"".join(values)
+        return struct.pack("<I", len(data)) + data
+
+    def buildAPK(self, path, v2=True, v3=False, signatureBlock=None):
+        """
+        Builds an APK signed with the v1 scheme and optionally with a v2 (and v3) signing block.
+        The signatures themselves are not valid, only the content digest is.
+        """
+        with ZipFile(path, "w") as z:
+            z.writestr("AndroidManifest.xml", b"manifest")
+            z.writestr("META-INF/CERT.SF", b"Signature-Version: 1.0\r\nX-Android-APK-Signed: 2\r\n\r\n")
+            z.writestr("META-INF/CERT.EC", self.signatureBlock if signatureBlock is None else signatureBlock)
+        if not v2:
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        eocd = data.rfind(b"PK\x05\x06")
+        cd, = struct.unpack_from("<I", data, eocd + 16)
+        # the block will be inserted at the offset of the central directory so the digested content is the same
+        chunks = [hashlib.sha256(b"\xa5" + struct.pack("<I", len(e)) + e).digest()
+                  for e in (data[:cd], data[cd:eocd], data[eocd:])]
+        digest = hashlib.sha256(b"\x5a" + struct.pack("<I", 3) + b"".join(chunks)).digest()
+        cert = cms.ContentInfo.load(self.signatureBlock)["content"]["certificates"][0].chosen
+        signedData = self.lengthPrefixed(
+            self.lengthPrefixed(self.lengthPrefixed(struct.pack("<I", 0x0201), self.lengthPrefixed(digest))),
+            self.lengthPrefixed(self.lengthPrefixed(cert.dump())),
+            self.lengthPrefixed())
+        signatures = self.lengthPrefixed(self.lengthPrefixed(struct.pack("<I", 0x0201), self.lengthPrefixed(b"x")))
+        signer = self.lengthPrefixed(signedData, signatures, self.lengthPrefixed(cert.public_key.dump()))
+        values = [struct.pack("<I", 0x7109871a) + self.lengthPrefixed(signer)]
+        if v3:
+            # the SDK range of the signer follows its signed data
+            signer = self.lengthPrefixed(signedData, struct.pack("<II", 24, 33), signatures,
+                                         self.lengthPrefixed(cert.public_key.dump()))
+            values.append(struct.pack("<I", 0xf05368c0) + self.lengthPrefixed(signer))
+        pairs = b"".join(struct.pack("<Q", len(value)) + value for value in values)
+        size = len(pairs) + 8 + 16
+        block = struct.pack("<Q", size) + pairs + struct.pack("<Q", size) + b"APK Sig Block 42"
+        eocdRecord = bytearray(data[eocd:])
+        struct.pack_into("<I", eocdRecord, 16, cd + len(block))
+        with open(path, "wb") as f:
+            f.write(data[:cd] + block + data[cd:eocd] + eocdRecord)
+
+    def test_readSignatures(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "signed.apk")
+            self.buildAPK(path)
+            apk = APKArchive(path)
+            schemes = readSignatures(apk)
+            self.assertEqual(["v1", "v2"], [e.version for e in schemes])
+            for scheme in schemes:
+                signer, = scheme.signers
+                self.assertEqual(("EC", 256), (signer.keyAlgorithm, signer.keySize))
+                self.assertEqual("Common Name: AMAnDe test", signer.certificates[0].subject)
+            self.assertIsNone(schemes[0].digestsVerified)
+            self.assertTrue(schemes[1].digestsVerified)
+            self.assertEqual(["ECDSA with SHA2-256"], list(schemes[1].signers[0].digests))
+            apk.close()
+
+            # a modified entry breaks the content digest
+            with open(path, "r+b") as f:
+                f.seek(40)
+                f.write(b"X")
+            apk = APKArchive(path)
+            schemes = readSignatures(apk)
+            self.assertFalse(schemes[1].digestsVerified)
+            apk.close()
+            parser = FakeParser()
+            parser.getSignatures = lambda: schemes
+            analyzer = Analyzer(parser, argparse.Namespace(log_level=0, min_sdk_version=24, max_sdk_version=33))
+            analyzer.findings.renderers = []
+            with contextlib.redirect_stdout(StringIO()):
+                analyzer.analyzeSignature()
+            finding, = analyzer.findings.findings
+            self.assertEqual(("apk-digest-mismatch", "critical", "v2"),
+                             (finding.check, finding.severity, finding.evidence["scheme"]))
+
+            self.buildAPK(path, v2=False)
+            apk = APKArchive(path)
+            self.assertEqual(["v1"], [e.version for e in readSignatures(apk)])
+            apk.close()
+
+            # the APK is hashed once for all the schemes
+            self.buildAPK(path, v3=True)
+            apk = APKArchive(path)
+            with mock.patch("src.apkSignature._contentDigest", side_effect=_contentDigest) as contentDigest:
+                schemes = readSignatures(apk)
+            self.assertEqual([("v1", None), ("v2", True), ("v3", True)],
+                             [(e.version, e.digestsVerified) for e in schemes])
+            self.assertEqual((24, 33), (schemes[2].signers[0].minSdkVersion, schemes[2].signers[0].maxSdkVersion))
+            contentDigest.assert_called_once()
+            apk.close()
+
+            # a malformed JAR signature is reported without signers
+            self.buildAPK(path, v2=False, signatureBlock=b"not a PKCS #7 block")
+            apk = APKArchive(path)
+            schemes = readSignatures(apk)
+            self.assertEqual([SignatureScheme("v1", [], False)], schemes)
+            apk.close()
+            analyzer.findings.findings.clear()
+            with contextlib.redirect_stdout(StringIO()):
+                analyzer.analyzeSignature()
+            self.assertEqual(["apk-signature-malformed", "apk-signed-with-v1-only"],
+                             [e.check for e in analyzer.findings.findings])
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_collectInputs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "sub"))
+            for name, size in [("small.xml", 1), ("sub/big.apk", 100), ("medium.apk", 10), ("notes.txt", 1000)]:
+                with open(os.path.join(tmp, name), "wb") as f:
+                    f.write(b"x" * size)
+            # the largest files first
+            expected = [os.path.join(tmp, e) for e in ["sub/big.apk", "medium.apk", "small.xml"]]
+            self.assertEqual(expected, collectInputs(tmp))
+            self.assertEqual(expected[:2], collectInputs(os.path.join(tmp, "**", "*.apk")))
+            with open(os.path.join(tmp, "list"), "w") as f:
+                f.write(f"{expected[2]}\n\n{expected[0]}\n{expected[2]}\n")
+            self.assertEqual([expected[0], expected[2]], collectInputs(f"@{os.path.join(tmp, 'list')}"))
+
+    def test_runBatch(self):
+        args = argparse.Namespace(log_level=2, min_sdk_version=21, max_sdk_version=33, streaming=False,
+                                  dal_cache=None, path=None)
+        with tempfile.NamedTemporaryFile("w", suffix=".xml") as invalid:
+            invalid.write("<manifest")
+            invalid.flush()
+            paths = ["examples/Signal_AndroidManifest.xml", invalid.name,
+                     "examples/AmazeFileManager_AndroidManifest.xml"]
+            results = runBatch(paths, args, 2)
+        self.assertEqual(paths, [e.path for e in results])
+        self.assertEqual([None, "Invalid file !", None], [e.error for e in results])
+        self.assertIn(f"Analysis of {paths[2]}", results[2].output)
+
+    def test_resultCache(self):
+        def analyze(args):
+            output = StringIO()
+            handler = logging.StreamHandler(output)
+            logging.getLogger("MainLogger").addHandler(handler)
+            with contextlib.redirect_stdout(output):
+                analyzeFile(path, args)
+            logging.getLogger("MainLogger").removeHandler(handler)
+            return output.getvalue()
+
+        path = "examples/Signal_AndroidManifest.xml"
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as dalCache:
+            args = argparse.Namespace(log_level=1, min_sdk_version=28, max_sdk_version=32, streaming=False,
+                                      dal_cache=dalCache, path=path, result_cache=tmp)
+            with mock.patch("src.assetLinks.AssetLinksChecker.checkAll",
+                            lambda _, hosts: {host: AssetLinks(host, False, {}) for host in hosts}):
+                output = analyze(args)
+            self.assertIn("Digital Asset Link JSON file not found", output)
+            # the file is not parsed again
+            with mock.patch("src.batch._analyze", side_effect=AssertionError):
+                self.assertEqual(output, analyze(args))
+            # but the Digital Asset Links are checked again once they have expired
+            later = time.time() + DAL_NEGATIVE_CACHE_TTL + 1
+            with mock.patch("src.batch._analyze") as analysis, mock.patch("src.resultCache.time.time",
+                                                                          return_value=later):
+                analyze(args)
+                analysis.assert_called_once()
+            # the results without App Links do not expire
+            args.skip_checks = ["app-links"]
+            analyze(args)
+            with mock.patch("src.batch._analyze", side_effect=AssertionError), \
+                    mock.patch("src.resultCache.time.time", return_value=later):
+                analyze(args)
+            args.skip_checks = None
+            # another SDK range is another key
+            args.min_sdk_version = 29
+            with mock.patch("src.batch._analyze") as analysis:
+                analyze(args)
+                analysis.assert_called_once()
+            # the Digital Asset Links are always fetched without their cache
+            args.min_sdk_version, args.dal_cache = 28, None
+            with mock.patch("src.batch._analyze") as analysis:
+                analyze(args)
+                analysis.assert_called_once()
+
+    def test_resultCachePaths(self):
+        # the same file under two paths, the second analysis is answered by the cache
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, "first.xml"), os.path.join(tmp, "second.xml")]
+            for path in paths:
+                with open("examples/Signal_AndroidManifest.xml", "rb") as src, open(path, "wb") as dst:
+                    dst.write(src.read())
+            for outputFormat in ["text", "ndjson"]:
+                outputs = []
+                for path in paths:
+                    args = argparse.Namespace(log_level=0, min_sdk_version=28, max_sdk_version=32, streaming=False,
+                                              dal_cache=None, path=path, result_cache=os.path.join(tmp, "cache"),
+                                              format=outputFormat, skip_checks=["app-links"])
+                    output = StringIO()
+                    analysis = mock.patch("src.batch._analyze", side_effect=AssertionError) if outputs \
+                        else contextlib.nullcontext()
+                    with analysis, contextlib.redirect_stdout(output):
+                        analyzeFile(path, args)
+                    outputs.append(output.getvalue())
+                self.assertIn(paths[1], outputs[1])
+                self.assertNotIn(paths[0], outputs[1])
+                self.assertEqual(outputs[0].replace(paths[0], paths[1]), outputs[1])
+            self.assertEqual(paths[1], json.loads(outputs[1].splitlines()[0])["file"])
+
+
+class TestAXMLDecoder(unittest.TestCase):
+
+    @staticmethod
+    def buildAXML(strings, chunks):
+        # string pool followed by the given chunks
+        body = buildStringPool(strings) + b"".join(chunks)
+        return struct.pack("<HHI", 0x0003, 8, 8 + len(body)) + body
+
+    def test_decodeAXML(self):
+        strings = ["android", "http://schemas.android.com/apk/res/android", "manifest", "package", "com.example",
+                   "label"]
+        node = struct.pack("<II", 1, 0xFFFFFFFF)
+        chunks = [
+            struct.pack("<HHI", 0x0100, 0x10, 0x18) + node + struct.pack("<II", 0, 1),
+            struct.pack("<HHI", 0x0102, 0x10, 0x24 + 2 * 20) + node
+            + struct.pack("<IIHHHHHH", 0xFFFFFFFF, 2, 0x14, 20, 2, 0, 0, 0)
+            + struct.pack("<IIIHBBI", 0xFFFFFFFF, 3, 4, 8, 0, 0x03, 4)
+            + struct.pack("<IIIHBBI", 1, 5, 0xFFFFFFFF, 8, 0, 0x01, 0x7F0B0001),
+            struct.pack("<HHI", 0x0103, 0x10, 0x18) + node + struct.pack("<II", 0xFFFFFFFF, 2),
+        ]
+        tree, namespaces = decodeAXML(self.buildAXML(strings, chunks), lambda rid: f"@string/{rid:x}")
+        root = tree.getroot()
+        self.assertEqual({"android": "http://schemas.android.com/apk/res/android"}, namespaces)
+        self.assertEqual("manifest", root.tag)
+        self.assertEqual("com.example", root.get("package"))
+        self.assertEqual("@string/7f0b0001", root.get("{http://schemas.android.com/apk/res/android}label"))
+        # without a resolver or a resolved value the ID is kept as AXMLPrinter formats it
+        for resolve in [None, lambda rid: None]:
+            root = decodeAXML(self.buildAXML(strings, chunks), resolve)[0].getroot()
+            self.assertEqual("@7F0B0001", root.get("{http://schemas.android.com/apk/res/android}label"))
+
+    def test_decodeInvalidAXML(self):
+        for data in [b"", b"<manifest/>", b"\x03\x00\x08\x00\xff\xff\x00\x00", self.buildAXML(["a"], [])]:
+            self.assertIsNone(decodeAXML(data), f"{data=} should not be decoded")
+
+
+class TestResourceTable(unittest.TestCase):
+
+    @staticmethod
+    def entry(key, valueType, data):
+        # ResTable_entry followed by its Res_value
+        return struct.pack("<HHI", 8, 0, key) + struct.pack("<HBBI", 8, 0, valueType, data)
+
+    @staticmethod
+    def buildType(typeId, entries, flags=0, locale=0, entryCount=None):
+        # ResTable_type chunk, entries maps the indexes to the entries
+        config = struct.pack("<III", 64, 0, locale) + b"\x00" * 52
+        headerSize = 20 + len(config)
+        offsets, body = {}, b""
+        for idx, entry in sorted(entries.items()):
+            offsets[idx] = len(body)
+            body += entry
+        if entryCount is None:
+            entryCount = max(entries) + 1
+        if flags & 0x01:
+            table = b"".join(struct.pack("<HH", idx, offset // 4) for idx, offset in offsets.items())
+            entryCount = len(offsets)
+        elif flags & 0x02:
+            table = struct.pack(f"<{entryCount}H", *(offsets[i] // 4 if i in offsets else 0xFFFF
+                                                     for i in range(entryCount)))
+        else:
+            table = struct.pack(f"<{entryCount}I", *(offsets.get(i, 0xFFFFFFFF) for i in range(entryCount)))
+        table += b"\x00" * (-len(table) % 4)
+        entriesStart = headerSize + len(table)
+        return struct.pack("<HHIBBHII", 0x0201, headerSize, entriesStart + len(body), typeId, flags, 0, entryCount,
+                           entriesStart) + config + table + body
+
+    @staticmethod
+    def buildPackage(packageId, name, types, keys, chunks):
+        typeStrings, keyStrings = buildStringPool(types), buildStringPool(keys)
+        # a ResTable_typeSpec chunk that must be skipped
+        spec = struct.pack("<HHIBBHI", 0x0202, 16, 16 + 4, 1, 0, 0, 1) + b"\x00" * 4
+        body = typeStrings + keyStrings + spec + b"".join(chunks)
+        return struct.pack("<HHII", 0x0200, 288, 288 + len(body), packageId) \
+            + name.encode("utf-16-le").ljust(256, b"\x00") \
+            + struct.pack("<IIIII", 288, len(types), 288 + len(typeStrings), len(keys), 0) + body
+
+    def buildTable(self):
+        strings = ["res/xml/network_security_config.xml", "App", "Appli", "Bonjour"]
+        fr = ord("f") | ord("r") << 8
+        example = self.buildPackage(0x7F, "com.example", ["attr", "string", "xml"],
+                                    ["app_name", "unused", "greeting", "network_security_config", "max"], [
+            # compact entry: the key in place of the size, the type in the flags and the data in place of the key
+            self.buildType(1, {0: struct.pack("<HHI", 4, 0x10 << 8 | 0x08, 42)}),
+            # a localized configuration before the default one
+            self.buildType(2, {0: self.entry(0, 0x03, 2)}, flags=0x01, locale=fr),
+            self.buildType(2, {0: self.entry(0, 0x03, 1), 2: self.entry(2, 0x03, 3)}, flags=0x02),
+            self.buildType(3, {0: self.entry(3, 0x03, 0)}),
+        ])
+        # a complex entry (a style or a plural) has no value
+        complexEntry = struct.pack("<HHIII", 16, 0x0001, 0, 0, 0)
+        android = self.buildPackage(0x01, "android", ["attr"], ["label"], [self.buildType(1, {0: complexEntry})])
+        body = buildStringPool(strings) + example + android
+        return struct.pack("<HHII", 0x0002, 12, 12 + len(body), 2) + body
+
+    def setUp(self):
+        self.table = ResourceTable(self.buildTable())
+
+    def test_packages(self):
+        self.assertEqual(["com.example", "android"], self.table.getPackagesNames())
+
+    def test_getId(self):
+        self.assertEqual(("string", "app_name", 0x7F020000), self.table.getId("com.example", 0x7F020000))
+        self.assertEqual(("string", "greeting", 0x7F020002), self.table.getId("com.example", 0x7F020002))
+        self.assertEqual(("attr", "label", 0x01010000), self.table.getId("android", 0x01010000))
+        for packageName, rid in [("com.example", 0x7F020001), ("com.example", 0x7F020005),
+                                 ("com.example", 0x7F090000), ("android", 0x7F020000), ("unknown", 0x7F020000)]:
+            self.assertEqual((None, None, None), self.table.getId(packageName, rid), f"{rid:x} is not defined")
+
+    def test_getValue(self):
+        # the first configuration defining the resource, or the default one
+        self.assertEqual("Appli", self.table.getValue(0x7F020000))
+        self.assertEqual("App", self.table.getValue(0x7F020000, defaultOnly=True))
+        self.assertEqual("res/xml/network_security_config.xml", self.table.getValue(0x7F030000))
+        self.assertEqual("42", self.table.getValue(0x7F010000))
+        self.assertIsNone(self.table.getValue(0x01010000))
+        for rid in [0x7F020001, 0x7F030001, 0x7F090000, 0x02010000]:
+            self.assertIsNone(self.table.getValue(rid), f"{rid:x} is not defined")
+
+    def test_getResourceId(self):
+        self.assertEqual({"app_name": 0x7F020000, "greeting": 0x7F020002},
+                         self.table.getResourceIds("com.example", "string"))
+        self.assertEqual(0x7F030000, self.table.getResourceId("com.example", "xml", "network_security_config"))
+        self.assertIsNone(self.table.getResourceId("com.example", "xml", "backup_rules"))
+        self.assertIsNone(self.table.getResourceId("com.example", "raw", "network_security_config"))
+        self.assertIsNone(self.table.getResourceId("unknown", "xml", "network_security_config"))
+
+    def test_getString(self):
+        self.assertEqual("App", self.table.getString("com.example", "app_name"))
+        self.assertEqual("Bonjour", self.table.getString("com.example", "greeting"))
+        self.assertIsNone(self.table.getString("com.example", "unused"))
+        self.assertEqual(["App", "Bonjour"], self.table.getStrings("com.example"))
+        self.assertEqual([], self.table.getStrings("android"))
+
+
+class TestAPKArchive(unittest.TestCase):
+
+    def test_read(self):
+        with tempfile.TemporaryDirectory() as tmpPath:
+            path = os.path.join(tmpPath, "test.apk")
+            with ZipFile(path, "w") as z:
+                z.writestr("resources.arsc", b"stored" * 10, compress_type=ZIP_STORED)
+                z.writestr("AndroidManifest.xml", b"deflated" * 10, compress_type=ZIP_DEFLATED)
+            apk = APKArchive(path)
+            self.assertEqual(["resources.arsc", "AndroidManifest.xml"], apk.namelist())
+            self.assertIn("resources.arsc", apk)
+            self.assertNotIn("classes.dex", apk)
+            # stored files are not copied
+            self.assertIsInstance(apk.read("resources.arsc"), memoryview)
+            self.assertEqual(b"stored" * 10, apk.read("resources.arsc"))
+            self.assertEqual(b"deflated" * 10, apk.read("AndroidManifest.xml"))
+            # deflated files are only inflated once
+            self.assertIs(apk.read("AndroidManifest.xml"), apk.read("AndroidManifest.xml"))
+            self.assertRaises(KeyError, apk.read, "classes.dex")
+            apk.close()
+
+            # a view still referenced does not prevent the archive from being closed
+            apk = APKArchive(path)
+            view = apk.read("resources.arsc")
+            apk.close()
+            self.assertFalse(apk._mmap.closed)
+            del view
+
+    def test_notAZip(self):
+        self.assertRaises(BadZipFile, APKArchive, "examples/Signal_AndroidManifest.xml")
+
+    def test_close(self):
+        strings = ["android", "http://schemas.android.com/apk/res/android", "manifest", "package", "com.example",
+                   "application"]
+        node = struct.pack("<II", 1, 0xFFFFFFFF)
+        manifest = TestAXMLDecoder.buildAXML(strings, [
+            struct.pack("<HHI", 0x0100, 0x10, 0x18) + node + struct.pack("<II", 0, 1),
+            struct.pack("<HHI", 0x0102, 0x10, 0x24 + 20) + node
+            + struct.pack("<IIHHHHHH", 0xFFFFFFFF, 2, 0x14, 20, 1, 0, 0, 0)
+            + struct.pack("<IIIHBBI", 0xFFFFFFFF, 3, 4, 8, 0, 0x03, 4),
+            struct.pack("<HHI", 0x0102, 0x10, 0x24) + node + struct.pack("<IIHHHHHH", 0xFFFFFFFF, 5, 0x14, 20, 0, 0,
+                                                                         0, 0),
+            struct.pack("<HHI", 0x0103, 0x10, 0x18) + node + struct.pack("<II", 0xFFFFFFFF, 5),
+            struct.pack("<HHI", 0x0103, 0x10, 0x18) + node + struct.pack("<II", 0xFFFFFFFF, 2),
+        ])
+        with tempfile.TemporaryDirectory() as tmpPath:
+            path = os.path.join(tmpPath, "test.apk")
+            with ZipFile(path, "w") as z:
+                z.writestr("AndroidManifest.xml", manifest)
+                z.writestr("resources.arsc", TestResourceTable().buildTable(), compress_type=ZIP_STORED)
+            parser = APKParser(path)
+            archive = parser.apk
+            self.assertEqual("com.example", parser.getApkInfo().package)
+            # the resource table is a view over the mapping
+            self.assertEqual(["com.example", "android"], parser.rsc.getPackagesNames())
+            parser.close()
+            self.assertTrue(archive._mmap.closed)
+            self.assertIsNone(parser.apk)
+
+            # the analyses of a batch release their APK
+            args = argparse.Namespace(log_level=2, min_sdk_version=21, max_sdk_version=33, streaming=False,
+                                      dal_cache=None, path=path)
+            with mock.patch.object(APKParser, "close", autospec=True, side_effect=APKParser.close) as close, \
+                    contextlib.redirect_stdout(StringIO()):
+                analyzeFile(path, args)
+            close.assert_called_once()
+            self.assertIsNone(close.call_args.args[0].apk)
+
+            # a ZIP file without manifest is not an APK
+            with ZipFile(path, "w") as z:
+                z.writestr("resources.arsc", TestResourceTable().buildTable(), compress_type=ZIP_STORED)
+            self.assertIsNone(APKParser(path).apk)
+
+
+class TestNetworkSecParser(unittest.TestCase):
+    nsc = """<network-security-config>
+        <domain-config cleartextTrafficPermitted="false">
+            <domain includeSubdomains="true">example.com</domain>
+            <trust-anchors><certificates src="system" overridePins="true"/></trust-anchors>
+            <domain-config>
+                <domain>secure.example.com</domain>
+                <pin-set expiration="2099-01-01"><pin digest="SHA-256">x</pin></pin-set>
+            </domain-config>
+        </domain-config>
+        <debug-overrides><trust-anchors><certificates src="user"/></trust-anchors></debug-overrides>
+    </network-security-config>"""
+
+    def test_getDomainPolicies(self):
+        parser = NetworkSecParser(StringIO(self.nsc))
+        policies = parser.getDomainPolicies()
+        self.assertEqual(["*.example.com", "secure.example.com"], [p.domain for p in policies])
+        self.assertEqual(["example.com", "secure.example.com"], [p.name for p in policies])
+        # the nested <domain-config> inherits the cleartext flag and the trust anchors of its parent
+        self.assertEqual([False, False], [p.cleartextTrafficPermitted for p in policies])
+        self.assertEqual(policies[0].trustanchors, policies[1].trustanchors)
+        self.assertEqual([None, "2099-01-01"], [p.pinset for p in policies])
+        self.assertEqual([("secure.example.com", "2099-01-01", ["system"])], parser.getPinningInfo())
+        self.assertEqual([], parser.getAllDomains(inheritedCT=True, withCT=True))
+        # the debug overrides are added to the trust anchors of debuggable apps
+        parser = NetworkSecParser(StringIO(self.nsc), debuggable=True)
+        self.assertEqual(["system", "user"], [c.src for c in parser.getDomainPolicies()[0].trustanchors])
+
+    def test_getPolicy(self):
+        parser = NetworkSecParser(StringIO(self.nsc))
+        wildcard, secure = parser.getDomainPolicies()
+        self.assertIs(wildcard, parser.getPolicy("example.com"))
+        self.assertIs(wildcard, parser.getPolicy("API.Example.com."))
+        # the most specific domain wins
+        self.assertIs(secure, parser.getPolicy("secure.example.com"))
+        # secure.example.com does not include its subdomains
+        self.assertIs(wildcard, parser.getPolicy("a.secure.example.com"))
+        self.assertIsNone(parser.getPolicy("example.org"))
+        self.assertIsNone(parser.getPolicy("com"))
+        self.assertEqual({"x.example.com": wildcard, "": None}, parser.getPolicies(["x.example.com", ""]))
+
 
 if __name__ == '__main__':
     unittest.main(buffer=True)